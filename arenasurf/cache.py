@@ -0,0 +1,230 @@
+"""
+Utilidades de caché de la aplicación
+
+``cache_swr`` implementa *stale-while-revalidate*: mientras el valor está
+fresco se sirve directamente; cuando pasa el TTL blando se sigue sirviendo
+la copia guardada y un único worker lo recalcula en segundo plano; solo se
+bloquea la petición si no hay copia (TTL máximo vencido). Funciona con
+cualquier backend de Django (locmem, fichero, memcached, redis) porque
+solo usa ``get``, ``set``, ``add`` y ``delete``.
+
+Para datos por cliente, ``cache_versionada`` construye las claves a partir
+de contadores de versión por entidad que las señales de guardado y borrado
+(y los caminos de actualización masiva) incrementan con ``invalidar``, de
+forma que las páginas se pueden cachear sin que queden obsoletas.
+"""
+import hashlib
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections, transaction
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+# Segundos que se espera a que otro worker termine de calcular un valor
+ESPERA_BLOQUEO = 5
+INTERVALO_ESPERA = 0.05
+
+
+def _config_swr():
+    config = {
+        'alias': 'default',
+        'fresco': 30,
+        'maximo': 300,
+        'segundo_plano': True,
+    }
+    config.update(getattr(settings, 'ARENASURF_CACHE_SWR', {}))
+    return config
+
+
+def _calcular(backend, clave, construir, fresco, maximo):
+    valor = construir()
+    backend.set(clave, (valor, time.time() + fresco), timeout=maximo)
+    return valor
+
+
+def _renovar(backend, clave, construir, fresco, maximo, bloqueo):
+    try:
+        _calcular(backend, clave, construir, fresco, maximo)
+    except Exception:
+        logger.exception('Error recalculando la entrada de caché %s', clave)
+    finally:
+        backend.delete(bloqueo)
+
+
+def _renovar_en_segundo_plano(*args):
+    try:
+        _renovar(*args)
+    finally:
+        # El hilo tiene sus propias conexiones: se cierran al terminar
+        connections.close_all()
+
+
+def cache_swr(clave, construir, fresco=None, maximo=None):
+    """
+    Devuelve el valor cacheado en ``clave`` calculándolo con ``construir()``.
+
+    ``fresco`` es el TTL blando y ``maximo`` el TTL duro, en segundos; por
+    defecto se toman de ``settings.ARENASURF_CACHE_SWR``. Un bloqueo en la
+    propia caché (``add`` atómico) evita que varios workers recalculen el
+    mismo valor a la vez.
+    """
+    config = _config_swr()
+    fresco = config['fresco'] if fresco is None else fresco
+    maximo = config['maximo'] if maximo is None else maximo
+    backend = caches[config['alias']]
+    bloqueo = f'{clave}:recalculando'
+
+    entrada = backend.get(clave)
+    if entrada is not None:
+        valor, fresco_hasta = entrada
+        if time.time() < fresco_hasta:
+            return valor
+        # Copia caducada: se sirve igualmente y solo un worker la renueva
+        if backend.add(bloqueo, 1, timeout=ESPERA_BLOQUEO * 2):
+            args = (backend, clave, construir, fresco, maximo, bloqueo)
+            if config['segundo_plano']:
+                threading.Thread(target=_renovar_en_segundo_plano, args=args, daemon=True).start()
+            else:
+                _renovar(*args)
+        return valor
+
+    # Sin copia: hay que bloquear, pero solo un worker calcula
+    if backend.add(bloqueo, 1, timeout=ESPERA_BLOQUEO * 2):
+        try:
+            return _calcular(backend, clave, construir, fresco, maximo)
+        finally:
+            backend.delete(bloqueo)
+
+    limite = time.time() + ESPERA_BLOQUEO
+    while time.time() < limite:
+        time.sleep(INTERVALO_ESPERA)
+        entrada = backend.get(clave)
+        if entrada is not None:
+            return entrada[0]
+    return _calcular(backend, clave, construir, fresco, maximo)
+
+
+class VersionesCache:
+    """
+    Almacén de contadores de versión sobre una caché de Django.
+
+    Cada entidad (``'clientes.cliente', 12``) y cada modelo completo
+    (``'clientes.cliente', None``) tiene un contador que se incrementa al
+    modificarse. Los contadores nuevos arrancan en un valor basado en la
+    hora, de modo que si la caché pierde una clave nunca se reutiliza una
+    versión antigua.
+    """
+
+    prefijo = 'v'
+
+    def __init__(self, alias='default'):
+        self.alias = alias
+
+    @property
+    def backend(self):
+        return caches[self.alias]
+
+    def clave(self, modelo, pk=None):
+        return f'{self.prefijo}:{modelo}:{"*" if pk is None else pk}'
+
+    @staticmethod
+    def semilla():
+        return time.time_ns() // 1000
+
+    def obtener(self, entidades):
+        """Versiones actuales de una lista de ``(modelo, pk)``"""
+        claves = [self.clave(modelo, pk) for modelo, pk in entidades]
+        versiones = self.backend.get_many(claves)
+        for clave in claves:
+            if clave not in versiones:
+                self.backend.add(clave, self.semilla(), timeout=None)
+                versiones[clave] = self.backend.get(clave)
+        return [versiones[clave] for clave in claves]
+
+    def incrementar(self, entidades):
+        for modelo, pk in entidades:
+            clave = self.clave(modelo, pk)
+            try:
+                self.backend.incr(clave)
+            except ValueError:
+                self.backend.set(clave, self.semilla(), timeout=None)
+
+
+def _config_versiones():
+    config = {
+        'backend': 'arenasurf.cache.VersionesCache',
+        'alias': 'default',
+        'timeout': 3600,
+    }
+    config.update(getattr(settings, 'ARENASURF_CACHE_VERSIONES', {}))
+    return config
+
+
+def get_versiones():
+    """Instancia el almacén de versiones configurado en ``ARENASURF_CACHE_VERSIONES``"""
+    config = _config_versiones()
+    return import_string(config['backend'])(alias=config['alias'])
+
+
+def get_cache():
+    """Caché en la que se guardan las versiones y los valores versionados"""
+    return caches[_config_versiones()['alias']]
+
+
+def _etiqueta(modelo):
+    return modelo if isinstance(modelo, str) else modelo._meta.label_lower
+
+
+def version(modelo, pk=None):
+    """Versión actual de una entidad (o del modelo completo si ``pk`` es None)"""
+    return get_versiones().obtener([(_etiqueta(modelo), pk)])[0]
+
+
+def invalidar(modelo, pks=()):
+    """
+    Incrementa la versión global del modelo y la de cada ``pk`` indicado.
+
+    Dentro de una transacción se vuelve a incrementar al confirmarla, para
+    que ningún lector concurrente deje en caché datos anteriores al commit
+    con la versión nueva.
+    """
+    etiqueta = _etiqueta(modelo)
+    entidades = [(etiqueta, None)] + [(etiqueta, pk) for pk in set(pks) if pk is not None]
+    versiones = get_versiones()
+    versiones.incrementar(entidades)
+    connection = transaction.get_connection()
+    if connection.in_atomic_block:
+        transaction.on_commit(lambda: versiones.incrementar(entidades))
+
+
+def clave_versionada(prefijo, entidades, extra=()):
+    """Clave de caché que cambia cuando cambia cualquiera de las entidades"""
+    entidades = [(_etiqueta(modelo), pk) for modelo, pk in entidades]
+    versiones = get_versiones().obtener(entidades)
+    partes = [f'{modelo}:{pk}={version}' for (modelo, pk), version in zip(entidades, versiones)]
+    partes.extend(str(valor) for valor in extra)
+    resumen = hashlib.md5('|'.join(partes).encode()).hexdigest()
+    return f'{prefijo}:{resumen}'
+
+
+def cache_versionada(prefijo, entidades, construir, extra=(), timeout=None):
+    """
+    Devuelve el valor de ``construir()`` cacheado bajo una clave versionada.
+
+    Como la clave incluye las versiones de ``entidades``, cualquier cambio
+    en ellas produce una clave nueva y el valor no llega a quedar obsoleto;
+    ``timeout`` solo sirve para liberar memoria.
+    """
+    backend = get_cache()
+    timeout = _config_versiones()['timeout'] if timeout is None else timeout
+    clave = clave_versionada(prefijo, entidades, extra)
+    valor = backend.get(clave)
+    if valor is None:
+        valor = construir()
+        backend.set(clave, valor, timeout=timeout)
+    return valor
@@ -0,0 +1,136 @@
+"""
+Estadísticas de los dashboards de bonos y socios
+
+Cada dashboard se construye con una única consulta de agregación
+condicional por tabla (``Count(filter=Q(...))``) en lugar de un COUNT por
+cifra. El resultado es un objeto tipado que usan tanto las vistas HTML
+como los endpoints JSON.
+"""
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from bonos.models import Bono, UsoBono
+from clientes.models import Cliente
+from socios.models import Socio
+
+
+@dataclass(frozen=True)
+class EstadisticasBonos:
+    bonos_activos: int
+    bonos_agotados: int
+    clientes_activos: int
+    bonos_caducados: int = 0
+    usos_recientes: list = field(default_factory=list)
+
+    @property
+    def total_bonos(self) -> int:
+        return self.bonos_activos + self.bonos_agotados + self.bonos_caducados
+
+    def as_dict(self) -> dict:
+        return {
+            'bonos_activos': self.bonos_activos,
+            'bonos_agotados': self.bonos_agotados,
+            'bonos_caducados': self.bonos_caducados,
+            'total_bonos': self.total_bonos,
+            'clientes_activos': self.clientes_activos,
+            'usos_recientes': [
+                {
+                    'bono_id': uso.bono_id,
+                    'cliente': uso.bono.cliente.nombre_completo,
+                    'tipo_bono': uso.bono.tipo_bono,
+                    'fecha': uso.fecha_uso.isoformat(),
+                    'descripcion': uso.descripcion,
+                } for uso in self.usos_recientes
+            ],
+        }
+
+
+@dataclass(frozen=True)
+class EstadisticasSocios:
+    fecha: date
+    total_socios: int
+    socios_vigentes: int
+    socios_vencidos: int
+    socios_basico: int
+    socios_premium: int
+    socios_vip: int
+    proximos_vencimientos: list = field(default_factory=list)
+
+    def as_dict(self) -> dict:
+        return {
+            'fecha': self.fecha.isoformat(),
+            'total_socios': self.total_socios,
+            'socios_vigentes': self.socios_vigentes,
+            'socios_vencidos': self.socios_vencidos,
+            'por_nivel': {
+                'BASICO': self.socios_basico,
+                'PREMIUM': self.socios_premium,
+                'VIP': self.socios_vip,
+            },
+            'proximos_vencimientos': [
+                {
+                    'socio_id': socio.pk,
+                    'numero_socio': socio.numero_socio,
+                    'cliente': socio.cliente.nombre_completo,
+                    'nivel': socio.nivel,
+                    'vencimiento': socio.fecha_vencimiento.isoformat(),
+                    'dias_restantes': socio.dias_hasta_vencimiento,
+                } for socio in self.proximos_vencimientos
+            ],
+        }
+
+
+def estadisticas_bonos(usos_recientes=10) -> EstadisticasBonos:
+    """Estadísticas del dashboard de bonos (3 consultas)"""
+    # Los caducados que el barrido aún no ha desactivado no cuentan como activos
+    caducado = Q(fecha_expiracion__lte=timezone.now())
+    bonos = Bono.objects.aggregate(
+        activos=Count('pk', filter=Q(activo=True) & ~caducado),
+        agotados=Count('pk', filter=Q(activo=False)),
+        caducados=Count('pk', filter=Q(activo=True) & caducado),
+    )
+    clientes = Cliente.objects.aggregate(activos=Count('pk', filter=Q(activo=True)))
+    usos = list(
+        UsoBono.objects.select_related('bono__cliente').order_by('-fecha_uso')[:usos_recientes]
+    )
+    return EstadisticasBonos(
+        bonos_activos=bonos['activos'],
+        bonos_agotados=bonos['agotados'],
+        bonos_caducados=bonos['caducados'],
+        clientes_activos=clientes['activos'],
+        usos_recientes=usos,
+    )
+
+
+def estadisticas_socios(today=None, dias_aviso=30, limite=10) -> EstadisticasSocios:
+    """Estadísticas del dashboard de socios (2 consultas)"""
+    today = today or timezone.now().date()
+    activos = Q(activo=True)
+    socios = Socio.objects.aggregate(
+        total=Count('pk', filter=activos),
+        vigentes=Count('pk', filter=activos & Q(fecha_vencimiento__gte=today)),
+        vencidos=Count('pk', filter=activos & Q(fecha_vencimiento__lt=today)),
+        basico=Count('pk', filter=activos & Q(nivel='BASICO')),
+        premium=Count('pk', filter=activos & Q(nivel='PREMIUM')),
+        vip=Count('pk', filter=activos & Q(nivel='VIP')),
+    )
+    proximos = list(
+        Socio.objects.with_vigencia(today).filter(
+            activo=True,
+            fecha_vencimiento__gte=today,
+            fecha_vencimiento__lte=today + timedelta(days=dias_aviso),
+        ).select_related('cliente').order_by('fecha_vencimiento')[:limite]
+    )
+    return EstadisticasSocios(
+        fecha=today,
+        total_socios=socios['total'],
+        socios_vigentes=socios['vigentes'],
+        socios_vencidos=socios['vencidos'],
+        socios_basico=socios['basico'],
+        socios_premium=socios['premium'],
+        socios_vip=socios['vip'],
+        proximos_vencimientos=proximos,
+    )
@@ -0,0 +1,260 @@
+"""
+Exportación de datos a CSV en streaming
+
+Cada ``Exportacion`` declara las columnas (caminos de ``values_list``, con
+los JOIN que hagan falta), el campo de fecha por el que se acota y los
+estados por los que se puede filtrar. Los filtros se aplican en SQL y las
+filas se leen por bloques de ``chunk_size`` recorriendo la clave primaria
+(``pk > último``), así que la memoria no depende del número de filas: con
+MySQL, ``iterator()`` no basta porque el driver carga el resultado entero.
+
+Las vistas de cada app devuelven un ``StreamingHttpResponse`` y el comando
+``exportar_csv`` escribe a fichero con el mismo generador; la salida puede
+comprimirse con gzip sobre la marcha.
+"""
+import csv
+import io
+import zlib
+from dataclasses import dataclass, field
+from datetime import date, datetime, time, timedelta
+
+from django.db.models import DateTimeField, Q
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+
+from bonos.models import Bono, UsoBono
+from clientes.models import Cliente
+from socios.models import Socio
+
+CHUNK_SIZE = 2000
+# Bytes de CSV que se acumulan antes de enviar (o comprimir) un trozo
+TAMANO_TROZO = 64 * 1024
+
+
+class FiltroInvalido(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class Exportacion:
+    nombre: str
+    modelo: type
+    columnas: tuple
+    campo_fecha: str
+    # Nombre del estado -> función que recibe ``now`` y devuelve el Q
+    estados: dict = field(default_factory=dict)
+
+    @property
+    def cabeceras(self):
+        return [cabecera for cabecera, _ in self.columnas]
+
+    def _limite(self, dia):
+        """Inicio de ``dia`` en el tipo del campo de fecha"""
+        if isinstance(self.modelo._meta.get_field(self.campo_fecha), DateTimeField):
+            return timezone.make_aware(datetime.combine(dia, time.min))
+        return dia
+
+    def queryset(self, desde=None, hasta=None, estado=None, now=None):
+        """Filas con la fecha en ``[desde, hasta]`` (ambos incluidos) y en ``estado``"""
+        queryset = self.modelo.objects.all()
+        if desde:
+            queryset = queryset.filter(**{f'{self.campo_fecha}__gte': self._limite(desde)})
+        if hasta:
+            queryset = queryset.filter(**{f'{self.campo_fecha}__lt': self._limite(hasta + timedelta(days=1))})
+        if estado:
+            if estado not in self.estados:
+                raise FiltroInvalido(f'Estado desconocido: {estado}')
+            queryset = queryset.filter(self.estados[estado](now or timezone.now()))
+        return queryset
+
+    def filas(self, queryset, chunk_size=CHUNK_SIZE):
+        """Tuplas de valores de ``queryset`` leídas por bloques de clave primaria"""
+        campos = [campo for _, campo in self.columnas]
+        bloques = queryset.order_by('pk').values_list('pk', *campos)
+        ultimo = None
+        while True:
+            bloque = bloques if ultimo is None else bloques.filter(pk__gt=ultimo)
+            filas = list(bloque[:chunk_size])
+            for fila in filas:
+                yield [_formatear(valor) for valor in fila[1:]]
+            if len(filas) < chunk_size:
+                return
+            ultimo = filas[-1][0]
+
+
+def _formatear(valor):
+    if valor is None:
+        return ''
+    if isinstance(valor, bool):
+        return 'sí' if valor else 'no'
+    if isinstance(valor, datetime):
+        return timezone.localtime(valor).isoformat(timespec='seconds')
+    return valor
+
+
+def generar_csv(cabeceras, filas, comprimir=False):
+    """Bytes del CSV (con BOM para Excel), en trozos de unos ``TAMANO_TROZO``"""
+    compresor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS) if comprimir else None
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+
+    def vaciar():
+        datos = buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+        return compresor.compress(datos) if compresor else datos
+
+    buffer.write('\ufeff')
+    escritor.writerow(cabeceras)
+    for fila in filas:
+        escritor.writerow(fila)
+        if buffer.tell() >= TAMANO_TROZO:
+            trozo = vaciar()
+            if trozo:
+                yield trozo
+    trozo = vaciar()
+    if compresor:
+        trozo += compresor.flush()
+    if trozo:
+        yield trozo
+
+
+def leer_filtros(parametros):
+    """``desde``, ``hasta``, ``estado`` y ``gzip`` de un diccionario de parámetros"""
+    filtros = {}
+    for nombre in ('desde', 'hasta'):
+        valor = parametros.get(nombre)
+        if valor:
+            try:
+                filtros[nombre] = date.fromisoformat(valor)
+            except ValueError:
+                raise FiltroInvalido(f'Fecha no válida en "{nombre}": {valor}')
+    filtros['estado'] = parametros.get('estado') or None
+    comprimir = str(parametros.get('gzip', '')).lower() in ('1', 'true', 'si', 'sí')
+    return filtros, comprimir
+
+
+def nombre_fichero(exportacion, filtros, comprimir=False):
+    partes = [exportacion.nombre]
+    partes += [str(filtros[clave]) for clave in ('estado', 'desde', 'hasta') if filtros.get(clave)]
+    return '_'.join(partes) + ('.csv.gz' if comprimir else '.csv')
+
+
+def respuesta_csv(exportacion, parametros, chunk_size=CHUNK_SIZE):
+    """``StreamingHttpResponse`` con la exportación filtrada por ``parametros``"""
+    filtros, comprimir = leer_filtros(parametros)
+    queryset = exportacion.queryset(**filtros)
+    contenido = generar_csv(exportacion.cabeceras, exportacion.filas(queryset, chunk_size), comprimir)
+    respuesta = StreamingHttpResponse(
+        contenido,
+        content_type='application/gzip' if comprimir else 'text/csv; charset=utf-8',
+    )
+    respuesta['Content-Disposition'] = (
+        f'attachment; filename="{nombre_fichero(exportacion, filtros, comprimir)}"'
+    )
+    return respuesta
+
+
+def exportar_csv(request, nombre):
+    """Vista común de las exportaciones; los filtros no válidos devuelven 400"""
+    try:
+        return respuesta_csv(EXPORTACIONES[nombre], request.GET)
+    except FiltroInvalido as error:
+        return JsonResponse({'error': str(error)}, status=400)
+
+
+def _vigente(now):
+    return Q(fecha_expiracion__isnull=True) | Q(fecha_expiracion__gt=now)
+
+
+EXPORTACIONES = {
+    'bonos': Exportacion(
+        nombre='bonos',
+        modelo=Bono,
+        columnas=(
+            ('id', 'pk'),
+            ('cliente_id', 'cliente_id'),
+            ('nombre', 'cliente__nombre'),
+            ('apellidos', 'cliente__apellidos'),
+            ('email', 'cliente__email'),
+            ('tipo_bono', 'tipo_bono'),
+            ('usos_totales', 'usos_totales'),
+            ('usos_restantes', 'usos_restantes'),
+            ('precio', 'precio'),
+            ('fecha_compra', 'fecha_compra'),
+            ('fecha_expiracion', 'fecha_expiracion'),
+            ('activo', 'activo'),
+        ),
+        campo_fecha='fecha_compra',
+        # Los mismos estados que el dashboard de bonos
+        estados={
+            'activo': lambda now: Q(activo=True) & _vigente(now),
+            'agotado': lambda now: Q(activo=False),
+            'caducado': lambda now: Q(activo=True, fecha_expiracion__lte=now),
+        },
+    ),
+    'usos': Exportacion(
+        nombre='usos',
+        modelo=UsoBono,
+        columnas=(
+            ('id', 'pk'),
+            ('fecha_uso', 'fecha_uso'),
+            ('descripcion', 'descripcion'),
+            ('bono_id', 'bono_id'),
+            ('tipo_bono', 'bono__tipo_bono'),
+            ('cliente_id', 'bono__cliente_id'),
+            ('nombre', 'bono__cliente__nombre'),
+            ('apellidos', 'bono__cliente__apellidos'),
+            ('email', 'bono__cliente__email'),
+        ),
+        campo_fecha='fecha_uso',
+    ),
+    'clientes': Exportacion(
+        nombre='clientes',
+        modelo=Cliente,
+        columnas=(
+            ('id', 'pk'),
+            ('nombre', 'nombre'),
+            ('apellidos', 'apellidos'),
+            ('email', 'email'),
+            ('telefono', 'telefono'),
+            ('fecha_nacimiento', 'fecha_nacimiento'),
+            ('fecha_registro', 'created_at'),
+            ('bonos_activos', 'num_bonos_activos'),
+            ('bonos_agotados', 'num_bonos_agotados'),
+            ('usos', 'num_usos'),
+            ('activo', 'activo'),
+        ),
+        campo_fecha='created_at',
+        estados={
+            'activo': lambda now: Q(activo=True),
+            'inactivo': lambda now: Q(activo=False),
+        },
+    ),
+    'socios': Exportacion(
+        nombre='socios',
+        modelo=Socio,
+        columnas=(
+            ('id', 'pk'),
+            ('numero_socio', 'numero_socio'),
+            ('cliente_id', 'cliente_id'),
+            ('nombre', 'cliente__nombre'),
+            ('apellidos', 'cliente__apellidos'),
+            ('email', 'cliente__email'),
+            ('nivel', 'nivel'),
+            ('fecha_alta', 'fecha_alta'),
+            ('fecha_vencimiento', 'fecha_vencimiento'),
+            ('precio_anual', 'precio_anual'),
+            ('numero_taquilla', 'numero_taquilla'),
+            ('numero_guardatablas', 'numero_guardatablas'),
+            ('activo', 'activo'),
+        ),
+        campo_fecha='fecha_alta',
+        # Los mismos estados que el filtro del listado de socios
+        estados={
+            'vigente': lambda now: Q(activo=True, fecha_vencimiento__gte=timezone.localdate(now)),
+            'vencido': lambda now: Q(fecha_vencimiento__lt=timezone.localdate(now)),
+            'inactivo': lambda now: Q(activo=False),
+        },
+    ),
+}
@@ -0,0 +1,357 @@
+"""
+Importación masiva de clientes (con su bono y su alta de socio) desde CSV
+
+Cada fila es un cliente; si trae ``tipo_bono`` se le crea un bono y si
+trae ``fecha_vencimiento`` se le da de alta como socio. El fichero se lee
+como un flujo y se procesa por lotes de ``chunk_size`` filas, cada uno en
+su propia transacción:
+
+1. Cada fila se valida con ``FilaImportacionForm``, sin consultas.
+2. Las unicidades (email, número de socio, taquilla y guardatablas) se
+   comprueban con una consulta ``IN`` por campo y lote, además de contra
+   las filas ya aceptadas del propio fichero.
+3. Las filas válidas se insertan con ``bulk_create``.
+
+``bulk_create`` no llama a ``save()`` ni a las señales, así que aquí se
+reproduce lo que hacen: los usos iniciales del bono, el número de socio de
+la secuencia, el precio del nivel, los contadores de bonos del cliente, la
+ocupación de las plazas, el índice de búsqueda y la invalidación de caché.
+Las filas rechazadas se devuelven con su número de línea y sus errores.
+"""
+import csv
+import io
+from dataclasses import dataclass, field
+from datetime import datetime, time
+
+from django import forms
+from django.db import DatabaseError, transaction
+from django.db.models import Case, IntegerField, Value, When
+from django.db.models.functions import Lower
+from django.utils import timezone
+
+from arenasurf.cache import invalidar
+from bonos.models import Bono
+from clientes.busqueda import indexar_clientes
+from clientes.models import Cliente
+from socios.models import Guardatablas, Socio, Taquilla
+from socios.secuencias import avanzar_numero_socio, formatear_numero_socio, numeros_socio
+
+CHUNK_SIZE = 500
+COLUMNAS_OBLIGATORIAS = ('nombre', 'apellidos', 'email')
+FORMATOS_FECHA = ['%Y-%m-%d', '%d/%m/%Y']
+# Campo del formulario -> modelo de la plaza
+PLAZAS = {'numero_taquilla': Taquilla, 'numero_guardatablas': Guardatablas}
+
+
+class ImportacionInvalida(ValueError):
+    """El fichero no se puede importar (por ejemplo, le faltan columnas)"""
+
+
+class FilaImportacionForm(forms.Form):
+    nombre = forms.CharField(max_length=100)
+    apellidos = forms.CharField(max_length=100)
+    email = forms.EmailField()
+    telefono = forms.CharField(max_length=20, required=False)
+    fecha_nacimiento = forms.DateField(required=False, input_formats=FORMATOS_FECHA)
+    # Bono
+    tipo_bono = forms.TypedChoiceField(
+        choices=Bono.TIPOS_BONOS, coerce=int, required=False, empty_value=None
+    )
+    precio_bono = forms.DecimalField(max_digits=8, decimal_places=2, required=False)
+    caducidad_bono = forms.DateField(required=False, input_formats=FORMATOS_FECHA)
+    # Socio
+    nivel = forms.ChoiceField(choices=Socio.NIVEL_CHOICES, required=False)
+    numero_socio = forms.CharField(max_length=10, required=False)
+    fecha_alta = forms.DateField(required=False, input_formats=FORMATOS_FECHA)
+    fecha_vencimiento = forms.DateField(required=False, input_formats=FORMATOS_FECHA)
+    numero_taquilla = forms.IntegerField(min_value=1, required=False)
+    numero_guardatablas = forms.IntegerField(min_value=1, required=False)
+
+    def clean_numero_socio(self):
+        numero_socio = self.cleaned_data['numero_socio'].strip()
+        if numero_socio.isdigit():
+            numero_socio = formatear_numero_socio(int(numero_socio))
+        return numero_socio
+
+    def clean(self):
+        cleaned_data = super().clean()
+        socio = [
+            campo for campo in ('nivel', 'numero_socio', 'fecha_alta', *PLAZAS)
+            if cleaned_data.get(campo)
+        ]
+        if socio and not cleaned_data.get('fecha_vencimiento'):
+            self.add_error('fecha_vencimiento', 'Obligatoria para dar de alta al socio.')
+        if cleaned_data.get('fecha_vencimiento'):
+            cleaned_data['nivel'] = cleaned_data.get('nivel') or 'BASICO'
+            if cleaned_data['nivel'] == 'BASICO' and cleaned_data.get('numero_guardatablas'):
+                self.add_error('numero_guardatablas', 'Los socios básicos no tienen acceso a guardatablas.')
+        return cleaned_data
+
+
+@dataclass
+class Rechazo:
+    linea: int
+    datos: dict
+    errores: list
+
+
+@dataclass
+class ResultadoImportacion:
+    clientes: int = 0
+    bonos: int = 0
+    socios: int = 0
+    rechazos: list = field(default_factory=list)
+
+    def as_dict(self):
+        return {
+            'clientes': self.clientes,
+            'bonos': self.bonos,
+            'socios': self.socios,
+            'rechazados': len(self.rechazos),
+        }
+
+
+def leer_csv(fichero):
+    """
+    Filas ``(linea, datos)`` de un CSV leído como flujo.
+
+    ``fichero`` puede ser binario (una subida) o de texto. Las cabeceras se
+    normalizan a minúsculas y sin espacios.
+    """
+    if not isinstance(fichero, io.TextIOBase):
+        fichero = io.TextIOWrapper(fichero, encoding='utf-8-sig', newline='')
+    lector = csv.reader(fichero)
+    cabeceras = [c.strip().lower() for c in next(lector, [])]
+    faltan = [c for c in COLUMNAS_OBLIGATORIAS if c not in cabeceras]
+    if faltan:
+        raise ImportacionInvalida(f'Faltan columnas obligatorias: {", ".join(faltan)}')
+    for valores in lector:
+        if not any(v.strip() for v in valores):
+            continue
+        yield lector.line_num, {c: v.strip() for c, v in zip(cabeceras, valores)}
+
+
+def _lotes(filas, tamano):
+    lote = []
+    for fila in filas:
+        lote.append(fila)
+        if len(lote) == tamano:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+def _por_email(datos):
+    """Clientes con alguno de los emails de ``datos``, sin distinguir mayúsculas"""
+    return Cliente.objects.annotate(email_normalizado=Lower('email')).filter(
+        email_normalizado__in=[d['email'].lower() for d in datos]
+    )
+
+
+class Importador:
+    """Importa lotes de filas recordando las claves únicas ya aceptadas"""
+
+    def __init__(self):
+        self.resultado = ResultadoImportacion()
+        self.vistos = {'email': set(), 'numero_socio': set(), **{campo: set() for campo in PLAZAS}}
+
+    def importar(self, filas, chunk_size=CHUNK_SIZE):
+        for lote in _lotes(filas, chunk_size):
+            try:
+                with transaction.atomic():
+                    vistos = {campo: set(valores) for campo, valores in self.vistos.items()}
+                    aceptadas, rechazos = self._validar(lote, vistos)
+                    creados = self._insertar(aceptadas)
+            except DatabaseError as error:
+                # El lote se deshace entero; los demás siguen
+                self.resultado.rechazos.extend(
+                    Rechazo(linea, datos, [f'Error al guardar el lote: {error}']) for linea, datos in lote
+                )
+                continue
+            self.vistos = vistos
+            self.resultado.rechazos.extend(rechazos)
+            for clave, valor in creados.items():
+                setattr(self.resultado, clave, getattr(self.resultado, clave) + valor)
+        if self.resultado.clientes:
+            invalidar(Cliente)
+            invalidar(Bono)
+            invalidar(Socio)
+        return self.resultado
+
+    def _validar(self, lote, vistos):
+        formularios = []
+        rechazos = []
+        for linea, datos in lote:
+            formulario = FilaImportacionForm(datos)
+            if formulario.is_valid():
+                formularios.append((linea, datos, formulario))
+            else:
+                errores = [
+                    f'{campo}: {mensaje}' for campo, mensajes in formulario.errors.items()
+                    for mensaje in mensajes
+                ]
+                rechazos.append(Rechazo(linea, datos, errores))
+
+        datos_validos = [f.cleaned_data for _, _, f in formularios]
+        existentes = {
+            'email': set(
+                _por_email(datos_validos).values_list('email_normalizado', flat=True)
+            ),
+            'numero_socio': set(Socio.objects.filter(
+                numero_socio__in=[d['numero_socio'] for d in datos_validos if d['numero_socio']]
+            ).values_list('numero_socio', flat=True)),
+        }
+        plazas = {}
+        for campo, modelo in PLAZAS.items():
+            numeros = [d[campo] for d in datos_validos if d[campo]]
+            # Las plazas pedidas quedan bloqueadas hasta el final del lote
+            plazas[campo] = dict(
+                modelo.objects.select_for_update().filter(numero__in=numeros)
+                .values_list('numero', 'socio_id')
+            ) if numeros else {}
+
+        aceptadas = []
+        for linea, datos, formulario in formularios:
+            errores = self._conflictos(formulario.cleaned_data, existentes, plazas, vistos)
+            if errores:
+                rechazos.append(Rechazo(linea, datos, errores))
+                continue
+            d = formulario.cleaned_data
+            vistos['email'].add(d['email'].lower())
+            if d['numero_socio']:
+                vistos['numero_socio'].add(d['numero_socio'])
+            for campo in PLAZAS:
+                if d[campo]:
+                    vistos[campo].add(d[campo])
+            aceptadas.append(formulario)
+        return aceptadas, rechazos
+
+    def _conflictos(self, d, existentes, plazas, vistos):
+        errores = []
+        email = d['email'].lower()
+        # Un email de un lote anterior ya está en la base de datos, pero el
+        # error útil es que se repite en el fichero
+        if email in vistos['email']:
+            errores.append('email: Repetido en el fichero.')
+        elif email in existentes['email']:
+            errores.append('email: Ya existe un cliente con este email.')
+        numero = d['numero_socio']
+        if numero in existentes['numero_socio']:
+            errores.append('numero_socio: Ya existe un socio con este número.')
+        elif numero and numero in vistos['numero_socio']:
+            errores.append('numero_socio: Repetido en el fichero.')
+        for campo, modelo in PLAZAS.items():
+            plaza = d[campo]
+            if not plaza:
+                continue
+            nombre = modelo._meta.verbose_name
+            if plaza not in plazas[campo]:
+                errores.append(f'{campo}: No existe la plaza de {nombre.lower()} {plaza}.')
+            elif plazas[campo][plaza] is not None:
+                errores.append(f'{campo}: {nombre} {plaza} ocupada.')
+            elif plaza in vistos[campo]:
+                errores.append(f'{campo}: Repetida en el fichero.')
+        return errores
+
+    def _insertar(self, formularios):
+        if not formularios:
+            return {}
+        datos = [f.cleaned_data for f in formularios]
+        Cliente.objects.bulk_create([
+            Cliente(
+                nombre=d['nombre'],
+                apellidos=d['apellidos'],
+                email=d['email'],
+                telefono=d['telefono'],
+                fecha_nacimiento=d['fecha_nacimiento'],
+                # Contadores que mantendría la señal de Bono.save()
+                num_bonos_activos=1 if d['tipo_bono'] else 0,
+            ) for d in datos
+        ], batch_size=CHUNK_SIZE)
+        # MySQL no devuelve los ids de un INSERT múltiple
+        ids = dict(_por_email(datos).values_list('email_normalizado', 'pk'))
+
+        bonos = [
+            Bono(
+                cliente_id=ids[d['email'].lower()],
+                tipo_bono=d['tipo_bono'],
+                # Lo que Bono.save() hace al crear
+                usos_totales=d['tipo_bono'],
+                usos_restantes=d['tipo_bono'],
+                precio=d['precio_bono'],
+                # Caduca al terminar el día indicado
+                fecha_expiracion=(
+                    timezone.make_aware(datetime.combine(d['caducidad_bono'], time.max))
+                    if d['caducidad_bono'] else None
+                ),
+            ) for d in datos if d['tipo_bono']
+        ]
+        Bono.objects.bulk_create(bonos, batch_size=CHUNK_SIZE)
+
+        socios = self._insertar_socios([d for d in datos if d['fecha_vencimiento']], ids)
+        indexar_clientes(ids.values())
+        return {'clientes': len(datos), 'bonos': len(bonos), 'socios': socios}
+
+    def _insertar_socios(self, datos, ids):
+        if not datos:
+            return 0
+        # Lo que Socio.save() hace al crear: número de la secuencia y precio
+        # del nivel. Los manuales hacen avanzar la secuencia antes de
+        # reservar los automáticos, para que estos no los repitan
+        manuales = [int(d['numero_socio']) for d in datos if d['numero_socio'].isdigit()]
+        if manuales:
+            avanzar_numero_socio(max(manuales))
+        automaticos = iter(numeros_socio(sum(1 for d in datos if not d['numero_socio'])))
+        hoy = timezone.localdate()
+        socios = []
+        for d in datos:
+            socio = Socio(
+                cliente_id=ids[d['email'].lower()],
+                nivel=d['nivel'],
+                numero_socio=d['numero_socio'] or next(automaticos),
+                fecha_alta=d['fecha_alta'] or hoy,
+                fecha_vencimiento=d['fecha_vencimiento'],
+                numero_taquilla=d['numero_taquilla'],
+                numero_guardatablas=d['numero_guardatablas'],
+            )
+            socio.precio_anual = socio.precio_nivel['anual']
+            socios.append(socio)
+        Socio.objects.bulk_create(socios, batch_size=CHUNK_SIZE)
+
+        # Las plazas se ocupan con un UPDATE por tipo
+        for campo, modelo in PLAZAS.items():
+            asignadas = {getattr(s, campo): s.cliente_id for s in socios if getattr(s, campo)}
+            if not asignadas:
+                continue
+            socio_ids = dict(
+                Socio.objects.filter(cliente_id__in=asignadas.values()).values_list('cliente_id', 'pk')
+            )
+            ocupadas = modelo.objects.filter(numero__in=asignadas, socio__isnull=True).update(
+                socio_id=Case(
+                    *[When(numero=numero, then=Value(socio_ids[cliente_id]))
+                      for numero, cliente_id in asignadas.items()],
+                    output_field=IntegerField(),
+                )
+            )
+            if ocupadas != len(asignadas):
+                raise DatabaseError(f'{modelo._meta.verbose_name_plural} ocupadas durante la importación')
+        return len(socios)
+
+
+def importar_csv(fichero, chunk_size=CHUNK_SIZE):
+    """Importa ``fichero`` y devuelve un ``ResultadoImportacion``"""
+    return Importador().importar(leer_csv(fichero), chunk_size)
+
+
+def escribir_rechazos(rechazos, salida):
+    """Informe CSV de las filas rechazadas: línea, errores y los datos originales"""
+    columnas = []
+    for rechazo in rechazos:
+        columnas.extend(c for c in rechazo.datos if c not in columnas)
+    escritor = csv.writer(salida)
+    escritor.writerow(['linea', 'errores', *columnas])
+    for rechazo in rechazos:
+        escritor.writerow([
+            rechazo.linea, '; '.join(rechazo.errores), *[rechazo.datos.get(c, '') for c in columnas]
+        ])
@@ -0,0 +1,42 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from arenasurf.paginacion import estimar_filas
+
+APPS = ('bonos', 'clientes', 'socios')
+
+
+class Command(BaseCommand):
+    help = 'Actualizar las estadísticas de las tablas que usan los totales aproximados'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database',
+            default=DEFAULT_DB_ALIAS,
+            help='Alias de la base de datos',
+        )
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        modelos = [
+            modelo for etiqueta in APPS
+            for modelo in apps.get_app_config(etiqueta).get_models()
+        ]
+        tablas = [connection.ops.quote_name(modelo._meta.db_table) for modelo in modelos]
+
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                # Rellena sqlite_stat1, de donde se leen las estimaciones
+                for tabla in tablas:
+                    cursor.execute(f'ANALYZE {tabla}')
+            elif connection.vendor == 'mysql':
+                cursor.execute(f'ANALYZE TABLE {", ".join(tablas)}')
+                cursor.fetchall()
+            else:
+                raise CommandError(f'Estadísticas no soportadas para {connection.vendor}')
+
+        for modelo in modelos:
+            filas = estimar_filas(modelo, options['database'])
+            self.stdout.write(f'📊 {modelo._meta.db_table}: {filas if filas is not None else "sin estadísticas"}')
+        self.stdout.write('✅ Estadísticas actualizadas')
@@ -0,0 +1,53 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from arenasurf.exportacion import (
+    CHUNK_SIZE, EXPORTACIONES, FiltroInvalido, generar_csv, leer_filtros, nombre_fichero,
+)
+
+
+class Command(BaseCommand):
+    help = 'Exportar bonos, usos, clientes o socios a CSV (opcionalmente comprimido con gzip)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('exportacion', choices=sorted(EXPORTACIONES))
+        parser.add_argument('--desde', help='Primera fecha incluida (AAAA-MM-DD)')
+        parser.add_argument('--hasta', help='Última fecha incluida (AAAA-MM-DD)')
+        parser.add_argument('--estado', help='Estado por el que filtrar (según la exportación)')
+        parser.add_argument('--gzip', action='store_true', help='Comprimir la salida con gzip')
+        parser.add_argument('--salida', help='Fichero de salida (por defecto, uno con el nombre de la exportación)')
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=CHUNK_SIZE,
+            help='Filas que se leen por consulta',
+        )
+
+    def handle(self, *args, **options):
+        exportacion = EXPORTACIONES[options['exportacion']]
+        try:
+            filtros, _ = leer_filtros(options)
+            queryset = exportacion.queryset(**filtros)
+        except FiltroInvalido as error:
+            raise CommandError(str(error))
+        salida = options['salida'] or nombre_fichero(exportacion, filtros, options['gzip'])
+
+        total = 0
+
+        def contar(filas):
+            nonlocal total
+            for fila in filas:
+                total += 1
+                yield fila
+
+        inicio = time.perf_counter()
+        filas = contar(exportacion.filas(queryset, options['chunk_size']))
+        with open(salida, 'wb') as fichero:
+            for trozo in generar_csv(exportacion.cabeceras, filas, options['gzip']):
+                fichero.write(trozo)
+
+        self.stdout.write(
+            f'📦 {total} filas de {exportacion.nombre} exportadas a {salida} '
+            f'en {time.perf_counter() - inicio:.1f} s'
+        )
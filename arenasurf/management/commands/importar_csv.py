@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from arenasurf.importacion import CHUNK_SIZE, ImportacionInvalida, escribir_rechazos, importar_csv
+
+
+class Command(BaseCommand):
+    help = 'Importar clientes (con su bono y su alta de socio) desde un CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('fichero', help='CSV con una fila por cliente')
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=CHUNK_SIZE,
+            help='Filas que se validan e insertan por transacción',
+        )
+        parser.add_argument(
+            '--rechazos',
+            help='Fichero del informe de filas rechazadas (por defecto, <fichero>.rechazos.csv)',
+        )
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        try:
+            with open(options['fichero'], encoding='utf-8-sig', newline='') as fichero:
+                resultado = importar_csv(fichero, options['chunk_size'])
+        except (OSError, ImportacionInvalida, UnicodeDecodeError) as error:
+            raise CommandError(str(error))
+
+        self.stdout.write(
+            f'📥 {resultado.clientes} clientes, {resultado.bonos} bonos y {resultado.socios} socios '
+            f'importados en {time.perf_counter() - inicio:.1f} s'
+        )
+        if resultado.rechazos:
+            ruta = options['rechazos'] or f'{options["fichero"]}.rechazos.csv'
+            with open(ruta, 'w', encoding='utf-8', newline='') as salida:
+                escribir_rechazos(resultado.rechazos, salida)
+            self.stdout.write(f'⚠️ {len(resultado.rechazos)} filas rechazadas; informe en {ruta}')
+        else:
+            self.stdout.write('✅ Sin filas rechazadas')
@@ -0,0 +1,411 @@
+"""
+Paginación por cursor (*keyset*) para los listados de staff
+
+En lugar de ``OFFSET`` y un ``COUNT(*)`` por página, cada página se pide
+con la clave de ordenación de la última fila vista (``WHERE (a, b) > (x,
+y)``), de modo que con un índice sobre la ordenación la página 500 cuesta
+lo mismo que la primera. El último campo de la ordenación debe ser único
+(normalmente ``pk``) para que el orden sea total.
+
+Los cursores son opacos: la dirección y los valores de la clave van
+firmados con ``django.core.signing``, y un cursor manipulado, caducado por
+un cambio de orden o ilegible devuelve la primera página.
+
+Los totales se obtienen con ``contar``: por encima del umbral de
+``settings.ARENASURF_PAGINACION`` las tablas sin filtrar se cuentan con
+las estadísticas del motor (``information_schema`` en MySQL,
+``sqlite_stat1`` en SQLite) en lugar de con un ``COUNT(*)``, y el
+resultado se marca como aproximado. Con filtros las estadísticas no
+sirven, así que se cuenta como mucho hasta el umbral y, si se llega, el
+total es una cota inferior ("más de N"). ``PaginadorEstimado`` aplica lo
+mismo a los changelists del admin.
+"""
+from dataclasses import dataclass
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.conf import settings
+from django.core import signing
+from django.core.paginator import EmptyPage, Paginator
+from django.db import connections
+from django.db.models import Q, QuerySet
+from django.http import JsonResponse
+from django.utils.functional import cached_property
+
+SALT = 'arenasurf.paginacion'
+SIGUIENTE = 'n'
+ANTERIOR = 'p'
+
+
+class CursorInvalido(Exception):
+    pass
+
+
+def _config_paginacion():
+    config = {
+        'umbral_estimacion': 10000,
+    }
+    config.update(getattr(settings, 'ARENASURF_PAGINACION', {}))
+    return config
+
+
+@dataclass(frozen=True)
+class Recuento:
+    valor: int
+    aproximado: bool = False
+    # ``valor`` es una cota inferior: hay al menos esas filas
+    minimo: bool = False
+
+
+def _estimacion_mysql(cursor, tabla):
+    cursor.execute(
+        'SELECT TABLE_ROWS FROM information_schema.TABLES '
+        'WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s',
+        [tabla],
+    )
+    fila = cursor.fetchone()
+    return fila[0] if fila else None
+
+
+def _estimacion_sqlite(cursor, tabla):
+    # sqlite_stat1 solo existe tras un ANALYZE; el primer número de cada
+    # fila es el de filas de la tabla (o del índice, que es el mismo)
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'")
+    if cursor.fetchone() is None:
+        return None
+    cursor.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = %s', [tabla])
+    filas = [int(stat.split()[0]) for stat, in cursor.fetchall() if stat]
+    return max(filas) if filas else None
+
+
+ESTIMADORES = {
+    'mysql': _estimacion_mysql,
+    'sqlite': _estimacion_sqlite,
+}
+
+
+def estimar_filas(modelo, using='default'):
+    """Filas de la tabla del modelo según las estadísticas del motor, o None"""
+    connection = connections[using]
+    estimador = ESTIMADORES.get(connection.vendor)
+    if estimador is None:
+        return None
+    with connection.cursor() as cursor:
+        return estimador(cursor, modelo._meta.db_table)
+
+
+def _sin_filtrar(queryset):
+    query = queryset.query
+    return not (query.where or query.distinct or query.is_sliced
+                or query.combinator or query.group_by is not None)
+
+
+def contar(queryset):
+    """
+    Número de filas de ``queryset`` como ``Recuento``.
+
+    Solo se estima cuando el queryset recorre la tabla entera y las
+    estadísticas superan el umbral; en tablas pequeñas, donde las
+    estadísticas son poco fiables, se hace el ``COUNT(*)`` exacto. Con
+    filtros se cuentan como mucho ``umbral`` filas (``COUNT`` sobre un
+    ``LIMIT``): por debajo el total es exacto y, si se alcanza, es un mínimo.
+    """
+    if not isinstance(queryset, QuerySet):
+        return Recuento(len(queryset))
+    umbral = _config_paginacion()['umbral_estimacion']
+    if _sin_filtrar(queryset):
+        estimacion = estimar_filas(queryset.model, queryset.db)
+        if estimacion is not None and estimacion >= umbral:
+            return Recuento(estimacion, aproximado=True)
+        return Recuento(queryset.count())
+    if queryset.query.is_sliced:
+        return Recuento(queryset.count())
+    valor = queryset.order_by()[:umbral].count()
+    if valor >= umbral:
+        return Recuento(valor, aproximado=True, minimo=True)
+    return Recuento(valor)
+
+
+class PaginadorEstimado(Paginator):
+    """
+    ``Paginator`` cuyo total sale de ``contar``.
+
+    Con un total aproximado la última página puede quedar corta o vacía, así
+    que no se rechazan los números de página por encima de ``num_pages``.
+    """
+
+    aproximado = False
+
+    @cached_property
+    def count(self):
+        recuento = contar(self.object_list)
+        self.aproximado = recuento.aproximado
+        return recuento.valor
+
+    def validate_number(self, number):
+        try:
+            return super().validate_number(number)
+        except EmptyPage:
+            if not self.aproximado or int(number) < 1:
+                raise
+            return int(number)
+
+
+def _codificar_valor(valor):
+    # datetime es subclase de date y bool de int: el orden de los casos importa
+    if valor is None:
+        return ['n', None]
+    if isinstance(valor, bool):
+        return ['b', valor]
+    if isinstance(valor, datetime):
+        return ['t', valor.isoformat()]
+    if isinstance(valor, date):
+        return ['d', valor.isoformat()]
+    if isinstance(valor, Decimal):
+        return ['D', str(valor)]
+    if isinstance(valor, int):
+        return ['i', valor]
+    if isinstance(valor, float):
+        return ['f', repr(valor)]
+    return ['s', str(valor)]
+
+
+def _decodificar_valor(tipo, valor):
+    decodificadores = {
+        'n': lambda v: None,
+        'b': bool,
+        't': datetime.fromisoformat,
+        'd': date.fromisoformat,
+        'D': Decimal,
+        'i': int,
+        'f': float,
+        's': str,
+    }
+    return decodificadores[tipo](valor)
+
+
+def codificar_cursor(direccion, campos, valores):
+    return signing.dumps(
+        [direccion, list(campos), [_codificar_valor(valor) for valor in valores]],
+        salt=SALT, compress=True,
+    )
+
+
+def decodificar_cursor(cursor, campos):
+    """Devuelve ``(direccion, valores)`` o lanza ``CursorInvalido``"""
+    try:
+        direccion, campos_cursor, valores = signing.loads(cursor, salt=SALT)
+        if direccion not in (SIGUIENTE, ANTERIOR) or campos_cursor != list(campos):
+            raise CursorInvalido(cursor)
+        return direccion, [_decodificar_valor(tipo, valor) for tipo, valor in valores]
+    except CursorInvalido:
+        raise
+    except Exception as exc:
+        raise CursorInvalido(cursor) from exc
+
+
+def _admite_nulos(queryset, campo):
+    anotacion = queryset.query.annotations.get(campo)
+    if anotacion is not None:
+        return getattr(anotacion.output_field, 'null', True)
+    opts = queryset.model._meta
+    for parte in campo.split('__'):
+        field = opts.pk if parte == 'pk' else opts.get_field(parte)
+        if field.null:
+            return True
+        if field.is_relation:
+            opts = field.related_model._meta
+    return False
+
+
+def campos_orden(queryset):
+    """
+    Campos de ``order_by`` del queryset como ``[(campo, descendente, nulos)]``,
+    donde ``nulos`` indica si la columna admite NULL.
+    """
+    campos = []
+    for campo in queryset.query.order_by:
+        if not isinstance(campo, str) or campo == '?':
+            raise ValueError('La paginación por cursor solo admite ordenar por nombres de campo')
+        nombre = campo.lstrip('-')
+        campos.append((nombre, campo.startswith('-'), _admite_nulos(queryset, nombre)))
+    if not campos:
+        raise ValueError('La paginación por cursor necesita un queryset ordenado')
+    return campos
+
+
+def _posteriores(campo, descendente, nulos, valor, inclusive=False):
+    """
+    Filas posteriores a ``valor`` en un campo (o iguales si ``inclusive``).
+
+    Se asume que los NULL van primero en orden ascendente y al final en
+    descendente, que es como los ordenan MySQL y SQLite.
+    """
+    if valor is None:
+        if descendente:
+            return Q(**{f'{campo}__isnull': True}) if inclusive else Q(pk__in=[])
+        return Q() if inclusive else Q(**{f'{campo}__isnull': False})
+    operador = ('lt' if descendente else 'gt') + ('e' if inclusive else '')
+    condicion = Q(**{f'{campo}__{operador}': valor})
+    if descendente and nulos:
+        condicion |= Q(**{f'{campo}__isnull': True})
+    return condicion
+
+
+def _igualdad(campo, valor):
+    if valor is None:
+        return Q(**{f'{campo}__isnull': True})
+    return Q(**{campo: valor})
+
+
+def filtro_keyset(campos, valores):
+    """
+    Condición lexicográfica ``(c1, c2, ...) > (v1, v2, ...)`` respetando la
+    dirección de cada campo.
+
+    Se añade además la cota no estricta sobre el primer campo: es redundante,
+    pero sin ella los optimizadores no convierten el OR en un rango sobre el
+    índice y acaban leyéndolo desde el principio.
+    """
+    condicion = Q(pk__in=[])
+    prefijo = Q()
+    for (campo, descendente, nulos), valor in zip(campos, valores):
+        condicion |= prefijo & _posteriores(campo, descendente, nulos, valor)
+        prefijo &= _igualdad(campo, valor)
+    campo, descendente, nulos = campos[0]
+    return _posteriores(campo, descendente, nulos, valores[0], inclusive=True) & condicion
+
+
+def valor_campo(obj, campo):
+    for parte in campo.split('__'):
+        obj = getattr(obj, parte) if obj is not None else None
+    return obj
+
+
+class PaginaCursor:
+    """Página de resultados con enlaces al cursor anterior y siguiente"""
+
+    def __init__(self, object_list, url_anterior=None, url_siguiente=None):
+        self.object_list = object_list
+        self.url_anterior = url_anterior
+        self.url_siguiente = url_siguiente
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, indice):
+        return self.object_list[indice]
+
+    def has_previous(self):
+        return self.url_anterior is not None
+
+    def has_next(self):
+        return self.url_siguiente is not None
+
+    def has_other_pages(self):
+        return self.has_previous() or self.has_next()
+
+
+def paginar_por_cursor(queryset, tamano, cursor=None):
+    """
+    Lee una página de ``queryset`` a partir de ``cursor``.
+
+    Devuelve ``(filas, cursor_anterior, cursor_siguiente)``; los cursores son
+    None cuando no hay página en esa dirección. Se hace una sola consulta de
+    ``tamano + 1`` filas, que basta para saber si hay más.
+    """
+    campos = campos_orden(queryset)
+    direccion, valores = SIGUIENTE, None
+    if cursor:
+        try:
+            direccion, valores = decodificar_cursor(cursor, [c[0] for c in campos])
+        except CursorInvalido:
+            direccion, valores = SIGUIENTE, None
+
+    if direccion == ANTERIOR:
+        invertidos = [(campo, not desc, nulos) for campo, desc, nulos in campos]
+        filas = list(
+            queryset.filter(filtro_keyset(invertidos, valores))
+            .order_by(*[('-' if desc else '') + campo for campo, desc, _ in invertidos])
+            [:tamano + 1]
+        )
+        hay_mas = len(filas) > tamano
+        filas = filas[:tamano][::-1]
+        hay_anterior, hay_siguiente = hay_mas, True
+    else:
+        if valores is not None:
+            queryset = queryset.filter(filtro_keyset(campos, valores))
+        filas = list(queryset[:tamano + 1])
+        hay_siguiente = len(filas) > tamano
+        filas = filas[:tamano]
+        hay_anterior = valores is not None
+
+    if not filas:
+        return filas, None, None
+
+    nombres = [campo for campo, _, _ in campos]
+
+    def _cursor(direccion, obj):
+        return codificar_cursor(direccion, nombres, [valor_campo(obj, campo) for campo in nombres])
+
+    anterior = _cursor(ANTERIOR, filas[0]) if hay_anterior else None
+    siguiente = _cursor(SIGUIENTE, filas[-1]) if hay_siguiente else None
+    return filas, anterior, siguiente
+
+
+class PaginacionCursorMixin:
+    """
+    Sustituye la paginación por número de página de ``ListView``.
+
+    La ordenación se toma del ``order_by`` del queryset, así que debe
+    terminar en un campo único. El contexto conserva ``page_obj`` e
+    ``is_paginated``, pero ``paginator`` es None; con ``contar_total`` el
+    total del listado va en ``total`` como ``Recuento`` (estimado en tablas
+    grandes). Con ``?formato=json`` la vista devuelve la página como JSON
+    (``resultados`` y las URLs ``siguiente`` y ``anterior``) para los
+    botones de "cargar más"; las vistas que lo usen definen
+    ``serializar_objeto``.
+    """
+
+    cursor_kwarg = 'cursor'
+    contar_total = True
+
+    def _url_cursor(self, cursor):
+        if cursor is None:
+            return None
+        parametros = self.request.GET.copy()
+        parametros.pop('page', None)
+        parametros[self.cursor_kwarg] = cursor
+        return f'?{parametros.urlencode()}'
+
+    def paginate_queryset(self, queryset, page_size):
+        filas, anterior, siguiente = paginar_por_cursor(
+            queryset, page_size, self.request.GET.get(self.cursor_kwarg)
+        )
+        pagina = PaginaCursor(filas, self._url_cursor(anterior), self._url_cursor(siguiente))
+        return (None, pagina, pagina.object_list, pagina.has_other_pages())
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        if self.contar_total and not self.quiere_json():
+            context['total'] = contar(self.object_list)
+        return context
+
+    def quiere_json(self):
+        return self.request.GET.get('formato') == 'json'
+
+    def serializar_objeto(self, obj):
+        return {'id': obj.pk, 'texto': str(obj)}
+
+    def render_to_response(self, context, **response_kwargs):
+        if self.quiere_json():
+            pagina = context['page_obj']
+            return JsonResponse({
+                'resultados': [self.serializar_objeto(obj) for obj in context['object_list']],
+                'anterior': pagina.url_anterior if pagina else None,
+                'siguiente': pagina.url_siguiente if pagina else None,
+            })
+        return super().render_to_response(context, **response_kwargs)
@@ -1,3 +1,4 @@
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 
 from account.signals import password_changed
@@ -6,6 +7,11 @@ from account.signals import user_login_attempt, user_logged_in
 
 from pinax.eventlog.models import log
 
+from arenasurf.cache import invalidar
+from bonos.models import Bono, UsoBono
+from clientes.models import Cliente
+from socios.models import Socio
+
 
 @receiver(user_logged_in)
 def handle_user_logged_in(sender, **kwargs):
@@ -57,3 +63,38 @@ def handle_user_signed_up(sender, **kwargs):
         action="USER_SIGNED_UP",
         extra={}
     )
+
+
+# Invalidación de la caché versionada
+
+@receiver(post_save, sender=Cliente)
+@receiver(post_delete, sender=Cliente)
+def invalidar_cliente(sender, instance, **kwargs):
+    invalidar(Cliente, [instance.pk])
+
+
+@receiver(post_save, sender=Bono)
+@receiver(post_delete, sender=Bono)
+def invalidar_bono(sender, instance, **kwargs):
+    invalidar(Bono, [instance.pk])
+    previo = getattr(instance, '_estado_previo', None) or {}
+    invalidar(Cliente, [instance.cliente_id, previo.get('cliente_id')])
+
+
+@receiver(post_save, sender=UsoBono)
+@receiver(post_delete, sender=UsoBono)
+def invalidar_uso(sender, instance, **kwargs):
+    if UsoBono.bono.is_cached(instance):
+        cliente_id = instance.bono.cliente_id
+    else:
+        cliente_id = Bono.objects.filter(pk=instance.bono_id).values_list('cliente_id', flat=True).first()
+    invalidar(UsoBono, [instance.pk])
+    invalidar(Bono, [instance.bono_id])
+    invalidar(Cliente, [cliente_id])
+
+
+@receiver(post_save, sender=Socio)
+@receiver(post_delete, sender=Socio)
+def invalidar_socio(sender, instance, **kwargs):
+    invalidar(Socio, [instance.pk])
+    invalidar(Cliente, [instance.cliente_id])
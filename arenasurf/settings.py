@@ -12,9 +12,55 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": "dev.db",
+        # Espera a que se libere el bloqueo de escritura en lugar de fallar
+        # enseguida con "database is locked" cuando hay varios hilos
+        "OPTIONS": {
+            "timeout": 20,
+        },
+        # Base de datos de tests en fichero para poder probar accesos concurrentes
+        "TEST": {
+            "NAME": os.path.join(PROJECT_ROOT, "test_arenasurf.db"),
+        },
+    }
+}
+
+# Caché local: no requiere servicios externos. Para compartirla entre
+# varios procesos basta con usar el backend de ficheros
+# (django.core.cache.backends.filebased.FileBasedCache).
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "arenasurf",
     }
 }
 
+# Stale-while-revalidate de los dashboards: TTL blando y máximo en segundos
+ARENASURF_CACHE_SWR = {
+    "fresco": 30,
+    "maximo": 300,
+}
+
+# Contadores de versión para invalidar la caché por cliente, bono y socio.
+# "backend" admite cualquier clase con la interfaz de VersionesCache.
+ARENASURF_CACHE_VERSIONES = {
+    "backend": "arenasurf.cache.VersionesCache",
+    "alias": "default",
+    "timeout": 3600,
+}
+
+# Numeración de socios. Con "bloque" > 1 cada proceso reserva ese número de
+# valores de golpe: menos bloqueos a cambio de huecos si el proceso termina.
+ARENASURF_SECUENCIAS = {
+    "bloque": 1,
+}
+
+# Por encima de este número de filas (según las estadísticas del motor) los
+# listados sin filtrar muestran un total aproximado en lugar de hacer COUNT(*);
+# los filtrados se cuentan como mucho hasta este número
+ARENASURF_PAGINACION = {
+    "umbral_estimacion": 10000,
+}
+
 ALLOWED_HOSTS = [
     "localhost",
     "127.0.0.1",
@@ -0,0 +1,569 @@
+import csv
+import gzip
+import io
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.contrib.sites.models import Site
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.paginator import EmptyPage
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.http import QueryDict
+from django.urls import reverse
+from django.utils import timezone
+
+from bonos.models import Bono, UsoBono
+from bonos.services import redimir_bono
+from clientes.models import Cliente
+from socios.models import Socio, Taquilla
+from .cache import cache_swr, cache_versionada, clave_versionada, invalidar
+from .exportacion import EXPORTACIONES
+from .paginacion import PaginadorEstimado, Recuento, contar
+
+
+class Contador:
+
+    def __init__(self, espera=0):
+        self.llamadas = 0
+        self.espera = espera
+        self.lock = threading.Lock()
+
+    def __call__(self):
+        with self.lock:
+            self.llamadas += 1
+            n = self.llamadas
+        time.sleep(self.espera)
+        return n
+
+
+@override_settings(ARENASURF_CACHE_SWR={'segundo_plano': False})
+class CacheSWRTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_valor_fresco_no_se_recalcula(self):
+        construir = Contador()
+        self.assertEqual(cache_swr('k', construir, fresco=60), 1)
+        self.assertEqual(cache_swr('k', construir, fresco=60), 1)
+        self.assertEqual(construir.llamadas, 1)
+
+    def test_valor_caducado_se_sirve_y_se_renueva(self):
+        construir = Contador()
+        cache_swr('k', construir, fresco=0)
+        # Se sirve la copia antigua mientras se renueva
+        self.assertEqual(cache_swr('k', construir, fresco=60), 1)
+        self.assertEqual(construir.llamadas, 2)
+        self.assertEqual(cache_swr('k', construir, fresco=60), 2)
+
+    def test_sin_copia_solo_un_worker_calcula(self):
+        construir = Contador(espera=0.2)
+        resultados = []
+
+        def pedir():
+            resultados.append(cache_swr('k', construir, fresco=60))
+
+        hilos = [threading.Thread(target=pedir) for _ in range(5)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        self.assertEqual(construir.llamadas, 1)
+        self.assertEqual(resultados, [1] * 5)
+
+    @override_settings(ARENASURF_CACHE_SWR={'segundo_plano': True})
+    def test_renovacion_en_segundo_plano(self):
+        construir = Contador()
+        cache_swr('k', construir, fresco=0)
+        self.assertEqual(cache_swr('k', construir, fresco=60), 1)
+        limite = time.time() + 2
+        while construir.llamadas < 2 and time.time() < limite:
+            time.sleep(0.01)
+        time.sleep(0.05)
+        self.assertEqual(cache_swr('k', construir, fresco=60), 2)
+
+
+class CacheVersionadaTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.usuario = User.objects.create_user('cliente', password='x')
+        self.cliente = Cliente.objects.create(
+            usuario=self.usuario, nombre='Ane', apellidos='Etxeberria', email='ane@example.com'
+        )
+
+    def test_invalidar_cambia_la_clave(self):
+        entidades = [(Cliente, self.cliente.pk)]
+        antes = clave_versionada('prueba', entidades)
+        self.assertEqual(antes, clave_versionada('prueba', entidades))
+        invalidar(Cliente, [self.cliente.pk])
+        self.assertNotEqual(antes, clave_versionada('prueba', entidades))
+
+    def test_cambios_en_bonos_invalidan_al_cliente(self):
+        entidades = [(Cliente, self.cliente.pk)]
+        claves = {clave_versionada('prueba', entidades)}
+        bono = Bono.objects.create(cliente=self.cliente, tipo_bono=10)
+        claves.add(clave_versionada('prueba', entidades))
+        redimir_bono(bono)
+        claves.add(clave_versionada('prueba', entidades))
+        bono.delete()
+        claves.add(clave_versionada('prueba', entidades))
+        self.assertEqual(len(claves), 4)
+
+    def test_valor_cacheado_hasta_que_cambia_la_version(self):
+        llamadas = []
+
+        def construir():
+            llamadas.append(1)
+            return len(llamadas)
+
+        entidades = [(Cliente, self.cliente.pk)]
+        self.assertEqual(cache_versionada('prueba', entidades, construir), 1)
+        self.assertEqual(cache_versionada('prueba', entidades, construir), 1)
+        self.cliente.save()
+        self.assertEqual(cache_versionada('prueba', entidades, construir), 2)
+
+    def test_api_bonos_se_cachea_y_no_queda_obsoleta(self):
+        bono = Bono.objects.create(cliente=self.cliente, tipo_bono=10)
+        self.client.force_login(self.usuario)
+        url = reverse('clientes:bonos_ajax')
+
+        self.assertEqual(self.client.get(url).json()['bonos'][0]['usos_restantes'], 10)
+        # sesión + usuario + cliente; los bonos salen de la caché
+        with self.assertNumQueries(3):
+            self.client.get(url)
+
+        redimir_bono(bono)
+        self.assertEqual(self.client.get(url).json()['bonos'][0]['usos_restantes'], 9)
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class PaginacionCursorTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('staff', password='x', is_staff=True)
+        hoy = date.today()
+        for n in range(45):
+            # Apellidos y fechas repetidos para que el desempate por id cuente
+            cliente = Cliente.objects.create(
+                nombre='Nombre', apellidos=f'Apellido{n % 4}', email=f'c{n}@example.com',
+            )
+            Bono.objects.create(cliente=cliente, tipo_bono=10, usos_restantes=n % 3)
+            if n % 2:
+                Socio.objects.create(cliente=cliente, fecha_vencimiento=hoy + timedelta(days=n % 5 - 2))
+        fecha = timezone.now()
+        Bono.objects.filter(pk__in=Bono.objects.values('pk')[:20]).update(fecha_compra=fecha)
+
+    def setUp(self):
+        Site.objects.clear_cache()
+        self.client.force_login(self.staff)
+
+    def recorrer(self, url, nombre_lista):
+        """Ids de todas las páginas hacia delante y de vuelta hacia atrás"""
+        ruta = url.split('?')[0]
+        adelante, paginas = [], []
+        destino = url
+        while destino:
+            contexto = self.client.get(destino).context
+            paginas.append(contexto['page_obj'])
+            adelante.extend(obj.pk for obj in contexto[nombre_lista])
+            destino = contexto['page_obj'].url_siguiente and ruta + contexto['page_obj'].url_siguiente
+        atras = [obj.pk for obj in paginas[-1]]
+        anterior = paginas[-1].url_anterior
+        while anterior:
+            contexto = self.client.get(ruta + anterior).context
+            atras[:0] = [obj.pk for obj in contexto[nombre_lista]]
+            anterior = contexto['page_obj'].url_anterior
+        return adelante, atras, len(paginas)
+
+    def comprobar_recorrido(self, url, nombre_lista, queryset):
+        esperado = list(queryset.values_list('pk', flat=True))
+        adelante, atras, n_paginas = self.recorrer(url, nombre_lista)
+        self.assertEqual(adelante, esperado)
+        self.assertEqual(atras, esperado)
+        self.assertEqual(n_paginas, -(-len(esperado) // 20))
+
+    def test_bonos_en_todas_las_ordenaciones(self):
+        base = Bono.objects.with_usage()
+        self.comprobar_recorrido(reverse('bonos:lista'), 'bonos', base.order_by('-fecha_compra', '-id'))
+        self.comprobar_recorrido(
+            reverse('bonos:lista') + '?orden=uso', 'bonos',
+            base.order_by('-porcentaje_uso_db', '-fecha_compra', '-id'),
+        )
+        self.comprobar_recorrido(
+            reverse('bonos:lista') + '?orden=restantes', 'bonos',
+            base.order_by('usos_restantes', '-fecha_compra', '-id'),
+        )
+
+    def test_clientes_y_socios(self):
+        self.comprobar_recorrido(
+            reverse('clientes:lista'), 'clientes',
+            Cliente.objects.filter(activo=True).order_by('apellidos', 'nombre', 'id'),
+        )
+        self.comprobar_recorrido(
+            reverse('socios:lista') + '?orden=vencimiento', 'socios',
+            Socio.objects.with_vigencia().order_by('-vigente_db', 'dias_vencimiento_db', 'numero_socio'),
+        )
+
+    def test_coste_constante_sin_offset(self):
+        url = reverse('bonos:lista')
+        siguiente = self.client.get(url).context['page_obj'].url_siguiente
+        consultas = []
+        for destino in (url, url + siguiente):
+            with CaptureQueriesContext(connection) as ctx:
+                self.client.get(destino)
+            consultas.append(ctx.captured_queries)
+        self.assertEqual(len(consultas[0]), len(consultas[1]))
+        for sql in [c['sql'] for c in consultas[1]]:
+            self.assertNotIn('OFFSET', sql)
+        # El único COUNT es el del total, no uno por página
+        self.assertEqual(sum('COUNT(' in c['sql'] for c in consultas[1]), 1)
+
+    def test_cursor_invalido_o_de_otra_ordenacion(self):
+        url = reverse('clientes:lista')
+        primera = [c.pk for c in self.client.get(url).context['clientes']]
+        self.assertEqual([c.pk for c in self.client.get(url, {'cursor': 'basura'}).context['clientes']], primera)
+        siguiente = self.client.get(url, {'orden': 'usos'}).context['page_obj'].url_siguiente
+        cursor = QueryDict(siguiente[1:])['cursor']
+        respuesta = self.client.get(url, {'orden': 'nombre', 'cursor': cursor})
+        self.assertEqual([c.pk for c in respuesta.context['clientes']], primera)
+
+    def test_cargar_mas_en_json(self):
+        url = reverse('bonos:lista')
+        datos = self.client.get(url, {'formato': 'json'}).json()
+        self.assertEqual(len(datos['resultados']), 20)
+        self.assertIsNone(datos['anterior'])
+        self.assertIn('formato=json', datos['siguiente'])
+        siguientes = self.client.get(url + datos['siguiente']).json()
+        ids = [b['id'] for b in datos['resultados'] + siguientes['resultados']]
+        self.assertEqual(ids, list(Bono.objects.order_by('-fecha_compra', '-id').values_list('pk', flat=True)[:40]))
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class RecuentoEstimadoTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'x')
+        for n in range(25):
+            cliente = Cliente.objects.create(nombre='Nombre', apellidos=f'A{n}', email=f'c{n}@example.com')
+            Bono.objects.create(cliente=cliente, tipo_bono=5)
+
+    def setUp(self):
+        Site.objects.clear_cache()
+        if connection.vendor not in ('sqlite', 'mysql'):
+            self.skipTest(f'Sin estadísticas para {connection.vendor}')
+        call_command('actualizar_estadisticas', stdout=StringIO())
+        self.client.force_login(self.admin)
+
+    def test_tablas_pequenas_se_cuentan_exactas(self):
+        self.assertEqual(contar(Bono.objects.all()), Recuento(25))
+
+    @override_settings(ARENASURF_PAGINACION={'umbral_estimacion': 10})
+    def test_por_encima_del_umbral_se_estima_sin_count(self):
+        with CaptureQueriesContext(connection) as ctx:
+            recuento = contar(Bono.objects.order_by('-pk'))
+        self.assertTrue(recuento.aproximado)
+        self.assertEqual(recuento.valor, 25)
+        self.assertFalse(any('COUNT(' in q['sql'] for q in ctx.captured_queries))
+        # Con filtros no sirven las estadísticas de la tabla: se cuenta hasta el umbral
+        self.assertEqual(contar(Bono.objects.filter(tipo_bono=5)[:100]), Recuento(25))
+        self.assertEqual(contar(Bono.objects.filter(activo=True)), Recuento(10, aproximado=True, minimo=True))
+        self.assertEqual(contar(Bono.objects.filter(pk__lte=Bono.objects.order_by('pk')[4].pk)), Recuento(5))
+
+    @override_settings(ARENASURF_PAGINACION={'umbral_estimacion': 10})
+    def test_admin_y_listados_marcan_el_total_aproximado(self):
+        respuesta = self.client.get(reverse('admin:bonos_bono_changelist'))
+        self.assertTrue(respuesta.context['cl'].paginator.aproximado)
+        self.assertContains(respuesta, '≈')
+        self.assertContains(self.client.get(reverse('bonos:lista')), '≈ 25')
+        self.assertNotContains(self.client.get(reverse('bonos:lista'), {'caducan': 7}), '≈')
+        # El listado de clientes siempre filtra (activo=True): no hay COUNT(*) completo
+        with CaptureQueriesContext(connection) as ctx:
+            respuesta = self.client.get(reverse('clientes:lista'))
+        self.assertContains(respuesta, 'más de 10')
+        self.assertTrue(any('LIMIT 10' in q['sql'] for q in ctx.captured_queries if 'COUNT(' in q['sql']))
+
+    def test_paginas_de_mas_con_total_aproximado(self):
+        paginador = PaginadorEstimado(Bono.objects.order_by('pk'), 10)
+        paginador.__dict__['count'] = 45
+        paginador.aproximado = True
+        self.assertEqual(list(paginador.page(5)), [])
+        with self.assertRaises(EmptyPage):
+            PaginadorEstimado(Bono.objects.order_by('pk'), 10).page(5)
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class AdminListadosTests(TestCase):
+    """Los changelists hacen las mismas consultas con 2 filas que con 30"""
+
+    changelists = [
+        'admin:bonos_bono_changelist', 'admin:bonos_usobono_changelist',
+        'admin:clientes_cliente_changelist', 'admin:socios_socio_changelist',
+        'admin:socios_taquilla_changelist',
+    ]
+
+    def setUp(self):
+        self.n = 0
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'x'))
+
+    def sembrar(self, n):
+        for _ in range(n):
+            self.n += 1
+            usuario = User.objects.create_user(f'u{self.n}', password='x')
+            cliente = Cliente.objects.create(
+                nombre='Nombre', apellidos=f'A{self.n}', email=f'c{self.n}@example.com', usuario=usuario,
+            )
+            bono = Bono.objects.create(cliente=cliente, tipo_bono=10)
+            UsoBono.objects.create(bono=bono, fecha_uso=date.today())
+            socio = Socio.objects.create(cliente=cliente, fecha_vencimiento=date.today())
+            Taquilla.objects.create(numero=self.n, socio=socio)
+
+    def consultas(self):
+        resultado = {}
+        for nombre in self.changelists:
+            Site.objects.clear_cache()
+            with CaptureQueriesContext(connection) as ctx:
+                self.assertEqual(self.client.get(reverse(nombre)).status_code, 200)
+            resultado[nombre] = len(ctx)
+        return resultado
+
+    def test_consultas_constantes(self):
+        self.sembrar(2)
+        pocas = self.consultas()
+        self.sembrar(28)
+        self.assertEqual(self.consultas(), pocas)
+
+
+class ExportacionCSVTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('staff', password='x', is_staff=True)
+        cls.clientes = [
+            Cliente.objects.create(nombre=f'Cliente{n}', apellidos='Núñez', email=f'c{n}@example.com')
+            for n in range(5)
+        ]
+        cls.bonos = [Bono.objects.create(cliente=cliente, tipo_bono=10) for cliente in cls.clientes]
+        Bono.objects.filter(pk=cls.bonos[0].pk).update(fecha_compra=timezone.now() - timedelta(days=400))
+        Bono.objects.filter(pk=cls.bonos[1].pk).update(activo=False)
+        for n, bono in enumerate(cls.bonos):
+            UsoBono.objects.create(bono=bono, fecha_uso=date(2024, 1, n + 1), descripcion='Clase, "grupo"')
+        Socio.objects.create(cliente=cls.clientes[0], fecha_vencimiento=date.today() - timedelta(days=1))
+        Socio.objects.create(cliente=cls.clientes[1], fecha_vencimiento=date.today() + timedelta(days=30))
+
+    def setUp(self):
+        self.client.force_login(self.staff)
+
+    def leer(self, respuesta):
+        contenido = b''.join(respuesta.streaming_content)
+        if respuesta['Content-Type'] == 'application/gzip':
+            contenido = gzip.decompress(contenido)
+        return list(csv.reader(io.StringIO(contenido.decode('utf-8-sig'))))
+
+    def test_usos_con_bono_y_cliente(self):
+        respuesta = self.client.get(reverse('bonos:exportar_usos'))
+        self.assertTrue(respuesta.streaming)
+        self.assertIn('attachment; filename="usos.csv"', respuesta['Content-Disposition'])
+        filas = self.leer(respuesta)
+        self.assertEqual(filas[0][:3], ['id', 'fecha_uso', 'descripcion'])
+        self.assertEqual(len(filas), 6)
+        self.assertEqual(filas[1][1:3], ['2024-01-01', 'Clase, "grupo"'])
+        self.assertEqual(filas[1][-3:], ['Cliente0', 'Núñez', 'c0@example.com'])
+
+    def test_filtros_en_sql(self):
+        filas = self.leer(self.client.get(reverse('bonos:exportar_usos'), {'desde': '2024-01-02', 'hasta': '2024-01-03'}))
+        self.assertEqual([f[1] for f in filas[1:]], ['2024-01-02', '2024-01-03'])
+        hace_un_mes = (date.today() - timedelta(days=30)).isoformat()
+        filas = self.leer(self.client.get(reverse('bonos:exportar'), {'desde': hace_un_mes, 'estado': 'activo'}))
+        self.assertEqual([int(f[0]) for f in filas[1:]], [b.pk for b in self.bonos[2:]])
+        filas = self.leer(self.client.get(reverse('socios:exportar'), {'estado': 'vencido'}))
+        self.assertEqual([f[3] for f in filas[1:]], ['Cliente0'])
+
+    def test_filtros_no_validos(self):
+        for parametros in ({'desde': 'ayer'}, {'estado': 'perdido'}):
+            with self.subTest(parametros=parametros):
+                respuesta = self.client.get(reverse('clientes:exportar'), parametros)
+                self.assertEqual(respuesta.status_code, 400)
+
+    def test_gzip(self):
+        respuesta = self.client.get(reverse('clientes:exportar'), {'gzip': '1', 'estado': 'activo'})
+        self.assertEqual(respuesta['Content-Type'], 'application/gzip')
+        self.assertIn('clientes_activo.csv.gz', respuesta['Content-Disposition'])
+        self.assertEqual(len(self.leer(respuesta)), 6)
+
+    def test_lectura_por_bloques(self):
+        exportacion = EXPORTACIONES['usos']
+        with self.assertNumQueries(3):
+            filas = list(exportacion.filas(exportacion.queryset(), chunk_size=2))
+        self.assertEqual(len(filas), 5)
+
+    def test_solo_staff(self):
+        self.client.force_login(User.objects.create_user('cliente', password='x'))
+        self.assertEqual(self.client.get(reverse('bonos:exportar')).status_code, 302)
+
+    def test_comando(self):
+        with tempfile.TemporaryDirectory() as directorio:
+            ruta = os.path.join(directorio, 'usos.csv.gz')
+            salida = StringIO()
+            call_command('exportar_csv', 'usos', '--gzip', '--salida', ruta, '--chunk-size', '2', stdout=salida)
+            self.assertIn('5 filas de usos', salida.getvalue())
+            with gzip.open(ruta, 'rt', encoding='utf-8-sig') as fichero:
+                self.assertEqual(len(list(csv.reader(fichero))), 6)
+
+
+# Tablas que crecen con el negocio: ninguna consulta de las vistas
+# habituales debe recorrerlas enteras
+TABLAS_GRANDES = ('bonos_bono', 'bonos_usobono', 'clientes_cliente', 'socios_socio')
+
+
+def problemas_sqlite(sql):
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+        pasos = [(id_, padre, detalle) for id_, padre, _, detalle in cursor.fetchall()]
+    # El plan nombra las tablas por su alias (U0, T3...) si lo tienen
+    tablas = {alias: tabla for tabla, alias in re.findall(r'"(\w+)" (?:AS )?"?([A-Z]\d+)\b', sql)}
+    # Recorrer un índice entero solo es barato si un LIMIT lo corta o si la
+    # consulta es un agregado de una fila (totales de los dashboards)
+    indice_entero = re.search(r'\bLIMIT\b', sql) or (
+        re.match(r'SELECT (COUNT|SUM|AVG|MIN|MAX)\(', sql) and 'GROUP BY' not in sql
+    )
+    derivadas = {d.split(' ', 1)[1] for _, _, d in pasos if d.startswith(('CO-ROUTINE ', 'MATERIALIZE '))}
+    hijos = defaultdict(list)
+    for id_, padre, detalle in pasos:
+        hijos[padre].append((id_, detalle))
+
+    def accesos(padre):
+        """Accesos a tablas del SELECT ``padre`` y de sus subconsultas"""
+        for id_, detalle in hijos[padre]:
+            partes = detalle.split(' ')
+            if partes[0] in ('SEARCH', 'SCAN') and not partes[1].startswith('(') and partes[1] not in derivadas:
+                yield detalle
+            yield from accesos(id_)
+
+    problemas = []
+    for _, padre, detalle in pasos:
+        partes = detalle.split(' ')
+        if partes[0] == 'SCAN' and tablas.get(partes[1], partes[1]) in TABLAS_GRANDES:
+            if ' INDEX ' not in detalle or not indice_entero:
+                problemas.append(detalle)
+        elif 'TEMP B-TREE FOR ORDER BY' in detalle:
+            # Ordenar en memoria las filas ya acotadas por un índice (las de
+            # un cliente, por ejemplo) es barato, pero solo si todas las tablas
+            # de las que salen (también a través de subconsultas) vienen de un SEARCH
+            propios = list(accesos(padre))
+            if not propios or not all(a.startswith('SEARCH ') for a in propios):
+                problemas.append(detalle)
+    return problemas
+
+
+def problemas_mysql(sql):
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN ' + sql)
+        columnas = [c[0].lower() for c in cursor.description]
+        filas = [dict(zip(columnas, fila)) for fila in cursor.fetchall()]
+    acotada = bool(filas) and filas[0]['type'] in ('const', 'eq_ref', 'ref', 'range')
+    problemas = [f for f in filas if f['type'] == 'ALL' and f['table'] in TABLAS_GRANDES]
+    if not acotada:
+        problemas += [f for f in filas if 'Using filesort' in (f.get('extra') or '')]
+    return problemas
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class PlanesConsultaTests(TestCase):
+    """EXPLAIN de las consultas de las vistas más usadas sobre datos sembrados"""
+
+    vistas_staff = [
+        'bonos:dashboard', 'bonos:lista', ('bonos:lista', '?caducan=7'),
+        'clientes:lista', ('clientes:lista', '?search=apellido1'), ('clientes:detalle', 1),
+        'socios:dashboard', 'socios:lista',
+        ('socios:lista', '?estado=vigente'), ('socios:lista', '?estado=vencido'),
+        ('socios:lista', '?nivel=VIP'), ('socios:lista', '?vence_en=7'),
+        ('socios:lista', '?search=nombre'),
+    ]
+    vistas_cliente = ['clientes:panel', 'clientes:bonos_ajax', 'clientes:resumen_ajax']
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('staff', password='x', is_staff=True)
+        cls.usuario = User.objects.create_user('cliente', password='x')
+        hoy = date.today()
+        for n in range(30):
+            cliente = Cliente.objects.create(
+                nombre=f'Nombre{n}', apellidos=f'Apellido{n}', email=f'c{n}@example.com',
+                usuario=cls.usuario if n == 0 else None,
+            )
+            bono = Bono.objects.create(cliente=cliente, tipo_bono=10)
+            UsoBono.objects.create(bono=bono, fecha_uso=hoy - timedelta(days=n))
+            if n % 2:
+                Socio.objects.create(cliente=cliente, fecha_vencimiento=hoy + timedelta(days=n - 10))
+
+    def setUp(self):
+        Site.objects.clear_cache()
+
+    def url(self, vista):
+        nombre, extra = vista if isinstance(vista, tuple) else (vista, None)
+        if isinstance(extra, int):
+            return reverse(nombre, args=[Cliente.objects.order_by('pk').first().pk])
+        return reverse(nombre) + (extra or '')
+
+    def comprobar(self, usuario, vistas):
+        if connection.vendor == 'sqlite':
+            problemas = problemas_sqlite
+        elif connection.vendor == 'mysql':
+            problemas = problemas_mysql
+        else:
+            self.skipTest(f'Sin comprobación de planes para {connection.vendor}')
+        self.client.force_login(usuario)
+        for vista in vistas:
+            url = self.url(vista)
+            cache.clear()
+            with CaptureQueriesContext(connection) as ctx:
+                self.assertEqual(self.client.get(url).status_code, 200)
+            for consulta in ctx.captured_queries:
+                if consulta['sql'].startswith('SELECT'):
+                    with self.subTest(url=url, sql=consulta['sql'][:120]):
+                        self.assertEqual(problemas(consulta['sql']), [])
+
+    def test_detecta_planes_costosos(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('Comprobación de los planes de SQLite')
+        # Un SEARCH acotado no excusa recorrer y ordenar otra tabla entera
+        self.assertEqual(len(problemas_sqlite(
+            'SELECT U1."id" FROM "clientes_cliente" U0, "bonos_bono" U1 '
+            'WHERE U0."id" = 1 ORDER BY U1."precio"'
+        )), 2)
+        # Un índice entero solo si un LIMIT lo corta
+        sql = 'SELECT "id" FROM "bonos_bono" ORDER BY "fecha_compra"'
+        self.assertEqual(problemas_sqlite(sql), ['SCAN bonos_bono USING COVERING INDEX bonos_fecha_compra'])
+        self.assertEqual(problemas_sqlite(sql + ' LIMIT 10'), [])
+        self.assertEqual(problemas_sqlite(
+            'SELECT "id" FROM "bonos_bono" WHERE "cliente_id" = 1 ORDER BY "precio"'
+        ), [])
+
+    def test_vistas_de_staff(self):
+        self.comprobar(self.staff, self.vistas_staff)
+
+    def test_vistas_del_cliente(self):
+        self.comprobar(self.usuario, self.vistas_cliente)
+
+    def test_paginas_siguientes_por_cursor(self):
+        self.client.force_login(self.staff)
+        vistas = []
+        # Ordenaciones por defecto, que son las que tienen índice
+        for nombre in ('bonos:lista', 'clientes:lista'):
+            pagina = self.client.get(reverse(nombre)).context['page_obj']
+            vistas.append((nombre, pagina.url_siguiente))
+        self.comprobar(self.staff, vistas)
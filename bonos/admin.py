@@ -1,20 +1,66 @@
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.forms.models import BaseInlineFormSet
+from django.http import QueryDict
+from arenasurf.paginacion import PaginadorEstimado
 from .models import Bono, UsoBono
 
 
+class UsosPaginadosFormSet(BaseInlineFormSet):
+    """Formset que solo edita una página de usos, los más recientes primero"""
+
+    por_pagina = 20
+    parametro_pagina = 'usos'
+    parametros = QueryDict()
+
+    def url_pagina(self, numero):
+        parametros = self.parametros.copy()
+        parametros[self.parametro_pagina] = numero
+        return f'?{parametros.urlencode()}'
+
+    def get_queryset(self):
+        if not hasattr(self, '_queryset'):
+            usos = super().get_queryset().order_by('-fecha_uso', '-id')
+            self.pagina = Paginator(usos, self.por_pagina).get_page(
+                self.parametros.get(self.parametro_pagina)
+            )
+            self.url_anterior = self.url_siguiente = None
+            if self.pagina.has_previous():
+                self.url_anterior = self.url_pagina(self.pagina.previous_page_number())
+            if self.pagina.has_next():
+                self.url_siguiente = self.url_pagina(self.pagina.next_page_number())
+            ids = [uso.pk for uso in self.pagina.object_list]
+            # El formset solo asigna bono_id a cada uso; el join evita que su
+            # __str__ cargue el bono y el cliente fila a fila
+            self._queryset = usos.filter(pk__in=ids).select_related('bono__cliente')
+        return self._queryset
+
+
 class UsoBonoInline(admin.TabularInline):
     model = UsoBono
+    formset = UsosPaginadosFormSet
+    template = 'admin/bonos/usos_paginados.html'
     extra = 0
     readonly_fields = ['fecha_uso']
 
+    def get_formset(self, request, obj=None, **kwargs):
+        formset = super().get_formset(request, obj, **kwargs)
+        # La página va en la URL de la ficha, que el formulario conserva al guardar
+        formset.parametros = request.GET
+        return formset
+
 
 @admin.register(Bono)
 class BonoAdmin(admin.ModelAdmin):
     list_display = ['cliente', 'tipo_bono', 'usos_utilizados_display', 'usos_restantes', 'activo', 'fecha_compra']
     list_filter = ['tipo_bono', 'activo', 'fecha_compra']
+    list_select_related = ['cliente']
     search_fields = ['cliente__nombre', 'cliente__apellidos', 'cliente__email']
+    autocomplete_fields = ['cliente']
     readonly_fields = ['fecha_compra', 'usos_totales']
     inlines = [UsoBonoInline]
+    paginator = PaginadorEstimado
+    show_full_result_count = False
     
     def usos_utilizados_display(self, obj):
         return f"{obj.usos_utilizados()}/{obj.usos_totales}"
@@ -37,5 +83,11 @@ class BonoAdmin(admin.ModelAdmin):
 class UsoBonoAdmin(admin.ModelAdmin):
     list_display = ['bono', 'fecha_uso', 'descripcion']
     list_filter = ['fecha_uso']
+    list_select_related = ['bono__cliente']
     search_fields = ['bono__cliente__nombre', 'bono__cliente__apellidos', 'descripcion']
+    # El bono se muestra con el nombre del cliente: un autocompletado haría
+    # una consulta por resultado, el raw id solo una para el seleccionado
+    raw_id_fields = ['bono']
     readonly_fields = ['fecha_uso']
+    paginator = PaginadorEstimado
+    show_full_result_count = False
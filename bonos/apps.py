@@ -1,6 +1,11 @@
+from importlib import import_module
+
 from django.apps import AppConfig
 
 
 class BonosConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "bonos"
+
+    def ready(self):
+        import_module("bonos.receivers")
@@ -1,4 +1,5 @@
 from django import forms
+from clientes.forms import SelectorCliente
 from .models import Bono, UsoBono
 
 
@@ -7,7 +8,7 @@ class BonoForm(forms.ModelForm):
         model = Bono
         fields = ['cliente', 'tipo_bono', 'precio', 'fecha_expiracion']
         widgets = {
-            'cliente': forms.Select(attrs={'class': 'form-control'}),
+            'cliente': SelectorCliente(),
             'tipo_bono': forms.Select(attrs={'class': 'form-control'}),
             'precio': forms.NumberInput(attrs={'class': 'form-control', 'step': '0.01'}),
             'fecha_expiracion': forms.DateTimeInput(attrs={'class': 'form-control', 'type': 'datetime-local'}),
@@ -40,3 +41,101 @@ class UsoBonoForm(forms.ModelForm):
             from django.utils import timezone
             today = timezone.now().date()
             self.fields['fecha_uso'].initial = today.strftime('%Y-%m-%d')
+
+
+class CheckinGrupoForm(forms.Form):
+    """Formulario para canjear los bonos de un grupo de alumnos de una vez"""
+    bonos = forms.CharField(
+        required=False,
+        label='Bonos',
+        widget=forms.Textarea(attrs={
+            'class': 'form-control',
+            'rows': 3,
+            'placeholder': 'IDs de bono separados por comas, espacios o saltos de línea',
+        }),
+    )
+    clientes = forms.CharField(
+        required=False,
+        label='Clientes',
+        widget=forms.Textarea(attrs={
+            'class': 'form-control',
+            'rows': 3,
+            'placeholder': 'IDs de cliente (se usará su bono activo más antiguo)',
+        }),
+    )
+    fecha_uso = forms.DateField(
+        label='Fecha de Uso',
+        widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}),
+    )
+    descripcion = forms.CharField(
+        max_length=200,
+        required=False,
+        label='Descripción',
+        widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Ej: Clase de grupo - nivel iniciación'}),
+    )
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        from django.utils import timezone
+        self.fields['fecha_uso'].initial = timezone.now().date().strftime('%Y-%m-%d')
+
+    @staticmethod
+    def _parse_ids(valor, nombre):
+        ids = []
+        for parte in valor.replace(',', ' ').split():
+            if not parte.isdigit():
+                raise forms.ValidationError(f'"{parte}" no es un identificador de {nombre} válido.')
+            ids.append(int(parte))
+        return ids
+
+    def clean_bonos(self):
+        return self._parse_ids(self.cleaned_data.get('bonos', ''), 'bono')
+
+    def clean_clientes(self):
+        return self._parse_ids(self.cleaned_data.get('clientes', ''), 'cliente')
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if not cleaned_data.get('bonos') and not cleaned_data.get('clientes'):
+            raise forms.ValidationError('Indica al menos un bono o un cliente.')
+        return cleaned_data
+
+
+class VentaGrupoForm(forms.Form):
+    """Formulario para vender el mismo tipo de bono a un grupo de clientes"""
+    clientes = forms.CharField(
+        label='Clientes',
+        widget=forms.Textarea(attrs={
+            'class': 'form-control',
+            'rows': 3,
+            'placeholder': 'IDs de cliente separados por comas, espacios o saltos de línea',
+        }),
+    )
+    tipo_bono = forms.TypedChoiceField(
+        choices=Bono.TIPOS_BONOS,
+        coerce=int,
+        label='Tipo de Bono',
+        widget=forms.Select(attrs={'class': 'form-control'}),
+    )
+    cantidad = forms.IntegerField(
+        min_value=1,
+        max_value=50,
+        initial=1,
+        label='Bonos por cliente',
+        widget=forms.NumberInput(attrs={'class': 'form-control'}),
+    )
+    precio = forms.DecimalField(
+        max_digits=8,
+        decimal_places=2,
+        required=False,
+        label='Precio (€)',
+        widget=forms.NumberInput(attrs={'class': 'form-control', 'step': '0.01'}),
+    )
+    fecha_expiracion = forms.DateTimeField(
+        required=False,
+        label='Fecha de Expiración',
+        widget=forms.DateTimeInput(attrs={'class': 'form-control', 'type': 'datetime-local'}),
+    )
+
+    def clean_clientes(self):
+        return CheckinGrupoForm._parse_ids(self.cleaned_data.get('clientes', ''), 'cliente')
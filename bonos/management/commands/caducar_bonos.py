@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from bonos.models import Bono
+from bonos.services import caducar_bonos
+
+
+class Command(BaseCommand):
+    help = 'Desactivar los bonos cuya fecha de expiración ya ha pasado'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='Número de bonos que se desactivan por transacción',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Mostrar cuántos bonos caducados hay sin desactivarlos',
+        )
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        # El índice (fecha_expiracion, activo) convierte la búsqueda en un rango
+        caducados = Bono.objects.caducados(now).order_by('pk')
+
+        if options['dry_run']:
+            self.stdout.write(f'🔍 {caducados.count()} bonos caducados siguen activos')
+            return
+
+        total = 0
+        ultimo = 0
+        while True:
+            ids = list(
+                caducados.filter(pk__gt=ultimo).values_list('pk', flat=True)[:options['chunk_size']]
+            )
+            if not ids:
+                break
+            total += caducar_bonos(ids, now)
+            ultimo = ids[-1]
+            self.stdout.write(f'⏳ {total} bonos desactivados...')
+
+        self.stdout.write(f'🎉 {total} bonos caducados desactivados')
@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-17 23:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bonos', '0004_alter_usobono_fecha_uso'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bono',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='Última actualización'),
+        ),
+    ]
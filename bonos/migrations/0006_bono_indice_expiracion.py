@@ -0,0 +1,17 @@
+# Generated by Django 4.2 on 2026-10-17 23:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bonos', '0005_bono_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bono',
+            index=models.Index(fields=['activo', 'fecha_expiracion'], name='bonos_activo_expiracion'),
+        ),
+    ]
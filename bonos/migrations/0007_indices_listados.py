@@ -0,0 +1,37 @@
+# Generated by Django 4.2 on 2026-10-17 23:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bonos', '0006_bono_indice_expiracion'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='bono',
+            name='bonos_activo_expiracion',
+        ),
+        migrations.AddIndex(
+            model_name='bono',
+            index=models.Index(fields=['-fecha_compra'], name='bonos_fecha_compra'),
+        ),
+        migrations.AddIndex(
+            model_name='bono',
+            index=models.Index(fields=['cliente', '-fecha_compra'], name='bonos_cliente_fecha'),
+        ),
+        migrations.AddIndex(
+            model_name='bono',
+            index=models.Index(fields=['fecha_expiracion', 'activo'], name='bonos_expiracion_activo'),
+        ),
+        migrations.AddIndex(
+            model_name='usobono',
+            index=models.Index(fields=['bono', '-fecha_uso'], name='bonos_uso_bono_fecha'),
+        ),
+        migrations.AddIndex(
+            model_name='usobono',
+            index=models.Index(fields=['-fecha_uso'], name='bonos_uso_fecha'),
+        ),
+    ]
@@ -1,8 +1,89 @@
-from django.db import models
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import connections, models
+from django.db.models import Case, F, FloatField, Q, Value, When, Window
+from django.db.models.functions import Cast, RowNumber
 from django.urls import reverse
+from django.utils import timezone
 from clientes.models import Cliente
 
 
+class BonoQuerySet(models.QuerySet):
+
+    def update(self, **kwargs):
+        # Las actualizaciones en bloque (canjes, caducidades) también marcan
+        # updated_at, que forma parte del ETag de la API del cliente.
+        kwargs.setdefault('updated_at', timezone.now())
+        return super().update(**kwargs)
+
+    def vender_en_bloque(self, cliente_ids, tipo_bono, cantidad=1, precio=None, fecha_expiracion=None):
+        """Crea ``cantidad`` bonos por cliente en una transacción (ver ``services.vender_bonos``)"""
+        from .services import vender_bonos
+        return vender_bonos(cliente_ids, tipo_bono, cantidad, precio, fecha_expiracion)
+
+    def vigentes(self, now=None):
+        """Bonos que se pueden canjear: activos, con usos y sin caducar"""
+        now = now or timezone.now()
+        return self.filter(
+            Q(fecha_expiracion__isnull=True) | Q(fecha_expiracion__gt=now),
+            activo=True, usos_restantes__gt=0,
+        )
+
+    def caducados(self, now=None):
+        """Bonos aún activos cuya fecha de expiración ya ha pasado"""
+        return self.filter(activo=True, fecha_expiracion__lte=now or timezone.now())
+
+    def proximos_a_caducar(self, dias=7, now=None):
+        """Bonos activos que caducan en los próximos ``dias`` días"""
+        now = now or timezone.now()
+        return self.filter(
+            activo=True, fecha_expiracion__gt=now, fecha_expiracion__lte=now + timedelta(days=dias)
+        )
+
+    def with_usage(self):
+        """Anota los usos utilizados y el porcentaje de uso calculados en SQL"""
+        usados = F('usos_totales') - F('usos_restantes')
+        return self.annotate(
+            usos_utilizados_db=usados,
+            porcentaje_uso_db=Case(
+                When(usos_totales__gt=0, then=Cast(usados, FloatField()) * 100 / F('usos_totales')),
+                default=Value(0.0),
+                output_field=FloatField(),
+            ),
+        )
+
+
+class UsoBonoQuerySet(models.QuerySet):
+
+    def ultimos_por_bono(self, n, *campos):
+        """
+        Devuelve ``{bono_id: [usos]}`` con los ``n`` usos más recientes de
+        cada bono del queryset, resueltos con una sola consulta.
+
+        Se numeran los usos de cada bono con ``ROW_NUMBER() OVER (PARTITION
+        BY bono_id ...)`` y se filtra por el número de fila. Si el backend no
+        tiene funciones de ventana se leen todos los usos en una consulta y
+        se recortan en Python. Con ``campos`` se devuelven diccionarios de
+        ``values()`` en lugar de instancias.
+        """
+        orden = [F('fecha_uso').desc(), F('id').desc()]
+        usos = self.order_by('bono_id', *orden)
+        if connections[self.db].features.supports_over_clause:
+            usos = usos.annotate(
+                fila=Window(RowNumber(), partition_by=F('bono_id'), order_by=orden)
+            ).filter(fila__lte=n)
+        if campos:
+            usos = usos.values('bono_id', *campos)
+
+        por_bono = defaultdict(list)
+        for uso in usos:
+            bono_id = uso['bono_id'] if campos else uso.bono_id
+            if len(por_bono[bono_id]) < n:
+                por_bono[bono_id].append(uso)
+        return dict(por_bono)
+
+
 class Bono(models.Model):
     TIPOS_BONOS = [
         (10, '10 Usos'),
@@ -18,26 +99,37 @@ class Bono(models.Model):
     fecha_compra = models.DateTimeField(auto_now_add=True)
     fecha_expiracion = models.DateTimeField(null=True, blank=True)
     precio = models.DecimalField(max_digits=8, decimal_places=2, null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Última actualización')
     
+    objects = BonoQuerySet.as_manager()
+    
+    def asignar_usos_iniciales(self):
+        """Un bono nuevo tiene disponibles todos los usos de su tipo"""
+        self.usos_totales = self.tipo_bono
+        self.usos_restantes = self.tipo_bono
+
     def save(self, *args, **kwargs):
         if not self.pk:  # Solo en la creación
-            self.usos_totales = self.tipo_bono
-            self.usos_restantes = self.tipo_bono
+            self.asignar_usos_iniciales()
         super().save(*args, **kwargs)
     
     def usar_bono(self):
-        if self.usos_restantes > 0:
-            self.usos_restantes -= 1
-            if self.usos_restantes == 0:
-                self.activo = False
-            self.save()
-            return True
-        return False
+        """Descuenta un uso de forma atómica (sin registrar el UsoBono)"""
+        from .services import descontar_uso
+        return descontar_uso(self)
+    
+    @property
+    def esta_caducado(self):
+        return self.fecha_expiracion is not None and self.fecha_expiracion <= timezone.now()
     
     def usos_utilizados(self):
+        if hasattr(self, 'usos_utilizados_db'):
+            return self.usos_utilizados_db
         return self.usos_totales - self.usos_restantes
     
     def porcentaje_uso(self):
+        if hasattr(self, 'porcentaje_uso_db'):
+            return self.porcentaje_uso_db
         if self.usos_totales > 0:
             return (self.usos_utilizados() / self.usos_totales) * 100
         return 0
@@ -52,12 +144,24 @@ class Bono(models.Model):
         verbose_name = 'Bono'
         verbose_name_plural = 'Bonos'
         ordering = ['-fecha_compra']
+        indexes = [
+            # Listado general (más recientes primero)
+            models.Index(fields=['-fecha_compra'], name='bonos_fecha_compra'),
+            # Bonos de un cliente: panel, ficha y check-in por cliente
+            models.Index(fields=['cliente', '-fecha_compra'], name='bonos_cliente_fecha'),
+            # Barrido de caducados y próximos a caducar: rango sobre la fecha.
+            # La fecha va delante porque SQLite no usa un índice para la
+            # condición booleana "WHERE activo".
+            models.Index(fields=['fecha_expiracion', 'activo'], name='bonos_expiracion_activo'),
+        ]
 
 
 class UsoBono(models.Model):
     bono = models.ForeignKey(Bono, on_delete=models.CASCADE, related_name='usos')
     fecha_uso = models.DateField(verbose_name='Fecha de uso')
     descripcion = models.CharField(max_length=200, blank=True, verbose_name='Descripción del uso')
+
+    objects = UsoBonoQuerySet.as_manager()
     
     def save(self, *args, **kwargs):
         # Si no se especifica fecha_uso, usar la fecha actual
@@ -72,4 +176,10 @@ class UsoBono(models.Model):
     class Meta:
         verbose_name = 'Uso de Bono'
         verbose_name_plural = 'Usos de Bonos'
-        ordering = ['-fecha_uso']
\ No newline at end of file
+        ordering = ['-fecha_uso']
+        indexes = [
+            # Usos de un bono, los más recientes primero
+            models.Index(fields=['bono', '-fecha_uso'], name='bonos_uso_bono_fecha'),
+            # Últimos usos del dashboard
+            models.Index(fields=['-fecha_uso'], name='bonos_uso_fecha'),
+        ]
\ No newline at end of file
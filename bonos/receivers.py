@@ -0,0 +1,61 @@
+from collections import Counter, defaultdict
+
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from clientes.models import Cliente
+from .models import Bono, UsoBono
+
+
+def contribucion(activo, usos_totales, usos_restantes):
+    """Lo que aporta un bono a los contadores de su cliente"""
+    return Counter({
+        'activos': 1 if activo else 0,
+        'agotados': 0 if activo else 1,
+        'usos': usos_totales - usos_restantes,
+    })
+
+
+@receiver(pre_save, sender=Bono)
+def guardar_estado_previo(sender, instance, raw=False, **kwargs):
+    instance._estado_previo = None
+    if raw or instance.pk is None:
+        return
+    instance._estado_previo = (
+        Bono.objects.filter(pk=instance.pk)
+        .values('cliente_id', 'activo', 'usos_totales', 'usos_restantes')
+        .first()
+    )
+
+
+@receiver(post_save, sender=Bono)
+def actualizar_contadores_al_guardar(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    deltas = defaultdict(Counter)
+    previo = getattr(instance, '_estado_previo', None)
+    if previo:
+        deltas[previo['cliente_id']].subtract(contribucion(
+            previo['activo'], previo['usos_totales'], previo['usos_restantes']
+        ))
+    deltas[instance.cliente_id].update(contribucion(
+        instance.activo, instance.usos_totales, instance.usos_restantes
+    ))
+    Cliente.objects.ajustar_contadores_en_bloque(deltas)
+
+
+@receiver(post_delete, sender=Bono)
+def actualizar_contadores_al_borrar(sender, instance, **kwargs):
+    delta = contribucion(instance.activo, instance.usos_totales, instance.usos_restantes)
+    Cliente.objects.filter(pk=instance.cliente_id).ajustar_contadores(
+        activos=-delta['activos'], agotados=-delta['agotados'], usos=-delta['usos']
+    )
+
+
+@receiver(post_save, sender=UsoBono)
+def marcar_bono_al_editar_uso(sender, instance, created, raw=False, **kwargs):
+    # Las altas y bajas de usos ya cambian la huella de la API del cliente;
+    # las ediciones solo se notan si el bono cambia su updated_at
+    if raw or created:
+        return
+    Bono.objects.filter(pk=instance.bono_id).update()
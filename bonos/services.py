@@ -0,0 +1,287 @@
+"""
+Servicios de dominio para bonos
+"""
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+
+from django.db import DatabaseError, transaction
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+
+from arenasurf.cache import invalidar
+from clientes.models import Cliente
+from .models import Bono, UsoBono
+from .receivers import contribucion
+
+# Bonos por INSERT en las ventas en bloque
+TAMANO_LOTE_VENTA = 500
+# Veces que se repite un canje de grupo si otro canje agota sus bonos a la vez
+INTENTOS_CANJE = 3
+
+
+def _actualizacion_descuento():
+    """Asignaciones del UPDATE que descuenta un uso"""
+    # El orden de las asignaciones importa: MySQL evalúa el SET de izquierda a
+    # derecha, así que ``activo`` debe calcularse antes de decrementar.
+    return {
+        'activo': Case(
+            When(usos_restantes__lte=1, then=Value(False)),
+            default=Value(True),
+        ),
+        'usos_restantes': F('usos_restantes') - 1,
+    }
+
+
+def descontar_uso(bono):
+    """
+    Descuenta un uso del bono con un único UPDATE condicional.
+
+    El descuento solo se aplica si quedan usos (``usos_restantes > 0``) y el
+    bono no ha caducado, de modo que dos peticiones concurrentes nunca
+    pierden actualizaciones ni dejan el bono en negativo. El bono queda
+    sincronizado con la base de datos y se actualizan los contadores del
+    cliente. Devuelve True si se ha descontado el uso.
+    """
+    with transaction.atomic():
+        actualizados = Bono.objects.filter(pk=bono.pk).vigentes().update(
+            **_actualizacion_descuento()
+        )
+        # La fila sigue bloqueada por el UPDATE, así que el estado leído es
+        # exactamente el que ha dejado este descuento.
+        bono.refresh_from_db(fields=['cliente', 'usos_restantes', 'activo'])
+        if actualizados:
+            agotado = not bono.activo
+            Cliente.objects.filter(pk=bono.cliente_id).ajustar_contadores(
+                activos=-1 if agotado else 0,
+                agotados=1 if agotado else 0,
+                usos=1,
+            )
+            invalidar(Bono, [bono.pk])
+            invalidar(Cliente, [bono.cliente_id])
+    return actualizados == 1
+
+
+def redimir_bono(bono, fecha_uso=None, descripcion='', uso=None):
+    """
+    Canjea un uso del bono y registra el ``UsoBono`` en la misma transacción.
+
+    Si se pasa ``uso`` (por ejemplo desde un formulario con ``commit=False``)
+    se completa y guarda esa instancia. Devuelve el ``UsoBono`` creado, o
+    None si el bono no tiene usos disponibles. En ambos casos el bono queda
+    sincronizado con los valores de la base de datos.
+    """
+    with transaction.atomic():
+        if not descontar_uso(bono):
+            return None
+
+        if uso is None:
+            uso = UsoBono(descripcion=descripcion)
+        uso.bono = bono
+        if fecha_uso is not None:
+            uso.fecha_uso = fecha_uso
+        elif not uso.fecha_uso:
+            uso.fecha_uso = timezone.now().date()
+        uso.save()
+    return uso
+
+
+@dataclass
+class ResultadoCanjeGrupo:
+    """Resultado de un check-in de grupo"""
+    canjeados: list = field(default_factory=list)
+    agotados: list = field(default_factory=list)
+    rechazados: list = field(default_factory=list)
+
+    def as_dict(self):
+        return {
+            'canjeados': self.canjeados,
+            'agotados': self.agotados,
+            'rechazados': self.rechazados,
+        }
+
+
+def bonos_para_clientes(cliente_ids):
+    """
+    Elige el bono a canjear para cada cliente: el activo más antiguo.
+
+    Devuelve un diccionario ``{cliente_id: bono_id}`` resuelto con una
+    sola consulta. Los clientes sin bonos disponibles no aparecen.
+    """
+    filas = (
+        Bono.objects.filter(cliente_id__in=set(cliente_ids)).vigentes()
+        .order_by('cliente_id', 'fecha_compra', 'id')
+        .values_list('cliente_id', 'pk')
+    )
+    elegidos = {}
+    for cliente_id, bono_id in filas:
+        elegidos.setdefault(cliente_id, bono_id)
+    return elegidos
+
+
+class _CanjeConcurrente(Exception):
+    """El UPDATE no ha descontado todos los bonos leídos: se deshace el canje"""
+
+
+def _canjear(bono_ids, fecha_uso, descripcion):
+    """Un intento de ``redimir_bonos``; devuelve los usos previos de cada bono canjeado"""
+    with transaction.atomic():
+        filas = list(
+            Bono.objects.select_for_update()
+            .filter(pk__in=bono_ids).vigentes()
+            .values_list('pk', 'usos_restantes', 'cliente_id')
+        )
+        restantes = {pk: usos for pk, usos, _ in filas}
+        if not restantes:
+            return restantes
+        descontados = Bono.objects.filter(pk__in=list(restantes)).vigentes().update(
+            **_actualizacion_descuento()
+        )
+        # Sin bloqueo de filas (SQLite) otro canje puede agotar un bono entre
+        # la lectura y el UPDATE; sus usos no se registrarían bien
+        if descontados != len(restantes):
+            raise _CanjeConcurrente
+        UsoBono.objects.bulk_create([
+            UsoBono(bono_id=pk, fecha_uso=fecha_uso, descripcion=descripcion)
+            for pk in bono_ids if pk in restantes
+        ])
+
+        deltas = defaultdict(Counter)
+        for pk, usos, cliente_id in filas:
+            agotado = usos == 1
+            deltas[cliente_id].update({
+                'usos': 1,
+                'activos': -1 if agotado else 0,
+                'agotados': 1 if agotado else 0,
+            })
+        Cliente.objects.ajustar_contadores_en_bloque(deltas)
+        invalidar(Bono, restantes)
+        invalidar(UsoBono)
+        invalidar(Cliente, deltas)
+    return restantes
+
+
+def redimir_bonos(bono_ids, fecha_uso=None, descripcion=''):
+    """
+    Canjea un uso de cada bono de la lista en una única transacción.
+
+    Se bloquean los bonos disponibles, se descuentan todos con un UPDATE y
+    se registran los usos con un ``bulk_create``, así que el número de
+    consultas no depende del tamaño del grupo. Los ids repetidos se canjean
+    una sola vez.
+
+    En el resultado, ``canjeados`` lista los bonos descontados, ``agotados``
+    los que han gastado su último uso en este check-in y ``rechazados`` los
+    que no se han podido canjear (sin usos, caducados, inactivos o
+    inexistentes).
+    """
+    bono_ids = list(dict.fromkeys(int(pk) for pk in bono_ids))
+    fecha_uso = fecha_uso or timezone.now().date()
+    resultado = ResultadoCanjeGrupo()
+
+    for intento in range(INTENTOS_CANJE):
+        try:
+            restantes = _canjear(bono_ids, fecha_uso, descripcion)
+            break
+        except _CanjeConcurrente:
+            if intento == INTENTOS_CANJE - 1:
+                raise DatabaseError('Bonos canjeados por otra operación durante el check-in')
+
+    for pk in bono_ids:
+        if pk not in restantes:
+            resultado.rechazados.append({'bono_id': pk, 'motivo': 'Sin usos disponibles o caducado'})
+            continue
+        resultado.canjeados.append({'bono_id': pk, 'usos_restantes': restantes[pk] - 1})
+        if restantes[pk] == 1:
+            resultado.agotados.append({'bono_id': pk, 'usos_restantes': 0})
+    return resultado
+
+
+@dataclass
+class ResultadoVentaGrupo:
+    """Resultado de una venta de bonos a un grupo"""
+    vendidos: list = field(default_factory=list)
+    rechazados: list = field(default_factory=list)
+
+    @property
+    def bonos(self):
+        return sum(item['bonos'] for item in self.vendidos)
+
+    def as_dict(self):
+        return {
+            'bonos': self.bonos,
+            'vendidos': self.vendidos,
+            'rechazados': self.rechazados,
+        }
+
+
+def vender_bonos(cliente_ids, tipo_bono, cantidad=1, precio=None, fecha_expiracion=None):
+    """
+    Vende bonos de ``tipo_bono`` a varios clientes en una única transacción.
+
+    Cada aparición de un cliente en ``cliente_ids`` recibe ``cantidad``
+    bonos, así que se pueden vender N bonos a N clientes o N a uno solo.
+    Los bonos se crean con un ``bulk_create`` y, como así no pasan por
+    ``Bono.save()`` ni por las señales, aquí se asignan los usos iniciales
+    y se ajustan los contadores y las versiones de caché de los clientes en
+    bloque. Los clientes inexistentes o inactivos quedan en ``rechazados``.
+    """
+    if tipo_bono not in dict(Bono.TIPOS_BONOS):
+        raise ValueError(f'Tipo de bono no válido: {tipo_bono}')
+    por_cliente = Counter(int(pk) for pk in cliente_ids)
+    resultado = ResultadoVentaGrupo()
+
+    with transaction.atomic():
+        activos = set(
+            Cliente.objects.filter(pk__in=list(por_cliente), activo=True).values_list('pk', flat=True)
+        )
+        bonos = []
+        deltas = defaultdict(Counter)
+        for cliente_id, veces in por_cliente.items():
+            if cliente_id not in activos:
+                resultado.rechazados.append({'cliente_id': cliente_id, 'motivo': 'Cliente inexistente o inactivo'})
+                continue
+            for _ in range(veces * cantidad):
+                bono = Bono(
+                    cliente_id=cliente_id, tipo_bono=tipo_bono,
+                    precio=precio, fecha_expiracion=fecha_expiracion,
+                )
+                bono.asignar_usos_iniciales()
+                bonos.append(bono)
+                deltas[cliente_id].update(contribucion(True, bono.usos_totales, bono.usos_restantes))
+            resultado.vendidos.append({'cliente_id': cliente_id, 'bonos': veces * cantidad})
+
+        if bonos:
+            Bono.objects.bulk_create(bonos, batch_size=TAMANO_LOTE_VENTA)
+            Cliente.objects.ajustar_contadores_en_bloque(deltas)
+            invalidar(Bono)
+            invalidar(Cliente, deltas)
+    return resultado
+
+
+def caducar_bonos(bono_ids, now=None):
+    """
+    Desactiva los bonos caducados de la lista y ajusta los contadores.
+
+    Se bloquean los que siguen activos y caducados, se desactivan con un
+    UPDATE y cada cliente pasa esos bonos de activos a agotados. Devuelve el
+    número de bonos desactivados.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        filas = list(
+            Bono.objects.select_for_update()
+            .filter(pk__in=list(bono_ids)).caducados(now)
+            .values_list('pk', 'cliente_id')
+        )
+        if not filas:
+            return 0
+        pks = [pk for pk, _ in filas]
+        Bono.objects.filter(pk__in=pks).update(activo=False)
+
+        deltas = defaultdict(Counter)
+        for _, cliente_id in filas:
+            deltas[cliente_id].update({'activos': -1, 'agotados': 1})
+        Cliente.objects.ajustar_contadores_en_bloque(deltas)
+        invalidar(Bono, pks)
+        invalidar(Cliente, deltas)
+    return len(pks)
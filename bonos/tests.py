@@ -1,3 +1,527 @@
-from django.test import TestCase
+import threading
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.contrib.sites.models import Site
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from arenasurf.cache import cache_versionada
+from arenasurf.estadisticas import estadisticas_bonos
+from clientes.models import Cliente
+from . import services
+from .forms import BonoForm
+from .models import Bono, UsoBono
+from .services import redimir_bono, redimir_bonos
+
+
+def crear_cliente(n=1, **kwargs):
+    datos = {
+        'nombre': f'Cliente{n}',
+        'apellidos': f'Apellido{n}',
+        'email': f'cliente{n}@example.com',
+    }
+    datos.update(kwargs)
+    return Cliente.objects.create(**datos)
+
+
+class RedimirBonoTests(TestCase):
+
+    def setUp(self):
+        self.bono = Bono.objects.create(cliente=crear_cliente(), tipo_bono=10)
+
+    def test_descuenta_y_registra_uso(self):
+        uso = redimir_bono(self.bono, descripcion='Clase')
+        self.assertIsNotNone(uso)
+        self.assertEqual(self.bono.usos_restantes, 9)
+        self.assertTrue(self.bono.activo)
+        self.assertEqual(UsoBono.objects.filter(bono=self.bono).count(), 1)
+
+    def test_ultimo_uso_desactiva_el_bono(self):
+        Bono.objects.filter(pk=self.bono.pk).update(usos_restantes=1)
+        self.assertIsNotNone(redimir_bono(self.bono))
+        self.assertEqual(self.bono.usos_restantes, 0)
+        self.assertFalse(self.bono.activo)
+
+    def test_bono_agotado_no_se_redime(self):
+        Bono.objects.filter(pk=self.bono.pk).update(usos_restantes=0, activo=False)
+        self.assertIsNone(redimir_bono(self.bono))
+        self.assertEqual(self.bono.usos_restantes, 0)
+        self.assertFalse(UsoBono.objects.exists())
+
+    def test_actualiza_solo_columnas_modificadas(self):
+        with CaptureQueriesContext(connection) as ctx:
+            redimir_bono(self.bono)
+        update = next(q['sql'] for q in ctx.captured_queries if q['sql'].startswith('UPDATE "bonos_bono"'))
+        self.assertNotIn('precio', update)
+        self.assertNotIn('tipo_bono', update)
+
+
+class AnotacionesBonoTests(TestCase):
+
+    def test_uso_calculado_en_sql(self):
+        bono = Bono.objects.create(cliente=crear_cliente(), tipo_bono=20)
+        Bono.objects.filter(pk=bono.pk).update(usos_restantes=15)
+        anotado = Bono.objects.with_usage().get(pk=bono.pk)
+        self.assertEqual(anotado.usos_utilizados(), 5)
+        self.assertAlmostEqual(anotado.porcentaje_uso(), 25.0)
+        bono.refresh_from_db()
+        self.assertAlmostEqual(bono.porcentaje_uso(), 25.0)
+
+    def test_ordenar_por_porcentaje(self):
+        poco = Bono.objects.create(cliente=crear_cliente(1), tipo_bono=10)
+        mucho = Bono.objects.create(cliente=crear_cliente(2), tipo_bono=10)
+        Bono.objects.filter(pk=mucho.pk).update(usos_restantes=2)
+        orden = Bono.objects.with_usage().order_by('-porcentaje_uso_db')
+        self.assertEqual(list(orden), [mucho, poco])
+
+
+class UltimosUsosTests(TestCase):
+
+    def setUp(self):
+        self.cliente = crear_cliente()
+        self.bonos = [Bono.objects.create(cliente=self.cliente, tipo_bono=10) for _ in range(3)]
+        for bono in self.bonos:
+            for dia in range(1, 8):
+                UsoBono.objects.create(bono=bono, fecha_uso=f'2025-08-0{dia}')
+
+    def comprobar(self):
+        with self.assertNumQueries(1):
+            usos = UsoBono.objects.filter(bono__in=self.bonos).ultimos_por_bono(5, 'fecha_uso')
+        self.assertEqual(set(usos), {b.pk for b in self.bonos})
+        for filas in usos.values():
+            self.assertEqual([f['fecha_uso'].day for f in filas], [7, 6, 5, 4, 3])
+
+    def test_funcion_de_ventana(self):
+        self.comprobar()
+
+    def test_sin_funciones_de_ventana(self):
+        with mock.patch.object(connection.features, 'supports_over_clause', False):
+            self.comprobar()
+
+    def test_api_bonos_sin_consultas_por_bono(self):
+        usuario = User.objects.create_user('cliente', password='x')
+        Cliente.objects.filter(pk=self.cliente.pk).update(usuario=usuario)
+        self.client.force_login(usuario)
+        cache.clear()
+        # sesión + usuario + cliente + bonos + usos
+        with self.assertNumQueries(5):
+            datos = self.client.get(reverse('clientes:bonos_ajax')).json()
+        self.assertEqual([len(b['usos']) for b in datos['bonos']], [5, 5, 5])
+        self.assertEqual(datos['bonos'][0]['usos'][0]['fecha'], '07/08/2025')
+
+
+class CheckinGrupoTests(TestCase):
+
+    def crear_bonos(self, n, inicio=0):
+        return [
+            Bono.objects.create(cliente=crear_cliente(inicio + i), tipo_bono=10)
+            for i in range(n)
+        ]
+
+    def test_numero_de_consultas_constante(self):
+        pequenos = self.crear_bonos(3)
+        grandes = self.crear_bonos(30, inicio=100)
+        with self.assertNumQueries(6):
+            redimir_bonos([b.pk for b in pequenos])
+        with self.assertNumQueries(6):
+            redimir_bonos([b.pk for b in grandes])
+        self.assertEqual(UsoBono.objects.count(), 33)
+
+    def test_informa_de_agotados_y_rechazados(self):
+        ultimo, agotado, normal = self.crear_bonos(3)
+        Bono.objects.filter(pk=ultimo.pk).update(usos_restantes=1)
+        Bono.objects.filter(pk=agotado.pk).update(usos_restantes=0, activo=False)
+
+        resultado = redimir_bonos([ultimo.pk, agotado.pk, normal.pk, normal.pk, 999999])
+
+        self.assertEqual([r['bono_id'] for r in resultado.canjeados], [ultimo.pk, normal.pk])
+        self.assertEqual([r['bono_id'] for r in resultado.agotados], [ultimo.pk])
+        self.assertEqual([r['bono_id'] for r in resultado.rechazados], [agotado.pk, 999999])
+        ultimo.refresh_from_db()
+        normal.refresh_from_db()
+        self.assertFalse(ultimo.activo)
+        self.assertEqual(normal.usos_restantes, 9)
+
+    def agotar_antes_del_update(self, bono, veces):
+        """Simula otro canje que agota ``bono`` entre la lectura y el UPDATE"""
+        original = services._actualizacion_descuento
+        llamadas = []
+
+        def descuento():
+            if len(llamadas) < veces:
+                Bono.objects.filter(pk=bono.pk).update(usos_restantes=0, activo=False)
+            llamadas.append(1)
+            return original()
+        return mock.patch.object(services, '_actualizacion_descuento', descuento)
+
+    def test_canje_concurrente_se_repite(self):
+        drenado, normal = self.crear_bonos(2)
+        # El primer intento se deshace entero (también el agotado simulado)
+        with self.agotar_antes_del_update(drenado, veces=1):
+            resultado = redimir_bonos([drenado.pk, normal.pk])
+        self.assertEqual(len(resultado.canjeados), 2)
+        self.assertEqual(UsoBono.objects.count(), 2)
+        self.assertEqual(set(Bono.objects.values_list('usos_restantes', flat=True)), {9})
+
+    def test_canje_concurrente_sin_usos_huerfanos(self):
+        drenado, normal = self.crear_bonos(2)
+        with self.agotar_antes_del_update(drenado, veces=services.INTENTOS_CANJE):
+            with self.assertRaises(DatabaseError):
+                redimir_bonos([drenado.pk, normal.pk])
+        self.assertFalse(UsoBono.objects.exists())
+        self.assertEqual(set(Bono.objects.values_list('usos_restantes', flat=True)), {10})
+
+    def test_vista_por_clientes(self):
+        staff = User.objects.create_user('staff', password='x', is_staff=True)
+        self.client.force_login(staff)
+        bono, = self.crear_bonos(1)
+        sin_bono = crear_cliente(50)
+
+        respuesta = self.client.post(
+            reverse('bonos:checkin_grupo'),
+            {'clientes': f'{bono.cliente_id}, {sin_bono.pk}', 'fecha_uso': '2025-08-01'},
+            HTTP_ACCEPT='application/json',
+        )
+
+        datos = respuesta.json()
+        self.assertEqual(datos['canjeados'], [{'bono_id': bono.pk, 'usos_restantes': 9}])
+        self.assertEqual(datos['rechazados'][0]['cliente_id'], sin_bono.pk)
+
+
+class VentaGrupoTests(TestCase):
+
+    def test_numero_de_consultas_constante(self):
+        pocos = [crear_cliente(i).pk for i in range(3)]
+        muchos = [crear_cliente(100 + i).pk for i in range(60)]
+        with CaptureQueriesContext(connection) as pequena:
+            Bono.objects.vender_en_bloque(pocos, 10)
+        with CaptureQueriesContext(connection) as grande:
+            Bono.objects.vender_en_bloque(muchos, 10)
+        self.assertEqual(len(grande), len(pequena))
+        self.assertEqual(Bono.objects.count(), 63)
+
+    def test_semantica_de_save_y_contadores(self):
+        cliente = crear_cliente(0)
+        otro = crear_cliente(1)
+        inactivo = crear_cliente(2)
+        Cliente.objects.filter(pk=inactivo.pk).update(activo=False)
+        version = cache_versionada('prueba', [(Cliente, cliente.pk)], lambda: 'antes')
+
+        resultado = Bono.objects.vender_en_bloque([cliente.pk, cliente.pk, otro.pk, inactivo.pk, 999999], 20, cantidad=2)
+
+        self.assertEqual(resultado.bonos, 6)
+        self.assertEqual(resultado.vendidos, [{'cliente_id': cliente.pk, 'bonos': 4}, {'cliente_id': otro.pk, 'bonos': 2}])
+        self.assertEqual([r['cliente_id'] for r in resultado.rechazados], [inactivo.pk, 999999])
+        self.assertEqual(
+            set(Bono.objects.values_list('usos_totales', 'usos_restantes', 'activo')), {(20, 20, True)}
+        )
+        cliente.refresh_from_db()
+        self.assertEqual(cliente.num_bonos_activos, 4)
+        self.assertEqual(version, 'antes')
+        self.assertEqual(cache_versionada('prueba', [(Cliente, cliente.pk)], lambda: 'despues'), 'despues')
+
+    def test_vista(self):
+        staff = User.objects.create_user('staff', password='x', is_staff=True)
+        self.client.force_login(staff)
+        clientes = [crear_cliente(i) for i in range(3)]
+
+        respuesta = self.client.post(
+            reverse('bonos:venta_grupo'),
+            {'clientes': ' '.join(str(c.pk) for c in clientes), 'tipo_bono': 30, 'cantidad': 1, 'precio': '90'},
+            HTTP_ACCEPT='application/json',
+        )
+
+        self.assertEqual(respuesta.json()['bonos'], 3)
+        self.assertEqual(set(Bono.objects.values_list('precio', flat=True)), {90})
+
+        respuesta = self.client.post(
+            reverse('bonos:venta_grupo'), {'clientes': 'uno', 'tipo_bono': 30, 'cantidad': 1},
+            HTTP_ACCEPT='application/json',
+        )
+        self.assertEqual(respuesta.status_code, 400)
+
+
+class ContadoresClienteTests(TestCase):
+
+    def setUp(self):
+        self.cliente = crear_cliente()
+
+    def assertContadores(self, activos, agotados, usos):
+        self.cliente.refresh_from_db()
+        self.assertEqual(
+            (self.cliente.num_bonos_activos, self.cliente.num_bonos_agotados, self.cliente.num_usos),
+            (activos, agotados, usos),
+        )
+
+    def test_guardar_el_cliente_no_pisa_los_contadores(self):
+        cargado = Cliente.objects.get(pk=self.cliente.pk)
+        Bono.objects.create(cliente=self.cliente, tipo_bono=10)
+        cargado.telefono = '600000000'
+        cargado.save()
+        self.assertContadores(1, 0, 0)
+        self.assertEqual(self.cliente.telefono, '600000000')
+
+    def test_ciclo_de_vida_del_bono(self):
+        bono = Bono.objects.create(cliente=self.cliente, tipo_bono=10)
+        self.assertContadores(1, 0, 0)
+
+        redimir_bono(bono)
+        redimir_bonos([bono.pk])
+        self.assertContadores(1, 0, 2)
+
+        bono.refresh_from_db()
+        bono.activo = False
+        bono.save()
+        self.assertContadores(0, 1, 2)
+
+        bono.delete()
+        self.assertContadores(0, 0, 0)
+
+    def test_agotar_bono_mueve_contadores(self):
+        bono = Bono.objects.create(cliente=self.cliente, tipo_bono=10)
+        Bono.objects.filter(pk=bono.pk).update(usos_restantes=1)
+        Cliente.objects.filter(pk=self.cliente.pk).recalcular_contadores()
+        redimir_bono(bono)
+        self.assertContadores(0, 1, 10)
+
+    def test_cambio_de_cliente(self):
+        otro = crear_cliente(2)
+        bono = Bono.objects.create(cliente=self.cliente, tipo_bono=10)
+        bono.cliente = otro
+        bono.save()
+        self.assertContadores(0, 0, 0)
+        otro.refresh_from_db()
+        self.assertEqual(otro.num_bonos_activos, 1)
+
+    def test_estadisticas_en_sql(self):
+        bono = Bono.objects.create(cliente=self.cliente, tipo_bono=10)
+        redimir_bono(bono)
+        Bono.objects.create(cliente=self.cliente, tipo_bono=20, activo=False)
+        cliente = Cliente.objects.with_bono_stats().get(pk=self.cliente.pk)
+        self.assertEqual(
+            (cliente.num_bonos_activos_db, cliente.num_bonos_agotados_db, cliente.num_usos_db),
+            (1, 1, 1),
+        )
+
+    def test_comando_recalcula(self):
+        Bono.objects.create(cliente=self.cliente, tipo_bono=10)
+        Bono.objects.create(cliente=self.cliente, tipo_bono=20, activo=False)
+        Cliente.objects.update(num_bonos_activos=0, num_bonos_agotados=0, num_usos=7)
+        call_command('recalcular_contadores', stdout=StringIO())
+        self.assertContadores(1, 1, 0)
+
+    def test_listado_sin_consultas_por_fila(self):
+        for n in range(2, 6):
+            Bono.objects.create(cliente=crear_cliente(n), tipo_bono=10)
+        staff = User.objects.create_user('staff', password='x', is_staff=True)
+        self.client.force_login(staff)
+        with override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage'):
+            with CaptureQueriesContext(connection) as ctx:
+                self.client.get(reverse('clientes:lista'))
+        self.assertFalse([q for q in ctx.captured_queries if 'bonos_bono' in q['sql']])
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class DashboardBonosTests(TestCase):
+
+    def setUp(self):
+        for n in range(5):
+            bono = Bono.objects.create(cliente=crear_cliente(n), tipo_bono=10, activo=n % 2 == 0)
+            UsoBono.objects.create(bono=bono, fecha_uso='2025-08-01')
+        self.client.force_login(User.objects.create_user('staff', password='x', is_staff=True))
+        Site.objects.clear_cache()
+        cache.clear()
+
+    def test_estadisticas_con_tres_consultas(self):
+        with self.assertNumQueries(3):
+            stats = estadisticas_bonos()
+        self.assertEqual((stats.bonos_activos, stats.bonos_agotados, stats.clientes_activos), (3, 2, 5))
+        self.assertEqual(stats.total_bonos, 5)
+
+    def test_numero_de_consultas_del_dashboard(self):
+        # sesión + usuario + site + estadísticas (3)
+        with self.assertNumQueries(6):
+            respuesta = self.client.get(reverse('bonos:dashboard'))
+        self.assertEqual(respuesta.status_code, 200)
+        # La segunda visita se sirve desde la caché
+        with self.assertNumQueries(2):
+            self.client.get(reverse('bonos:dashboard'))
+
+    def test_endpoint_json(self):
+        datos = self.client.get(reverse('bonos:dashboard_api')).json()
+        self.assertEqual(datos['total_bonos'], 5)
+        self.assertEqual(len(datos['usos_recientes']), 5)
+
+
+class CaducidadBonoTests(TestCase):
+
+    def setUp(self):
+        self.cliente = crear_cliente()
+        ayer = timezone.now() - timedelta(days=1)
+        self.caducado = Bono.objects.create(cliente=self.cliente, tipo_bono=10, fecha_expiracion=ayer)
+        self.vigente = Bono.objects.create(
+            cliente=self.cliente, tipo_bono=10, fecha_expiracion=timezone.now() + timedelta(days=3)
+        )
+        cache.clear()
+
+    def test_no_se_canjea_un_bono_caducado(self):
+        self.assertIsNone(redimir_bono(self.caducado))
+        resultado = redimir_bonos([self.caducado.pk, self.vigente.pk])
+        self.assertEqual([r['bono_id'] for r in resultado.rechazados], [self.caducado.pk])
+        self.caducado.refresh_from_db()
+        self.assertEqual(self.caducado.usos_restantes, 10)
+
+    def test_barrido_por_tramos(self):
+        otro = Bono.objects.create(
+            cliente=crear_cliente(2), tipo_bono=10, fecha_expiracion=timezone.now() - timedelta(days=5)
+        )
+        salida = StringIO()
+        call_command('caducar_bonos', '--chunk-size', '1', stdout=salida)
+        self.assertIn('2 bonos caducados desactivados', salida.getvalue())
+        self.assertEqual(set(Bono.objects.filter(activo=False).values_list('pk', flat=True)), {self.caducado.pk, otro.pk})
+        self.cliente.refresh_from_db()
+        self.assertEqual((self.cliente.num_bonos_activos, self.cliente.num_bonos_agotados), (1, 1))
+
+    def test_dashboard_no_cuenta_caducados_como_activos(self):
+        stats = estadisticas_bonos()
+        self.assertEqual((stats.bonos_activos, stats.bonos_caducados, stats.total_bonos), (1, 1, 2))
+
+    def test_proximos_a_caducar(self):
+        self.assertEqual(list(Bono.objects.proximos_a_caducar(7)), [self.vigente])
+        self.assertEqual(list(Bono.objects.proximos_a_caducar(1)), [])
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class AdminBonoTests(TestCase):
+
+    def setUp(self):
+        self.bono = Bono.objects.create(cliente=crear_cliente(), tipo_bono=30)
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'x'))
+        Site.objects.clear_cache()
+        self.url = reverse('admin:bonos_bono_change', args=[self.bono.pk])
+
+    def crear_usos(self, n):
+        hoy, existentes = timezone.now().date(), UsoBono.objects.count()
+        UsoBono.objects.bulk_create([
+            UsoBono(bono=self.bono, fecha_uso=hoy - timedelta(days=existentes + i)) for i in range(n)
+        ])
+
+    def consultas(self, url):
+        Site.objects.clear_cache()
+        with CaptureQueriesContext(connection) as ctx:
+            respuesta = self.client.get(url)
+        self.assertEqual(respuesta.status_code, 200)
+        return len(ctx), respuesta
+
+    def test_inline_de_usos_paginado(self):
+        self.crear_usos(3)
+        pocas, _ = self.consultas(self.url)
+        self.crear_usos(42)
+        muchas, respuesta = self.consultas(self.url)
+        self.assertEqual(pocas, muchas)
+        formset = respuesta.context['inline_admin_formsets'][0].formset
+        self.assertEqual(len(formset.forms), 20)
+        self.assertEqual(formset.url_siguiente, '?usos=2')
+
+        formset = self.client.get(self.url, {'usos': 3}).context['inline_admin_formsets'][0].formset
+        self.assertEqual(len(formset.forms), 5)
+        self.assertEqual(formset.forms[-1].instance, UsoBono.objects.order_by('fecha_uso', 'id').first())
+
+    def test_guardar_la_pagina_de_usos(self):
+        self.crear_usos(25)
+        respuesta = self.client.get(self.url, {'usos': 2})
+        formset = respuesta.context['inline_admin_formsets'][0].formset
+        datos = {
+            'cliente': self.bono.cliente_id, 'tipo_bono': 30, 'usos_restantes': 30, 'precio': '',
+            'activo': 'on', 'fecha_expiracion_0': '', 'fecha_expiracion_1': '',
+        }
+        datos.update({f'{formset.prefix}-{k}': v for k, v in formset.management_form.initial.items()})
+        for i, form in enumerate(formset.forms):
+            datos[f'{formset.prefix}-{i}-id'] = form.instance.pk
+            datos[f'{formset.prefix}-{i}-bono'] = self.bono.pk
+            datos[f'{formset.prefix}-{i}-descripcion'] = 'Revisado'
+        respuesta = self.client.post(self.url + '?usos=2', datos)
+        self.assertEqual(respuesta.status_code, 302)
+        self.assertEqual(UsoBono.objects.filter(descripcion='Revisado').count(), 5)
+
+    def test_alta_sin_desplegable_de_clientes(self):
+        for n in range(2, 12):
+            crear_cliente(n)
+        respuesta = self.client.get(reverse('admin:bonos_bono_add'))
+        self.assertContains(respuesta, 'admin-autocomplete')
+        self.assertNotContains(respuesta, 'Cliente5 Apellido5')
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class SelectorClienteTests(TestCase):
+
+    def setUp(self):
+        self.cliente = crear_cliente()
+        self.client.force_login(User.objects.create_user('staff', password='x', is_staff=True))
+
+    def consultas_alta(self, **params):
+        Site.objects.clear_cache()
+        with CaptureQueriesContext(connection) as ctx:
+            respuesta = self.client.get(reverse('bonos:crear'), params)
+        return len(ctx), respuesta
+
+    def test_alta_en_tiempo_constante(self):
+        pocas, _ = self.consultas_alta()
+        for n in range(2, 40):
+            crear_cliente(n)
+        muchas, respuesta = self.consultas_alta()
+        self.assertEqual(pocas, muchas)
+        self.assertNotContains(respuesta, 'Cliente7 Apellido7')
+        self.assertContains(respuesta, 'data-autocompletar')
+
+        # El cliente preseleccionado es la única opción que se pinta
+        _, respuesta = self.consultas_alta(cliente=self.cliente.pk)
+        self.assertContains(respuesta, f'<option value="{self.cliente.pk}" selected>')
+
+    def test_valida_solo_el_id_enviado(self):
+        datos = {'tipo_bono': 10, 'precio': '', 'fecha_expiracion': ''}
+        form = BonoForm(dict(datos, cliente=self.cliente.pk))
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertIn('cliente', BonoForm(dict(datos, cliente=999999)).errors)
+
+
+class RedimirBonoConcurrenteTests(TransactionTestCase):
+
+    hilos = 8
+    intentos_por_hilo = 5
+
+    def test_canjes_concurrentes_sin_perdidas(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest('SQLite en memoria no admite escrituras desde varios hilos')
+        bono = Bono.objects.create(cliente=crear_cliente(), tipo_bono=20)
+        resultados = []
+        barrera = threading.Barrier(self.hilos)
+
+        def canjear():
+            try:
+                barrera.wait()
+                for _ in range(self.intentos_por_hilo):
+                    resultados.append(redimir_bono(Bono(pk=bono.pk)) is not None)
+            finally:
+                connection.close()
+
+        hilos = [threading.Thread(target=canjear) for _ in range(self.hilos)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        bono.refresh_from_db()
+        canjes = sum(resultados)
+        self.assertEqual(canjes, 20)
+        self.assertEqual(bono.usos_restantes, 0)
+        self.assertFalse(bono.activo)
+        self.assertEqual(UsoBono.objects.filter(bono=bono).count(), canjes)
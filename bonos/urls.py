@@ -6,6 +6,7 @@ app_name = 'bonos'
 urlpatterns = [
     # Dashboard
     path('', views.dashboard, name='dashboard'),
+    path('api/estadisticas/', views.dashboard_api, name='dashboard_api'),
     
     # Bonos
     path('bonos/', views.BonoListView.as_view(), name='lista'),
@@ -15,4 +16,10 @@ urlpatterns = [
     path('bonos/<int:pk>/eliminar/', views.BonoDeleteView.as_view(), name='eliminar'),
     path('bonos/<int:pk>/usar/', views.usar_bono, name='usar'),
     path('bonos/<int:pk>/agregar-uso/', views.agregar_uso_bono, name='agregar_uso'),
+    path('bonos/checkin/', views.checkin_grupo, name='checkin_grupo'),
+    path('bonos/venta/', views.venta_grupo, name='venta_grupo'),
+
+    # Exportaciones CSV
+    path('bonos/exportar/', views.exportar_bonos, name='exportar'),
+    path('usos/exportar/', views.exportar_usos, name='exportar_usos'),
 ]
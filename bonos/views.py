@@ -1,22 +1,65 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib import messages
+from django.http import JsonResponse
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
 from django.urls import reverse_lazy
 from .models import Bono, UsoBono
 from clientes.models import Cliente
-from .forms import BonoForm, UsoBonoForm
+from .forms import BonoForm, UsoBonoForm, CheckinGrupoForm, VentaGrupoForm
+from .services import redimir_bono, redimir_bonos, bonos_para_clientes, vender_bonos
+from arenasurf.cache import cache_swr
+from arenasurf.estadisticas import estadisticas_bonos
+from arenasurf.exportacion import exportar_csv
 from arenasurf.mixins import StaffRequiredMixin, staff_required
+from arenasurf.paginacion import PaginacionCursorMixin
 
 
 # Vistas de Bonos
-class BonoListView(StaffRequiredMixin, ListView):
+class BonoListView(StaffRequiredMixin, PaginacionCursorMixin, ListView):
     model = Bono
     template_name = 'bonos/bono_list.html'
     context_object_name = 'bonos'
     paginate_by = 20
+    # Todas las ordenaciones terminan en ``id`` para poder paginar por cursor
+    ordenes = {
+        'fecha': ('-fecha_compra', '-id'),
+        'uso': ('-porcentaje_uso_db', '-fecha_compra', '-id'),
+        'restantes': ('usos_restantes', '-fecha_compra', '-id'),
+    }
+    
+    def get_orden(self):
+        orden = self.request.GET.get('orden')
+        return orden if orden in self.ordenes else 'fecha'
+    
+    def get_caducan(self):
+        """Días del filtro de próximos a caducar (None si no se filtra)"""
+        dias = self.request.GET.get('caducan', '')
+        return int(dias) if dias.isdigit() and int(dias) > 0 else None
     
     def get_queryset(self):
-        return Bono.objects.select_related('cliente').order_by('-fecha_compra')
+        bonos = Bono.objects.with_usage().select_related('cliente')
+        dias = self.get_caducan()
+        if dias:
+            return bonos.proximos_a_caducar(dias).order_by('fecha_expiracion', 'pk')
+        return bonos.order_by(*self.ordenes[self.get_orden()])
+    
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['orden'] = self.get_orden()
+        context['caducan'] = self.get_caducan()
+        return context
+    
+    def serializar_objeto(self, bono):
+        return {
+            'id': bono.pk,
+            'cliente': bono.cliente.nombre_completo,
+            'tipo_bono': bono.tipo_bono,
+            'usos_restantes': bono.usos_restantes,
+            'usos_totales': bono.usos_totales,
+            'porcentaje_uso': round(bono.porcentaje_uso_db, 1),
+            'fecha_compra': bono.fecha_compra.isoformat(),
+            'activo': bono.activo,
+        }
 
 
 class BonoDetailView(StaffRequiredMixin, DetailView):
@@ -51,6 +94,8 @@ class BonoCreateView(StaffRequiredMixin, CreateView):
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
+        # El selector de cliente no lista los clientes, así que se avisa aparte
+        context['hay_clientes'] = Cliente.objects.exists()
         # Agregar información del cliente pre-seleccionado al contexto
         cliente_id = self.request.GET.get('cliente')
         if cliente_id:
@@ -93,17 +138,11 @@ def usar_bono(request, pk):
     bono = get_object_or_404(Bono, pk=pk)
     
     if request.method == 'POST':
-        if bono.usar_bono():
-            # Crear registro de uso rápido con fecha actual
-            from django.utils import timezone
-            UsoBono.objects.create(
-                bono=bono,
-                fecha_uso=timezone.now().date(),
-                descripcion="Uso rápido"
-            )
+        # Descuento y registro de uso rápido en una única transacción
+        if redimir_bono(bono, descripcion="Uso rápido"):
             messages.success(request, f'Bono usado exitosamente. Quedan {bono.usos_restantes} usos.')
         else:
-            messages.error(request, 'No se puede usar este bono. No tiene usos restantes.')
+            messages.error(request, 'No se puede usar este bono. No tiene usos restantes o ha caducado.')
     
     return redirect('bonos:detalle', pk=bono.pk)
 
@@ -113,21 +152,19 @@ def usar_bono(request, pk):
 def agregar_uso_bono(request, pk):
     bono = get_object_or_404(Bono, pk=pk)
     
-    if not bono.activo or bono.usos_restantes <= 0:
-        messages.error(request, 'No se puede usar este bono. No tiene usos restantes.')
+    if not bono.activo or bono.usos_restantes <= 0 or bono.esta_caducado:
+        messages.error(request, 'No se puede usar este bono. No tiene usos restantes o ha caducado.')
         return redirect('bonos:detalle', pk=bono.pk)
     
     if request.method == 'POST':
         form = UsoBonoForm(request.POST)
         if form.is_valid():
-            if bono.usar_bono():
-                uso = form.save(commit=False)
-                uso.bono = bono
-                uso.save()
+            if redimir_bono(bono, uso=form.save(commit=False)):
                 messages.success(request, f'Uso registrado exitosamente. Quedan {bono.usos_restantes} usos.')
                 return redirect('bonos:detalle', pk=bono.pk)
             else:
-                messages.error(request, 'Error al usar el bono.')
+                messages.error(request, 'No se puede usar este bono. No tiene usos restantes o ha caducado.')
+                return redirect('bonos:detalle', pk=bono.pk)
         else:
             messages.error(request, 'Por favor corrige los errores en el formulario.')
     else:
@@ -139,19 +176,107 @@ def agregar_uso_bono(request, pk):
     })
 
 
+# Check-in de grupo: canjea los bonos de una clase completa de una vez
+@staff_required
+def checkin_grupo(request):
+    resultado = None
+    if request.method == 'POST':
+        form = CheckinGrupoForm(request.POST)
+        if form.is_valid():
+            bono_ids = list(form.cleaned_data['bonos'])
+            sin_bono = []
+            cliente_ids = form.cleaned_data['clientes']
+            if cliente_ids:
+                elegidos = bonos_para_clientes(cliente_ids)
+                bono_ids.extend(elegidos.values())
+                sin_bono = [pk for pk in dict.fromkeys(cliente_ids) if pk not in elegidos]
+
+            resultado = redimir_bonos(
+                bono_ids,
+                fecha_uso=form.cleaned_data['fecha_uso'],
+                descripcion=form.cleaned_data['descripcion'],
+            )
+            resultado.rechazados.extend(
+                {'cliente_id': pk, 'motivo': 'El cliente no tiene bonos disponibles'}
+                for pk in sin_bono
+            )
+
+            if request.accepts('application/json') and not request.accepts('text/html'):
+                return JsonResponse(resultado.as_dict())
+
+            if resultado.canjeados:
+                messages.success(request, f'Check-in completado: {len(resultado.canjeados)} bonos canjeados.')
+            if resultado.rechazados:
+                messages.warning(request, f'{len(resultado.rechazados)} canjes no se han podido realizar.')
+        elif request.accepts('application/json') and not request.accepts('text/html'):
+            return JsonResponse({'errors': form.errors}, status=400)
+    else:
+        form = CheckinGrupoForm()
+
+    return render(request, 'bonos/checkin_grupo.html', {
+        'form': form,
+        'resultado': resultado,
+    })
+
+
+# Venta de grupo: el mismo tipo de bono para todos los alumnos de una vez
+@staff_required
+def venta_grupo(request):
+    resultado = None
+    if request.method == 'POST':
+        form = VentaGrupoForm(request.POST)
+        if form.is_valid():
+            resultado = vender_bonos(
+                form.cleaned_data['clientes'],
+                form.cleaned_data['tipo_bono'],
+                cantidad=form.cleaned_data['cantidad'],
+                precio=form.cleaned_data['precio'],
+                fecha_expiracion=form.cleaned_data['fecha_expiracion'],
+            )
+
+            if request.accepts('application/json') and not request.accepts('text/html'):
+                return JsonResponse(resultado.as_dict())
+
+            if resultado.bonos:
+                messages.success(request, f'Venta completada: {resultado.bonos} bonos creados.')
+            if resultado.rechazados:
+                messages.warning(request, f'{len(resultado.rechazados)} clientes no se han podido incluir.')
+        elif request.accepts('application/json') and not request.accepts('text/html'):
+            return JsonResponse({'errors': form.errors}, status=400)
+    else:
+        form = VentaGrupoForm()
+
+    return render(request, 'bonos/venta_grupo.html', {
+        'form': form,
+        'resultado': resultado,
+    })
+
+
 # Vista del dashboard
+def _estadisticas_dashboard():
+    return cache_swr('dashboard:bonos', estadisticas_bonos)
+
+
 @staff_required
 def dashboard(request):
-    bonos_activos = Bono.objects.filter(activo=True).count()
-    bonos_agotados = Bono.objects.filter(activo=False).count()
-    clientes_activos = Cliente.objects.filter(activo=True).count()
-    usos_recientes = UsoBono.objects.select_related('bono__cliente').order_by('-fecha_uso')[:10]
-    
-    context = {
-        'bonos_activos': bonos_activos,
-        'bonos_agotados': bonos_agotados,
-        'clientes_activos': clientes_activos,
-        'usos_recientes': usos_recientes,
-    }
-    
-    return render(request, 'bonos/dashboard.html', context)
+    return render(request, 'bonos/dashboard.html', {
+        'estadisticas': _estadisticas_dashboard(),
+    })
+
+
+@staff_required
+def dashboard_api(request):
+    """Estadísticas del dashboard en JSON"""
+    return JsonResponse(_estadisticas_dashboard().as_dict())
+
+
+@staff_required
+def exportar_bonos(request):
+    """CSV de bonos con sus clientes (filtros: desde, hasta, estado, gzip)"""
+    return exportar_csv(request, 'bonos')
+
+
+@staff_required
+def exportar_usos(request):
+    """CSV de usos con su bono y cliente (filtros: desde, hasta, gzip)"""
+    return exportar_csv(request, 'usos')
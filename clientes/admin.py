@@ -1,4 +1,5 @@
 from django.contrib import admin
+from arenasurf.paginacion import PaginadorEstimado
 from .models import Cliente
 
 
@@ -6,8 +7,12 @@ from .models import Cliente
 class ClienteAdmin(admin.ModelAdmin):
     list_display = ['nombre', 'apellidos', 'email', 'telefono', 'usuario', 'activo', 'created_at']
     list_filter = ['activo', 'created_at']
+    list_select_related = ['usuario']
     search_fields = ['nombre', 'apellidos', 'email', 'usuario__username']
+    autocomplete_fields = ['usuario']
     readonly_fields = ['created_at', 'updated_at']
+    paginator = PaginadorEstimado
+    show_full_result_count = False
     fieldsets = (
         ('Información Personal', {
             'fields': ('nombre', 'apellidos', 'email', 'telefono', 'fecha_nacimiento')
@@ -0,0 +1,101 @@
+"""
+Índice de búsqueda de clientes
+
+Cada cliente tiene en ``TerminoBusqueda`` las palabras de su nombre,
+apellidos, email, teléfono y número de socio, sin acentos y en minúsculas
+(``casefold``). Buscar es pedir, para cada palabra del texto, los clientes
+con algún término que empiece por ella; como el término está indexado eso
+es un rango sobre el índice en lugar de un ``LIKE '%...%'`` que recorre la
+tabla, y "munoz" encuentra a "Muñoz".
+
+El índice se mantiene con las señales de guardado de clientes y socios; los
+caminos que escriben sin ``save()`` llaman a ``indexar_clientes`` y el
+comando ``indexar_busqueda`` lo reconstruye entero.
+"""
+import re
+import unicodedata
+
+from django.db import connections, transaction
+from django.db.models import Q
+
+LONGITUD_TERMINO = 100
+CAMPOS_INDEXADOS = ('nombre', 'apellidos', 'email', 'telefono')
+
+
+def normalizar(texto):
+    """Quita acentos y diacríticos y pasa a minúsculas (``casefold``)"""
+    descompuesto = unicodedata.normalize('NFKD', texto or '')
+    return ''.join(c for c in descompuesto if not unicodedata.combining(c)).casefold()
+
+
+def palabras(texto):
+    return [p[:LONGITUD_TERMINO] for p in re.findall(r'\w+', normalizar(texto))]
+
+
+def terminos(nombre='', apellidos='', email='', telefono='', numero_socio=''):
+    """Términos de búsqueda de un cliente, sin repetir"""
+    resultado = set()
+    for texto in (nombre, apellidos, email, telefono):
+        resultado.update(palabras(texto))
+    # El teléfono también entero, para encontrarlo lo escriban con o sin espacios
+    digitos = re.sub(r'\D', '', telefono or '')
+    if digitos:
+        resultado.add(digitos[:LONGITUD_TERMINO])
+    for numero in palabras(numero_socio):
+        resultado.add(numero)
+        # "42" encuentra al socio "0042"
+        if numero.isdigit() and numero.lstrip('0'):
+            resultado.add(numero.lstrip('0'))
+    return sorted(resultado)
+
+
+def indexar_clientes(cliente_ids):
+    """Regenera los términos de los clientes indicados. Devuelve cuántos se crean"""
+    from .models import Cliente, TerminoBusqueda
+
+    cliente_ids = list(set(cliente_ids))
+    filas = Cliente.objects.filter(pk__in=cliente_ids).values_list(
+        'pk', *CAMPOS_INDEXADOS, 'socio__numero_socio'
+    )
+    nuevos = [
+        TerminoBusqueda(cliente_id=pk, termino=termino)
+        for pk, *campos in filas
+        for termino in terminos(*campos)
+    ]
+    with transaction.atomic():
+        TerminoBusqueda.objects.filter(cliente_id__in=cliente_ids).delete()
+        TerminoBusqueda.objects.bulk_create(nuevos, batch_size=1000)
+    return len(nuevos)
+
+
+def prefijo(campo, palabra, using='default'):
+    """
+    Condición "``campo`` empieza por ``palabra``" que puede usar un índice.
+
+    En SQLite ``LIKE`` no distingue mayúsculas y no usa los índices
+    normales, así que se expresa como el rango ``[palabra, sucesor)``; los
+    términos ya están normalizados y el orden binario es el de los puntos
+    de código. MySQL usa el índice con ``LIKE 'palabra%'``.
+    """
+    if connections[using].vendor == 'sqlite':
+        sucesor = palabra[:-1] + chr(ord(palabra[-1]) + 1)
+        return Q(**{f'{campo}__gte': palabra, f'{campo}__lt': sucesor})
+    return Q(**{f'{campo}__startswith': palabra})
+
+
+def buscar(queryset, texto, campo_cliente='pk'):
+    """
+    Filtra ``queryset`` a los clientes que tienen, para cada palabra de
+    ``texto``, algún término que empieza por ella.
+
+    ``campo_cliente`` es el camino hasta el id del cliente (``'cliente_id'``
+    para buscar socios).
+    """
+    from .models import TerminoBusqueda
+
+    for palabra in palabras(texto):
+        coincidencias = TerminoBusqueda.objects.filter(
+            prefijo('termino', palabra, queryset.db)
+        ).values('cliente_id')
+        queryset = queryset.filter(**{f'{campo_cliente}__in': coincidencias})
+    return queryset
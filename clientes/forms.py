@@ -1,7 +1,46 @@
 from django import forms
+from django.urls import reverse
 from .models import Cliente
 
 
+class SelectorCliente(forms.Select):
+    """
+    Select de clientes que solo renderiza la opción elegida.
+
+    Las demás se buscan desde el navegador con el endpoint de
+    autocompletado, así que el formulario se pinta igual de rápido con diez
+    clientes que con cien mil. Al validar, ``ModelChoiceField`` solo busca
+    el id enviado dentro de su queryset.
+    """
+
+    class Media:
+        js = ['clientes/js/selector_cliente.js']
+
+    def __init__(self, attrs=None, sin_socio=False):
+        super().__init__({'class': 'form-control', **(attrs or {})})
+        self.sin_socio = sin_socio
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        url = reverse('clientes:autocompletar')
+        if self.sin_socio:
+            url += '?sin_socio=1'
+        context['widget']['attrs']['data-autocompletar'] = url
+        return context
+
+    def optgroups(self, name, value, attrs=None):
+        elegidos = {str(v) for v in value if str(v).isdigit()}
+        opciones = []
+        if self.choices.field.empty_label is not None:
+            opciones.append(('', self.choices.field.empty_label))
+        if elegidos:
+            opciones += [self.choices.choice(obj) for obj in self.choices.queryset.filter(pk__in=elegidos)]
+        return [
+            (None, [self.create_option(name, valor, etiqueta, str(valor) in elegidos, indice, attrs=attrs)], indice)
+            for indice, (valor, etiqueta) in enumerate(opciones)
+        ]
+
+
 class ClienteForm(forms.ModelForm):
     class Meta:
         model = Cliente
@@ -20,3 +59,10 @@ class ClienteForm(forms.ModelForm):
             'telefono': 'Teléfono',
             'fecha_nacimiento': 'Fecha de Nacimiento',
         }
+
+
+class ImportarClientesForm(forms.Form):
+    fichero = forms.FileField(
+        label='Fichero CSV',
+        widget=forms.ClearableFileInput(attrs={'class': 'form-control', 'accept': '.csv,text/csv'}),
+    )
@@ -0,0 +1,76 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+from clientes.busqueda import buscar, indexar_clientes
+from clientes.models import Cliente
+
+NOMBRES = ['Ana', 'Andrés', 'Íñigo', 'María', 'José', 'Lucía', 'Nerea', 'Óscar', 'Álvaro', 'Sofía', 'Mikel', 'Zoe']
+APELLIDOS = ['Muñoz', 'García', 'Martínez', 'López', 'Sánchez', 'Pérez', 'Gómez', 'Díaz',
+             'Fernández', 'Ibáñez', 'Etxeberria', 'Castaño', 'Núñez', 'Rodríguez']
+BUSQUEDAS = ['munoz', 'Muñoz', 'garc', 'ana mart', 'inigo ibanez', 'zoe', '600', 'etxeberria']
+
+
+class Command(BaseCommand):
+    help = (
+        'Comparar la búsqueda de clientes con icontains y con el índice de términos '
+        'sobre clientes sintéticos (se deshace todo al terminar)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clientes', type=int, default=100000, help='Clientes sintéticos a crear')
+        parser.add_argument('--repeticiones', type=int, default=3, help='Veces que se repite cada búsqueda')
+        parser.add_argument('--semilla', type=int, default=1)
+
+    def medir(self, consulta, repeticiones):
+        """Milisegundos de la mejor repetición y número de resultados"""
+        mejor = None
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            total = consulta.count()
+            list(consulta[:20])
+            transcurrido = (time.perf_counter() - inicio) * 1000
+            mejor = transcurrido if mejor is None else min(mejor, transcurrido)
+        return mejor, total
+
+    def handle(self, *args, **options):
+        azar = random.Random(options['semilla'])
+        n = options['clientes']
+
+        with transaction.atomic():
+            inicio = time.perf_counter()
+            primero = (Cliente.objects.order_by('-pk').values_list('pk', flat=True).first() or 0) + 1
+            Cliente.objects.bulk_create([
+                Cliente(
+                    nombre=azar.choice(NOMBRES),
+                    apellidos=f'{azar.choice(APELLIDOS)} {azar.choice(APELLIDOS)}',
+                    email=f'benchmark{primero + i}@example.com',
+                    telefono=f'6{azar.randrange(10 ** 8):08d}',
+                ) for i in range(n)
+            ], batch_size=1000)
+            self.stdout.write(f'👥 {n} clientes creados en {time.perf_counter() - inicio:.1f} s')
+
+            inicio = time.perf_counter()
+            ids = list(Cliente.objects.filter(pk__gte=primero).values_list('pk', flat=True))
+            terminos = sum(indexar_clientes(ids[i:i + 1000]) for i in range(0, len(ids), 1000))
+            self.stdout.write(f'🗂️ {terminos} términos indexados en {time.perf_counter() - inicio:.1f} s')
+
+            clientes = Cliente.objects.filter(activo=True).order_by('apellidos', 'nombre', 'id')
+            for texto in BUSQUEDAS:
+                icontains = clientes
+                for palabra in texto.split():
+                    icontains = icontains.filter(
+                        Q(nombre__icontains=palabra) | Q(apellidos__icontains=palabra) |
+                        Q(email__icontains=palabra) | Q(telefono__icontains=palabra)
+                    )
+                ms_antes, total_antes = self.medir(icontains, options['repeticiones'])
+                ms_indice, total_indice = self.medir(buscar(clientes, texto), options['repeticiones'])
+                self.stdout.write(
+                    f'🔍 "{texto}": icontains {ms_antes:.1f} ms ({total_antes}) · '
+                    f'índice {ms_indice:.1f} ms ({total_indice})'
+                )
+
+            transaction.set_rollback(True)
+        self.stdout.write('✅ Benchmark terminado; los clientes sintéticos se han descartado')
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from clientes.busqueda import indexar_clientes
+from clientes.models import Cliente
+
+
+class Command(BaseCommand):
+    help = 'Reconstruir el índice de búsqueda de clientes (nombre, email, teléfono y número de socio)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='Número de clientes que se indexan por transacción',
+        )
+
+    def handle(self, *args, **options):
+        clientes = Cliente.objects.order_by('pk').values_list('pk', flat=True)
+        total = terminos = 0
+        ultimo = 0
+        while True:
+            ids = list(clientes.filter(pk__gt=ultimo)[:options['chunk_size']])
+            if not ids:
+                break
+            terminos += indexar_clientes(ids)
+            total += len(ids)
+            ultimo = ids[-1]
+            self.stdout.write(f'⏳ {total} clientes indexados...')
+
+        self.stdout.write(f'🎉 {total} clientes indexados con {terminos} términos de búsqueda')
@@ -1,7 +1,15 @@
+import json
+from itertools import groupby
+
 from django.core.management.base import BaseCommand
 from django.contrib.auth.models import User
+from django.db.models import Count, Exists, IntegerField, OuterRef, Q, Subquery
 from clientes.models import Cliente
-from django.db import transaction
+from clientes.vinculacion import candidatos_por_email, emails_normalizados, vincular
+
+
+def _nombre(nombre, apellidos):
+    return f'{nombre} {apellidos}'
 
 
 class Command(BaseCommand):
@@ -18,85 +26,148 @@ class Command(BaseCommand):
             action='store_true',
             help='Reparar usuarios/clientes duplicados',
         )
+        parser.add_argument(
+            '--json',
+            action='store_true',
+            help='Escribir el diagnóstico como JSON, un objeto por línea',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=2000,
+            help='Filas que se leen por bloque al recorrer los resultados',
+        )
+
+    def emitir(self, texto, **datos):
+        """Una línea de salida: el texto o, con --json, el objeto ``datos``"""
+        if self.json:
+            if datos:
+                self.stdout.write(json.dumps(datos, ensure_ascii=False))
+        else:
+            self.stdout.write(texto)
+
+    def recorrer(self, queryset):
+        return queryset.iterator(chunk_size=self.chunk_size)
 
     def handle(self, *args, **options):
         dry_run = options.get('dry_run', False)
         fix_duplicates = options.get('fix_duplicates', False)
-        
+        self.json = options['json']
+        self.chunk_size = options['chunk_size']
+
         if dry_run:
-            self.stdout.write('🔍 Modo DRY-RUN activado - No se realizarán cambios')
-        
-        self.stdout.write('=== DIAGNÓSTICO DE USUARIOS Y CLIENTES ===')
-        
-        # 1. Verificar usuarios sin cliente
-        usuarios_sin_cliente = User.objects.filter(cliente__isnull=True).exclude(is_staff=True)
-        self.stdout.write(f'👤 Usuarios sin cliente (no staff): {usuarios_sin_cliente.count()}')
-        for user in usuarios_sin_cliente:
-            self.stdout.write(f'  - {user.username} ({user.email})')
-        
-        # 2. Verificar clientes sin usuario
-        clientes_sin_usuario = Cliente.objects.filter(usuario__isnull=True)
-        self.stdout.write(f'👥 Clientes sin usuario: {clientes_sin_usuario.count()}')
-        for cliente in clientes_sin_usuario:
-            self.stdout.write(f'  - {cliente.nombre_completo} ({cliente.email})')
-        
-        # 3. Verificar emails duplicados en clientes
-        from django.db.models import Count
-        emails_duplicados = (Cliente.objects
-                           .values('email')
-                           .annotate(count=Count('email'))
-                           .filter(count__gt=1))
-        
-        if emails_duplicados:
-            self.stdout.write(f'📧 Emails duplicados en clientes: {emails_duplicados.count()}')
-            for email_data in emails_duplicados:
-                email = email_data['email']
-                count = email_data['count']
-                self.stdout.write(f'  - {email}: {count} clientes')
-                clientes = Cliente.objects.filter(email=email)
-                for cliente in clientes:
-                    usuario_info = f" -> Usuario: {cliente.usuario.username}" if cliente.usuario else " -> Sin usuario"
-                    self.stdout.write(f'    * {cliente.nombre_completo}{usuario_info}')
-        
-        # 4. Verificar usuarios con emails duplicados con clientes
-        problemas_email = []
-        for user in User.objects.all():
-            clientes_con_email = Cliente.objects.filter(email=user.email)
-            if clientes_con_email.count() > 1:
-                problemas_email.append((user, clientes_con_email))
-            elif clientes_con_email.count() == 1:
-                cliente = clientes_con_email.first()
-                if cliente.usuario != user:
-                    problemas_email.append((user, clientes_con_email))
-        
-        if problemas_email:
-            self.stdout.write(f'⚠️  Conflictos de email usuario-cliente: {len(problemas_email)}')
-            for user, clientes in problemas_email:
-                self.stdout.write(f'  - Usuario {user.username} ({user.email}):')
-                for cliente in clientes:
-                    usuario_info = f" vinculado a {cliente.usuario.username}" if cliente.usuario else " sin usuario"
-                    self.stdout.write(f'    * Cliente {cliente.nombre_completo}{usuario_info}')
-        
+            self.emitir('🔍 Modo DRY-RUN activado - No se realizarán cambios')
+
+        self.emitir('=== DIAGNÓSTICO DE USUARIOS Y CLIENTES ===')
+        resumen = {
+            'usuarios_sin_cliente': self.usuarios_sin_cliente(),
+            'clientes_sin_usuario': self.clientes_sin_usuario(),
+            'emails_duplicados': self.emails_duplicados(),
+            'conflictos_email': self.conflictos_email(),
+        }
+
         # Reparaciones automáticas
         if fix_duplicates and not dry_run:
-            self.stdout.write('\\n🔧 APLICANDO REPARACIONES...')
-            
-            with transaction.atomic():
-                reparaciones = 0
-                
-                # Vincular usuarios con clientes por email
-                for user in usuarios_sin_cliente:
-                    clientes_matching = Cliente.objects.filter(email=user.email, usuario__isnull=True)
-                    if clientes_matching.count() == 1:
-                        cliente = clientes_matching.first()
-                        cliente.usuario = user
-                        cliente.save()
-                        self.stdout.write(f'✅ Vinculado: {user.username} ↔ {cliente.nombre_completo}')
-                        reparaciones += 1
-                
-                self.stdout.write(f'🎉 Reparaciones completadas: {reparaciones}')
-        
+            self.emitir('\n🔧 APLICANDO REPARACIONES...')
+            resumen['reparaciones'] = self.reparar()
+            self.emitir(f'🎉 Reparaciones completadas: {resumen["reparaciones"]}')
         elif fix_duplicates and dry_run:
-            self.stdout.write('\\n💡 Ejecuta sin --dry-run para aplicar las reparaciones')
-        
-        self.stdout.write('\\n✅ Diagnóstico completado')
+            self.emitir('\n💡 Ejecuta sin --dry-run para aplicar las reparaciones')
+
+        self.emitir('\n✅ Diagnóstico completado', tipo='resumen', **resumen)
+
+    def usuarios_sin_cliente(self):
+        usuarios = User.objects.filter(cliente__isnull=True, is_staff=False)
+        total = usuarios.count()
+        self.emitir(f'👤 Usuarios sin cliente (no staff): {total}')
+        for username, email in self.recorrer(usuarios.order_by('pk').values_list('username', 'email')):
+            self.emitir(f'  - {username} ({email})', tipo='usuario_sin_cliente', usuario=username, email=email)
+        return total
+
+    def clientes_sin_usuario(self):
+        clientes = Cliente.objects.filter(usuario__isnull=True)
+        total = clientes.count()
+        self.emitir(f'👥 Clientes sin usuario: {total}')
+        filas = clientes.order_by('pk').values_list('pk', 'nombre', 'apellidos', 'email')
+        for pk, nombre, apellidos, email in self.recorrer(filas):
+            self.emitir(
+                f'  - {_nombre(nombre, apellidos)} ({email})',
+                tipo='cliente_sin_usuario', cliente_id=pk, cliente=_nombre(nombre, apellidos), email=email,
+            )
+        return total
+
+    def clientes_con_email(self, emails):
+        """Clientes de los emails en minúsculas de ``emails`` (subconsulta), agrupados"""
+        filas = (
+            emails_normalizados(Cliente.objects.all()).filter(email_normalizado__in=emails)
+            .order_by('email_normalizado', 'pk')
+            .values_list('email_normalizado', 'pk', 'nombre', 'apellidos', 'usuario__username')
+        )
+        for email, grupo in groupby(self.recorrer(filas), key=lambda fila: fila[0]):
+            yield email, [
+                {'cliente_id': pk, 'cliente': _nombre(nombre, apellidos), 'usuario': username}
+                for _, pk, nombre, apellidos, username in grupo
+            ]
+
+    def emails_duplicados(self):
+        duplicados = (
+            emails_normalizados(Cliente.objects.all()).values('email_normalizado')
+            .annotate(n=Count('pk')).filter(n__gt=1)
+        )
+        total = duplicados.count()
+        if not total:
+            return 0
+        self.emitir(f'📧 Emails duplicados en clientes: {total}')
+        for email, clientes in self.clientes_con_email(duplicados.values('email_normalizado')):
+            self.emitir(f'  - {email}: {len(clientes)} clientes', tipo='email_duplicado', email=email, clientes=clientes)
+            for cliente in clientes:
+                usuario_info = f" -> Usuario: {cliente['usuario']}" if cliente['usuario'] else " -> Sin usuario"
+                self.emitir(f"    * {cliente['cliente']}{usuario_info}")
+        return total
+
+    def conflictos_email(self):
+        """Usuarios cuyo email tiene varios clientes o un cliente que no es el suyo"""
+        con_email = emails_normalizados(Cliente.objects.all()).filter(
+            email_normalizado=OuterRef('email_normalizado')
+        ).order_by()
+        usuarios = emails_normalizados(User.objects.all()).annotate(
+            clientes_email=Subquery(
+                con_email.values('email_normalizado').annotate(n=Count('pk')).values('n'),
+                output_field=IntegerField(),
+            ),
+            vinculado=Exists(con_email.filter(usuario=OuterRef('pk'))),
+        ).filter(Q(clientes_email__gt=1) | Q(clientes_email=1, vinculado=False))
+        total = usuarios.count()
+        if not total:
+            return 0
+        self.emitir(f'⚠️  Conflictos de email usuario-cliente: {total}')
+
+        # Los clientes en conflicto se leen con una consulta; los usuarios se recorren
+        clientes = dict(self.clientes_con_email(usuarios.values('email_normalizado')))
+        filas = usuarios.order_by('email_normalizado', 'pk').values_list('email', 'email_normalizado', 'username')
+        for email, email_normalizado, username in self.recorrer(filas):
+            grupo = clientes.get(email_normalizado, [])
+            self.emitir(
+                f'  - Usuario {username} ({email}):',
+                tipo='conflicto_email', usuario=username, email=email, clientes=grupo,
+            )
+            for cliente in grupo:
+                usuario_info = f" vinculado a {cliente['usuario']}" if cliente['usuario'] else " sin usuario"
+                self.emitir(f"    * Cliente {cliente['cliente']}{usuario_info}")
+        return total
+
+    def reparar(self):
+        """Vincula cada usuario sin cliente (no staff) con el cliente libre de su email"""
+        candidatos = candidatos_por_email(User.objects.filter(is_staff=False))
+        pares = {}
+        for cliente_id, usuario_id, username, nombre, apellidos in self.recorrer(candidatos):
+            pares[cliente_id] = (usuario_id, username, _nombre(nombre, apellidos))
+        # Solo se informa de los clientes que el UPDATE ha vinculado de verdad
+        vinculados = vincular((cliente_id, usuario_id) for cliente_id, (usuario_id, _, _) in pares.items())
+        for cliente_id in vinculados:
+            _, username, nombre = pares[cliente_id]
+            self.emitir(
+                f'✅ Vinculado: {username} ↔ {nombre}',
+                tipo='vinculado', usuario=username, cliente_id=cliente_id,
+            )
+        return len(vinculados)
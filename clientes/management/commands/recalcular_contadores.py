@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max, Min
+from clientes.models import Cliente
+
+
+class Command(BaseCommand):
+    help = 'Recalcular los contadores de bonos y usos de los clientes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=5000,
+            help='Número de clientes que se recalculan por transacción',
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        rango = Cliente.objects.aggregate(minimo=Min('pk'), maximo=Max('pk'))
+        if rango['minimo'] is None:
+            self.stdout.write('📊 No hay clientes que recalcular')
+            return
+
+        total = 0
+        inicio = rango['minimo']
+        while inicio <= rango['maximo']:
+            fin = inicio + chunk_size
+            with transaction.atomic():
+                total += Cliente.objects.filter(pk__gte=inicio, pk__lt=fin).recalcular_contadores()
+            inicio = fin
+
+        self.stdout.write(f'🎉 Contadores recalculados para {total} clientes')
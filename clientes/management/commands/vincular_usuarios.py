@@ -1,6 +1,10 @@
+import time
+from collections import defaultdict
+
 from django.core.management.base import BaseCommand
 from django.contrib.auth.models import User
 from clientes.models import Cliente
+from clientes.vinculacion import emails_normalizados, vincular
 
 
 class Command(BaseCommand):
@@ -12,53 +16,81 @@ class Command(BaseCommand):
             action='store_true',
             help='Mostrar qué cambios se harían sin aplicarlos',
         )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Clientes que se vinculan por UPDATE',
+        )
 
     def handle(self, *args, **options):
         dry_run = options.get('dry_run', False)
-        
+        batch_size = options['batch_size']
+        inicio = time.perf_counter()
+
         if dry_run:
             self.stdout.write('🔍 Modo DRY-RUN activado - No se realizarán cambios')
-        
+
         # Buscar clientes sin usuario asociado
-        clientes_sin_usuario = Cliente.objects.filter(usuario__isnull=True)
+        clientes_sin_usuario = emails_normalizados(Cliente.objects.filter(usuario__isnull=True))
         self.stdout.write(f'📊 Encontrados {clientes_sin_usuario.count()} clientes sin usuario asociado')
-        
+
+        # Mapa email -> usuarios con una consulta, sin distinguir mayúsculas
+        usuarios_por_email = defaultdict(list)
+        usuarios = (
+            emails_normalizados(User.objects.all())
+            .filter(email_normalizado__in=clientes_sin_usuario.values('email_normalizado'))
+            .values_list('email_normalizado', 'pk', 'username', 'cliente__pk')
+        )
+        for email, pk, username, cliente_id in usuarios.iterator(chunk_size=batch_size):
+            usuarios_por_email[email].append((pk, username, cliente_id))
+        lectura = time.perf_counter() - inicio
+
         vinculaciones = 0
-        
-        for cliente in clientes_sin_usuario:
-            try:
-                # Buscar usuario con el mismo email
-                usuario = User.objects.get(email=cliente.email)
-                
-                # Verificar que el usuario no esté ya vinculado a otro cliente
-                if hasattr(usuario, 'cliente') and usuario.cliente != cliente:
-                    self.stdout.write(
-                        f'⚠️  Usuario {usuario.username} ya está vinculado a otro cliente'
-                    )
-                    continue
-                
-                if dry_run:
-                    self.stdout.write(
-                        f'🔗 Se vincularía: {cliente.nombre_completo} ↔ {usuario.username}'
-                    )
-                else:
-                    cliente.usuario = usuario
-                    cliente.save()
-                    self.stdout.write(
-                        f'✅ Vinculado: {cliente.nombre_completo} ↔ {usuario.username}'
-                    )
-                
-                vinculaciones += 1
-                
-            except User.DoesNotExist:
-                self.stdout.write(
-                    f'❌ No se encontró usuario con email: {cliente.email}'
-                )
-            except User.MultipleObjectsReturned:
-                self.stdout.write(
-                    f'⚠️  Múltiples usuarios con email: {cliente.email}'
-                )
-        
+        pares = []
+        nombres = {}
+        asignados = set()
+        filas = clientes_sin_usuario.order_by('pk').values_list('pk', 'nombre', 'apellidos', 'email', 'email_normalizado')
+        for pk, nombre, apellidos, email, email_normalizado in filas.iterator(chunk_size=batch_size):
+            nombre_completo = f'{nombre} {apellidos}'
+            candidatos = usuarios_por_email.get(email_normalizado, [])
+            if not candidatos:
+                self.stdout.write(f'❌ No se encontró usuario con email: {email}')
+                continue
+            if len(candidatos) > 1:
+                self.stdout.write(f'⚠️  Múltiples usuarios con email: {email}')
+                continue
+            usuario_id, username, cliente_id = candidatos[0]
+            # Verificar que el usuario no esté ya vinculado a otro cliente,
+            # ni elegido antes en esta misma ejecución
+            if cliente_id is not None or usuario_id in asignados:
+                self.stdout.write(f'⚠️  Usuario {username} ya está vinculado a otro cliente')
+                continue
+
+            asignados.add(usuario_id)
+            pares.append((pk, usuario_id))
+            if dry_run:
+                self.stdout.write(f'🔗 Se vincularía: {nombre_completo} ↔ {username}')
+            else:
+                nombres[pk] = f'{nombre_completo} ↔ {username}'
+
+        # Se escribe al terminar de leer, por lotes de un UPDATE cada uno. Solo
+        # se informa de los clientes que el UPDATE ha vinculado: los que otra
+        # ejecución ha vinculado entretanto se saltan
+        if dry_run:
+            vinculaciones = len(pares)
+        else:
+            for i in range(0, len(pares), batch_size):
+                vinculados = vincular(pares[i:i + batch_size])
+                for pk in vinculados:
+                    self.stdout.write(f'✅ Vinculado: {nombres[pk]}')
+                vinculaciones += len(vinculados)
+
+        total = time.perf_counter() - inicio
+        self.stdout.write(
+            f'⏱️  Usuarios leídos en {lectura:.2f} s; total {total:.2f} s '
+            f'(lotes de {batch_size})'
+        )
         if dry_run:
             self.stdout.write(f'📈 Se vincularían {vinculaciones} clientes')
             self.stdout.write('💡 Ejecuta sin --dry-run para aplicar los cambios')
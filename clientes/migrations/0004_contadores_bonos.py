@@ -0,0 +1,48 @@
+# Generated by Django 4.2 on 2025-09-02 10:15
+
+from django.db import migrations, models
+from django.db.models import Count, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def calcular_contadores(apps, schema_editor):
+    Cliente = apps.get_model('clientes', 'Cliente')
+    Bono = apps.get_model('bonos', 'Bono')
+    bonos = Bono.objects.filter(cliente=OuterRef('pk')).order_by().values('cliente')
+
+    def contar(qs):
+        return Coalesce(Subquery(qs.annotate(n=Count('pk')).values('n')), Value(0))
+
+    usos = bonos.annotate(n=Sum(F('usos_totales') - F('usos_restantes'))).values('n')
+    Cliente.objects.update(
+        num_bonos_activos=contar(bonos.filter(activo=True)),
+        num_bonos_agotados=contar(bonos.filter(activo=False)),
+        num_usos=Coalesce(Subquery(usos), Value(0)),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clientes', '0003_auto_20250821_1028'),
+        ('bonos', '0004_alter_usobono_fecha_uso'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cliente',
+            name='num_bonos_activos',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Bonos activos'),
+        ),
+        migrations.AddField(
+            model_name='cliente',
+            name='num_bonos_agotados',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Bonos agotados'),
+        ),
+        migrations.AddField(
+            model_name='cliente',
+            name='num_usos',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Usos de bonos'),
+        ),
+        migrations.RunPython(calcular_contadores, migrations.RunPython.noop),
+    ]
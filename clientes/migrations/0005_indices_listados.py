@@ -0,0 +1,17 @@
+# Generated by Django 4.2 on 2026-10-17 23:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clientes', '0004_contadores_bonos'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cliente',
+            index=models.Index(fields=['apellidos', 'nombre', 'activo'], name='clientes_nombre_activo'),
+        ),
+    ]
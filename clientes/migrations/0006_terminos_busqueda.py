@@ -0,0 +1,54 @@
+# Generated by Django 4.2 on 2026-10-18 00:14
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+from clientes.busqueda import terminos
+
+
+def indexar_existentes(apps, schema_editor):
+    """Crea los términos de búsqueda de los clientes existentes"""
+    Cliente = apps.get_model('clientes', 'Cliente')
+    TerminoBusqueda = apps.get_model('clientes', 'TerminoBusqueda')
+    filas = Cliente.objects.values_list(
+        'pk', 'nombre', 'apellidos', 'email', 'telefono', 'socio__numero_socio'
+    ).order_by('pk')
+    lote = []
+    for pk, *campos in filas.iterator():
+        lote.extend(TerminoBusqueda(cliente_id=pk, termino=termino) for termino in terminos(*campos))
+        if len(lote) >= 1000:
+            TerminoBusqueda.objects.bulk_create(lote)
+            lote = []
+    TerminoBusqueda.objects.bulk_create(lote)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clientes', '0005_indices_listados'),
+        ('socios', '0004_indices_listados'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TerminoBusqueda',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('termino', models.CharField(max_length=100)),
+                ('cliente', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='terminos_busqueda', to='clientes.cliente')),
+            ],
+            options={
+                'verbose_name': 'Término de búsqueda',
+                'verbose_name_plural': 'Términos de búsqueda',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='terminobusqueda',
+            index=models.Index(fields=['termino', 'cliente'], name='clientes_termino_busqueda'),
+        ),
+        migrations.AddConstraint(
+            model_name='terminobusqueda',
+            constraint=models.UniqueConstraint(fields=('cliente', 'termino'), name='clientes_termino_unico'),
+        ),
+        migrations.RunPython(indexar_existentes, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,77 @@
+from collections import defaultdict
+
+from django.apps import apps
 from django.db import models
+from django.db.models import Count, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
 from django.urls import reverse
 from django.contrib.auth.models import User
 
 
+CONTADORES_BONOS = {
+    'activos': 'num_bonos_activos',
+    'agotados': 'num_bonos_agotados',
+    'usos': 'num_usos',
+}
+
+
+class ClienteQuerySet(models.QuerySet):
+
+    def ajustar_contadores(self, activos=0, agotados=0, usos=0):
+        """Suma los incrementos a los contadores de bonos con expresiones F"""
+        deltas = {'activos': activos, 'agotados': agotados, 'usos': usos}
+        cambios = {
+            CONTADORES_BONOS[nombre]: F(CONTADORES_BONOS[nombre]) + delta
+            for nombre, delta in deltas.items() if delta
+        }
+        if not cambios:
+            return 0
+        return self.update(**cambios)
+
+    def ajustar_contadores_en_bloque(self, deltas):
+        """
+        Aplica incrementos distintos por cliente con pocas consultas.
+
+        ``deltas`` es un diccionario ``{cliente_id: {'activos': .., 'agotados': ..,
+        'usos': ..}}``. Los clientes con los mismos incrementos se actualizan
+        juntos, así que un check-in de grupo se resuelve con uno o dos UPDATE.
+        """
+        grupos = defaultdict(list)
+        for cliente_id, delta in deltas.items():
+            clave = tuple(delta.get(nombre, 0) for nombre in CONTADORES_BONOS)
+            if any(clave):
+                grupos[clave].append(cliente_id)
+        for clave, cliente_ids in grupos.items():
+            self.filter(pk__in=cliente_ids).ajustar_contadores(*clave)
+
+    @staticmethod
+    def _estadisticas_bonos():
+        """Subconsultas que cuentan bonos y usos de cada cliente en SQL"""
+        Bono = apps.get_model('bonos', 'Bono')
+        bonos = Bono.objects.filter(cliente=OuterRef('pk')).order_by().values('cliente')
+
+        def contar(qs):
+            return Coalesce(Subquery(qs.annotate(n=Count('pk')).values('n')), Value(0))
+
+        usos = bonos.annotate(n=Sum(F('usos_totales') - F('usos_restantes'))).values('n')
+        return {
+            'num_bonos_activos': contar(bonos.filter(activo=True)),
+            'num_bonos_agotados': contar(bonos.filter(activo=False)),
+            'num_usos': Coalesce(Subquery(usos), Value(0)),
+        }
+
+    def with_bono_stats(self):
+        """Anota los contadores de bonos calculados en SQL, sin usar los desnormalizados"""
+        return self.annotate(**{
+            f'{campo}_db': expresion
+            for campo, expresion in self._estadisticas_bonos().items()
+        })
+
+    def recalcular_contadores(self):
+        """Recalcula los contadores de bonos a partir de la tabla de bonos"""
+        return self.update(**self._estadisticas_bonos())
+
+
 class Cliente(models.Model):
     """Modelo para representar un cliente del surf center"""
     
@@ -25,25 +94,86 @@ class Cliente(models.Model):
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Última actualización")
     activo = models.BooleanField(default=True, verbose_name="Activo")
     
+    # Contadores desnormalizados, mantenidos al crear, canjear o borrar bonos
+    num_bonos_activos = models.IntegerField(default=0, editable=False, verbose_name="Bonos activos")
+    num_bonos_agotados = models.IntegerField(default=0, editable=False, verbose_name="Bonos agotados")
+    num_usos = models.IntegerField(default=0, editable=False, verbose_name="Usos de bonos")
+    
+    objects = ClienteQuerySet.as_manager()
+    
     class Meta:
         verbose_name = "Cliente"
         verbose_name_plural = "Clientes"
         ordering = ['apellidos', 'nombre']
+        indexes = [
+            # Listado por nombre: se recorre el índice en orden filtrando
+            # activo, que también lo cubre para contar los clientes activos
+            models.Index(fields=['apellidos', 'nombre', 'activo'], name='clientes_nombre_activo'),
+        ]
     
     def __str__(self):
         return f"{self.nombre} {self.apellidos}"
+
+    def save(self, *args, contadores=False, **kwargs):
+        """
+        Guarda el cliente sin escribir los contadores de bonos.
+
+        Los contadores se mantienen con UPDATE y expresiones F
+        (``ajustar_contadores``); un guardado completo escribiría los valores
+        leídos al cargar la instancia y desharía los incrementos concurrentes.
+        Con ``contadores=True`` se guardan también.
+        """
+        if not contadores and not self._state.adding and kwargs.get('update_fields') is None \
+                and not kwargs.get('force_insert'):
+            excluidos = set(CONTADORES_BONOS.values()) | self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.attname for field in self._meta.concrete_fields
+                if not field.primary_key and field.attname not in excluidos
+            ]
+        super().save(*args, **kwargs)
     
     def get_absolute_url(self):
         return reverse('clientes:detail', kwargs={'pk': self.pk})
     
     def bonos_activos_count(self):
         """Cuenta los bonos activos del cliente"""
-        return self.bonos.filter(activo=True).count()
+        return getattr(self, 'num_bonos_activos_db', self.num_bonos_activos)
     
     def bonos_agotados_count(self):
         """Cuenta los bonos agotados del cliente"""
-        return self.bonos.filter(activo=False).count()
+        return getattr(self, 'num_bonos_agotados_db', self.num_bonos_agotados)
+    
+    def bonos_total_count(self):
+        """Cuenta todos los bonos del cliente"""
+        return self.bonos_activos_count() + self.bonos_agotados_count()
+    
+    def usos_count(self):
+        """Cuenta los usos consumidos en todos los bonos del cliente"""
+        return getattr(self, 'num_usos_db', self.num_usos)
     
     @property
     def nombre_completo(self):
         return f"{self.nombre} {self.apellidos}"
+
+
+class TerminoBusqueda(models.Model):
+    """Palabra normalizada de los datos de un cliente (ver ``clientes.busqueda``)"""
+    # La restricción única (cliente, termino) ya indexa el cliente
+    cliente = models.ForeignKey(
+        Cliente, on_delete=models.CASCADE, related_name='terminos_busqueda', db_index=False
+    )
+    termino = models.CharField(max_length=100)
+
+    class Meta:
+        verbose_name = 'Término de búsqueda'
+        verbose_name_plural = 'Términos de búsqueda'
+        constraints = [
+            models.UniqueConstraint(fields=['cliente', 'termino'], name='clientes_termino_unico'),
+        ]
+        indexes = [
+            # Búsqueda por prefijo: rango sobre termino, cubriendo cliente_id
+            models.Index(fields=['termino', 'cliente'], name='clientes_termino_busqueda'),
+        ]
+
+    def __str__(self):
+        return self.termino
@@ -0,0 +1,76 @@
+"""
+Modelo de lectura del panel del cliente
+
+Todo lo que muestra ``ClientePanelView`` se lee con tres consultas (usuario
+con cliente y socio, bonos, últimos usos con su bono) y se guarda en caché
+por usuario. La entrada se valida contra la versión del cliente, que se
+incrementa cuando cambian sus datos, bonos, usos o membresía.
+"""
+from django.contrib.auth.models import User
+from django.utils import timezone
+
+from arenasurf.cache import get_cache, version
+from bonos.models import Bono, UsoBono
+from .models import Cliente
+
+ULTIMOS_USOS = 10
+
+
+def construir_panel(usuario):
+    """Contexto del panel, o None si el usuario no tiene cliente asociado"""
+    try:
+        cliente = User.objects.select_related('cliente__socio').get(pk=usuario.pk).cliente
+    except Cliente.DoesNotExist:
+        return None
+
+    # El socio ya viene en la consulta del usuario: hasattr no consulta
+    socio = cliente.socio if hasattr(cliente, 'socio') else None
+
+    bonos = list(Bono.objects.filter(cliente=cliente).with_usage().order_by('-fecha_compra'))
+    bonos_activos = [bono for bono in bonos if bono.activo]
+    bonos_agotados = [bono for bono in bonos if not bono.activo]
+
+    ultimos_usos = list(
+        UsoBono.objects.filter(bono__cliente=cliente)
+        .select_related('bono')
+        .order_by('-fecha_uso', '-id')[:ULTIMOS_USOS]
+    )
+
+    return {
+        'cliente': cliente,
+        'socio': socio,
+        'es_socio': socio is not None,
+        'bonos_activos': bonos_activos,
+        'bonos_agotados': bonos_agotados,
+        'total_bonos': len(bonos),
+        'ultimos_usos': ultimos_usos,
+    }
+
+
+def panel_cliente(usuario):
+    """Contexto del panel servido desde la caché mientras siga vigente"""
+    backend = get_cache()
+    clave = f'panel:usuario:{usuario.pk}'
+    hoy = timezone.now().date()
+
+    entrada = backend.get(clave)
+    if entrada is not None:
+        cliente_id, version_guardada, fecha, contexto = entrada
+        if fecha == hoy and version(Cliente, cliente_id) == version_guardada:
+            return contexto
+
+    cliente_id = Cliente.objects.filter(usuario=usuario).values_list('pk', flat=True).first()
+    if cliente_id is None:
+        return None
+
+    # La versión se lee antes de construir el contexto: si el cliente cambia
+    # mientras tanto, la entrada se guarda con la versión anterior y la
+    # siguiente petición la descarta.
+    version_actual = version(Cliente, cliente_id)
+    contexto = construir_panel(usuario)
+    if contexto is None:
+        return None
+    # Si el usuario se ha vinculado a otro cliente, la versión leída no es la suya
+    if contexto['cliente'].pk == cliente_id:
+        backend.set(clave, (cliente_id, version_actual, hoy, contexto), timeout=None)
+    return contexto
@@ -1,3 +1,5 @@
+import hashlib
+
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
@@ -5,12 +7,17 @@ from django.contrib.auth import login
 from django.contrib import messages
 from django.views.generic import TemplateView
 from django.http import JsonResponse
+from django.db.models import Count, Max
 from django.urls import reverse_lazy
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
 from django.views.generic.edit import CreateView
 from django.contrib.auth.models import User
 from django.contrib.auth.forms import UserCreationForm
 from django import forms
+from arenasurf.cache import cache_versionada
 from .models import Cliente
+from .panel import panel_cliente
 from bonos.models import Bono, UsoBono
 from socios.models import Socio
 
@@ -111,91 +118,147 @@ class ClientePanelView(LoginRequiredMixin, TemplateView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        
-        # Debug: verificar usuario actual
-        print(f"DEBUG: Usuario actual: {self.request.user.username}")
-        print(f"DEBUG: Usuario autenticado: {self.request.user.is_authenticated}")
-        
-        # Intentar obtener el cliente asociado al usuario
-        cliente = None
-        if hasattr(self.request.user, 'cliente'):
-            cliente = self.request.user.cliente
-            print(f"DEBUG: Cliente encontrado: {cliente.nombre_completo}")
-        else:
-            print(f"DEBUG: Usuario {self.request.user.username} no tiene cliente asociado")
+        panel = panel_cliente(self.request.user)
+        if panel is None:
             messages.error(self.request, 'No tienes un perfil de cliente. Por favor, contacta con el administrador para vincular tu cuenta.')
             context['error'] = 'no_cliente'
             return context
-        
-        # Información del cliente
-        context['cliente'] = cliente
-        
-        # Información de socio si existe
-        socio = None
-        es_socio = False
-        if hasattr(cliente, 'socio'):
-            socio = cliente.socio
-            es_socio = True
-            print(f"DEBUG: Cliente es socio: {socio.numero_socio}")
-        else:
-            print(f"DEBUG: Cliente no es socio")
-            
-        context['socio'] = socio
-        context['es_socio'] = es_socio
-        
-        # Bonos del cliente
-        from bonos.models import Bono, UsoBono
-        
-        bonos_activos = Bono.objects.filter(cliente=cliente, activo=True)
-        bonos_agotados = Bono.objects.filter(cliente=cliente, activo=False)
-        
-        print(f"DEBUG: Bonos activos: {bonos_activos.count()}")
-        print(f"DEBUG: Bonos agotados: {bonos_agotados.count()}")
-        
-        context['bonos_activos'] = bonos_activos
-        context['bonos_agotados'] = bonos_agotados
-        context['total_bonos'] = bonos_activos.count() + bonos_agotados.count()
-        
-        # Últimos usos de bonos
-        ultimos_usos = UsoBono.objects.filter(
-            bono__cliente=cliente
-        ).order_by('-fecha_uso')[:10]
-        context['ultimos_usos'] = ultimos_usos
-        
-        print(f"DEBUG: Últimos usos: {ultimos_usos.count()}")
-        
+        context.update(panel)
         return context
 
 
+def _perfil_payload(cliente):
+    data = {
+        'nombre_completo': cliente.nombre_completo,
+        'email': cliente.email,
+        'telefono': cliente.telefono,
+        'fecha_registro': cliente.created_at.strftime('%d/%m/%Y'),
+        'bonos_activos': cliente.bonos_activos_count(),
+        'bonos_agotados': cliente.bonos_agotados_count(),
+    }
+    
+    # Información de socio si existe
+    try:
+        socio = cliente.socio
+        data['socio'] = {
+            'numero': socio.numero_socio,
+            'nivel': socio.get_nivel_display(),
+            'vigente': socio.esta_vigente,
+            'vencimiento': socio.fecha_vencimiento.strftime('%d/%m/%Y'),
+            'dias_restantes': socio.dias_hasta_vencimiento,
+            'taquilla': socio.numero_taquilla,
+            'guardatablas': socio.numero_guardatablas,
+        }
+    except Socio.DoesNotExist:
+        data['socio'] = None
+    return data
+
+
+def _bonos_payload(cliente):
+    bonos = list(
+        Bono.objects.filter(cliente=cliente).with_usage().order_by('-fecha_compra').values(
+            'id', 'tipo_bono', 'usos_totales', 'usos_utilizados_db', 'usos_restantes',
+            'activo', 'fecha_compra', 'precio',
+        )
+    )
+    # Últimos 5 usos de cada bono en una sola consulta
+    usos = UsoBono.objects.filter(bono__cliente=cliente).ultimos_por_bono(5, 'fecha_uso', 'descripcion')
+
+    bonos_data = []
+    for bono in bonos:
+        bonos_data.append({
+            'id': bono['id'],
+            'tipo': f"{bono['tipo_bono']} usos",
+            'usos_totales': bono['usos_totales'],
+            'usos_utilizados': bono['usos_utilizados_db'],
+            'usos_restantes': bono['usos_restantes'],
+            'activo': bono['activo'],
+            'fecha_compra': bono['fecha_compra'].strftime('%d/%m/%Y'),
+            'precio': str(bono['precio']) if bono['precio'] else '-',
+            'usos': [
+                {
+                    'fecha': uso['fecha_uso'].strftime('%d/%m/%Y'),
+                    'descripcion': uso['descripcion'] or ''
+                } for uso in usos.get(bono['id'], [])
+            ]
+        })
+    return {'bonos': bonos_data}
+
+
+def _huella_cliente(usuario):
+    """
+    Cliente del usuario (con su socio) y huella de sus datos en una consulta.
+
+    La huella cambia con cualquier modificación del cliente, de su membresía
+    o de sus bonos (``updated_at``; editar un uso lo marca en su bono), con
+    cada uso registrado o borrado (número de usos y último id) y con el día,
+    del que dependen la vigencia y los días hasta el vencimiento.
+    """
+    cliente = Cliente.objects.select_related('socio').annotate(
+        bonos_n=Count('bonos', distinct=True),
+        bonos_actualizados=Max('bonos__updated_at'),
+        usos_n=Count('bonos__usos'),
+        ultimo_uso=Max('bonos__usos__id'),
+    ).get(usuario=usuario)
+    socio = cliente.socio if hasattr(cliente, 'socio') else None
+    partes = [
+        cliente.pk, cliente.updated_at.isoformat(),
+        socio.updated_at.isoformat() if socio else '-',
+        cliente.bonos_n, cliente.bonos_actualizados.isoformat() if cliente.bonos_actualizados else '-',
+        cliente.usos_n, cliente.ultimo_uso, timezone.localdate(),
+    ]
+    return cliente, hashlib.md5('|'.join(map(str, partes)).encode()).hexdigest()
+
+
+def _resumen_payload(cliente):
+    ultimos_usos = UsoBono.objects.filter(bono__cliente=cliente).order_by('-fecha_uso', '-id').values(
+        'bono_id', 'bono__tipo_bono', 'fecha_uso', 'descripcion',
+    )[:10]
+    data = _perfil_payload(cliente)
+    data.update(_bonos_payload(cliente))
+    data['ultimos_usos'] = [
+        {
+            'bono_id': uso['bono_id'],
+            'tipo': f"{uso['bono__tipo_bono']} usos",
+            'fecha': uso['fecha_uso'].strftime('%d/%m/%Y'),
+            'descripcion': uso['descripcion'] or '',
+        } for uso in ultimos_usos
+    ]
+    return data
+
+
+@login_required
+def cliente_resumen_ajax(request):
+    """
+    Vista AJAX con perfil, membresía, bonos y últimos usos del cliente.
+
+    Responde con un ETag calculado a partir de la huella de los datos y
+    contesta 304 a ``If-None-Match`` sin construir el contenido.
+    """
+    try:
+        cliente, huella = _huella_cliente(request.user)
+    except Cliente.DoesNotExist:
+        return JsonResponse({'error': 'Cliente no encontrado'}, status=404)
+
+    etag = f'"{huella}"'
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = JsonResponse(_resumen_payload(cliente))
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
 @login_required
 def cliente_perfil_ajax(request):
     """Vista AJAX para obtener datos del perfil del cliente"""
     try:
         cliente = request.user.cliente
-        data = {
-            'nombre_completo': cliente.nombre_completo,
-            'email': cliente.email,
-            'telefono': cliente.telefono,
-            'fecha_registro': cliente.created_at.strftime('%d/%m/%Y'),
-            'bonos_activos': Bono.objects.filter(cliente=cliente, activo=True).count(),
-            'bonos_agotados': Bono.objects.filter(cliente=cliente, activo=False).count(),
-        }
-        
-        # Información de socio si existe
-        try:
-            socio = cliente.socio
-            data['socio'] = {
-                'numero': socio.numero_socio,
-                'nivel': socio.get_nivel_display(),
-                'vigente': socio.esta_vigente,
-                'vencimiento': socio.fecha_vencimiento.strftime('%d/%m/%Y'),
-                'dias_restantes': socio.dias_hasta_vencimiento,
-                'taquilla': socio.numero_taquilla,
-                'guardatablas': socio.numero_guardatablas,
-            }
-        except Socio.DoesNotExist:
-            data['socio'] = None
-            
+        # Los días hasta el vencimiento dependen de la fecha: forman parte de la clave
+        data = cache_versionada(
+            'api:perfil', [(Cliente, cliente.pk)], lambda: _perfil_payload(cliente),
+            extra=[timezone.now().date()],
+        )
         return JsonResponse(data)
         
     except Cliente.DoesNotExist:
@@ -207,29 +270,8 @@ def cliente_bonos_ajax(request):
     """Vista AJAX para obtener bonos del cliente"""
     try:
         cliente = request.user.cliente
-        bonos = Bono.objects.filter(cliente=cliente).order_by('-fecha_compra')
-        
-        bonos_data = []
-        for bono in bonos:
-            usos = UsoBono.objects.filter(bono=bono).order_by('-fecha_uso')
-            bonos_data.append({
-                'id': bono.id,
-                'tipo': f'{bono.tipo_bono} usos',
-                'usos_totales': bono.usos_totales,
-                'usos_utilizados': bono.usos_utilizados(),
-                'usos_restantes': bono.usos_restantes,
-                'activo': bono.activo,
-                'fecha_compra': bono.fecha_compra.strftime('%d/%m/%Y'),
-                'precio': str(bono.precio) if bono.precio else '-',
-                'usos': [
-                    {
-                        'fecha': uso.fecha_uso.strftime('%d/%m/%Y'),
-                        'descripcion': uso.descripcion or ''
-                    } for uso in usos[:5]  # Últimos 5 usos
-                ]
-            })
-            
-        return JsonResponse({'bonos': bonos_data})
+        data = cache_versionada('api:bonos', [(Cliente, cliente.pk)], lambda: _bonos_payload(cliente))
+        return JsonResponse(data)
         
     except Cliente.DoesNotExist:
         return JsonResponse({'error': 'Cliente no encontrado'}, status=404)
@@ -0,0 +1,15 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .busqueda import CAMPOS_INDEXADOS, indexar_clientes
+from .models import Cliente
+
+
+@receiver(post_save, sender=Cliente)
+def indexar_al_guardar(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    # Los guardados parciales que no tocan campos buscables no reindexan
+    if update_fields is not None and not set(update_fields) & set(CAMPOS_INDEXADOS):
+        return
+    indexar_clientes([instance.pk])
@@ -0,0 +1,115 @@
+/*
+ * Autocompletado de los <select data-autocompletar> de clientes.
+ *
+ * El select solo trae la opción elegida; al escribir se piden páginas al
+ * endpoint de autocompletado y al elegir un resultado se sustituye la
+ * opción del select, que es lo que se envía con el formulario.
+ */
+(function () {
+    'use strict';
+
+    var ESPERA = 250;
+
+    function urlBusqueda(base, parametros) {
+        var url = new URL(base, window.location.origin);
+        Object.keys(parametros).forEach(function (clave) {
+            if (parametros[clave]) {
+                url.searchParams.set(clave, parametros[clave]);
+            }
+        });
+        return url;
+    }
+
+    function elegir(select, resultado) {
+        Array.prototype.slice.call(select.options).forEach(function (opcion) {
+            if (opcion.value) {
+                select.removeChild(opcion);
+            }
+        });
+        var opcion = new Option(resultado.texto, resultado.id, true, true);
+        select.appendChild(opcion);
+        select.dispatchEvent(new Event('change', {bubbles: true}));
+    }
+
+    function iniciar(select) {
+        var buscador = document.createElement('input');
+        buscador.type = 'search';
+        buscador.className = 'form-control mb-1';
+        buscador.placeholder = 'Buscar por nombre, apellidos, email o teléfono';
+        buscador.autocomplete = 'off';
+
+        var lista = document.createElement('div');
+        lista.className = 'list-group mb-2';
+
+        select.parentNode.insertBefore(buscador, select);
+        select.parentNode.insertBefore(lista, select.nextSibling);
+
+        var temporizador = null;
+        var peticion = 0;
+
+        function pintar(datos, anadir) {
+            if (!anadir) {
+                lista.innerHTML = '';
+            }
+            var masAnterior = lista.querySelector('[data-mas]');
+            if (masAnterior) {
+                lista.removeChild(masAnterior);
+            }
+            datos.resultados.forEach(function (resultado) {
+                var item = document.createElement('button');
+                item.type = 'button';
+                item.className = 'list-group-item list-group-item-action';
+                item.textContent = resultado.texto + ' · ' + resultado.email;
+                item.addEventListener('click', function () {
+                    elegir(select, resultado);
+                    lista.innerHTML = '';
+                    buscador.value = '';
+                });
+                lista.appendChild(item);
+            });
+            if (!anadir && !datos.resultados.length) {
+                var vacio = document.createElement('div');
+                vacio.className = 'list-group-item text-muted';
+                vacio.textContent = 'Sin resultados';
+                lista.appendChild(vacio);
+            }
+            if (datos.siguiente) {
+                var mas = document.createElement('button');
+                mas.type = 'button';
+                mas.className = 'list-group-item list-group-item-action text-center text-primary';
+                mas.textContent = 'Cargar más';
+                mas.setAttribute('data-mas', '1');
+                mas.addEventListener('click', function () {
+                    buscar(datos.siguiente);
+                });
+                lista.appendChild(mas);
+            }
+        }
+
+        function buscar(cursor) {
+            var actual = ++peticion;
+            var url = urlBusqueda(select.dataset.autocompletar, {q: buscador.value.trim(), cursor: cursor});
+            fetch(url, {credentials: 'same-origin', headers: {'Accept': 'application/json'}})
+                .then(function (respuesta) { return respuesta.json(); })
+                .then(function (datos) {
+                    // Se descartan las respuestas de búsquedas ya superadas
+                    if (actual === peticion) {
+                        pintar(datos, Boolean(cursor));
+                    }
+                });
+        }
+
+        buscador.addEventListener('input', function () {
+            clearTimeout(temporizador);
+            if (!buscador.value.trim()) {
+                lista.innerHTML = '';
+                return;
+            }
+            temporizador = setTimeout(function () { buscar(null); }, ESPERA);
+        });
+    }
+
+    document.addEventListener('DOMContentLoaded', function () {
+        document.querySelectorAll('select[data-autocompletar]').forEach(iniciar);
+    });
+})();
@@ -0,0 +1,553 @@
+import csv
+import json
+import os
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.contrib.sites.models import Site
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from arenasurf.cache import invalidar
+from arenasurf.importacion import escribir_rechazos, importar_csv
+from bonos.models import Bono
+from bonos.services import redimir_bono
+from socios.espacios import asignar, crear_plazas
+from socios.membresias import caducar, renovar
+from socios.models import Guardatablas, Socio, Taquilla
+from .busqueda import buscar
+from .models import Cliente, TerminoBusqueda
+from .panel import construir_panel, panel_cliente
+from .vinculacion import vincular
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class PanelClienteTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        Site.objects.clear_cache()
+        self.usuario = User.objects.create_user('cliente', password='x')
+        self.cliente = Cliente.objects.create(
+            usuario=self.usuario, nombre='Ane', apellidos='Etxeberria', email='ane@example.com'
+        )
+        self.bono = Bono.objects.create(cliente=self.cliente, tipo_bono=10)
+        Bono.objects.create(cliente=self.cliente, tipo_bono=5, activo=False)
+        redimir_bono(self.bono)
+        self.client.force_login(self.usuario)
+
+    def test_modelo_de_lectura_con_tres_consultas(self):
+        with self.assertNumQueries(3):
+            panel = construir_panel(self.usuario)
+            # Nada de lo que usa la plantilla dispara consultas adicionales
+            self.assertIsNone(panel['socio'])
+            [uso.bono.tipo_bono for uso in panel['ultimos_usos']]
+            [bono.usos_utilizados() for bono in panel['bonos_activos']]
+        self.assertEqual((len(panel['bonos_activos']), len(panel['bonos_agotados'])), (1, 1))
+        self.assertEqual(panel['total_bonos'], 2)
+
+    def test_usuario_sin_cliente(self):
+        self.assertIsNone(construir_panel(User.objects.create_user('otro', password='x')))
+
+    def test_escritura_durante_la_construccion(self):
+        construidos = []
+
+        def construir_con_escritura(usuario):
+            # Otra petición modifica el cliente mientras se construye el panel
+            contexto = construir_panel(usuario)
+            invalidar(Cliente, [self.cliente.pk])
+            construidos.append(contexto)
+            return contexto
+
+        with mock.patch('clientes.panel.construir_panel', construir_con_escritura):
+            panel_cliente(self.usuario)
+            panel_cliente(self.usuario)
+            panel_cliente(self.usuario)
+        # El contexto construido durante la escritura no se sirve desde la caché
+        self.assertEqual(len(construidos), 3)
+
+    def test_panel_cacheado_e_invalidado(self):
+        url = reverse('clientes:panel')
+        self.client.get(url)
+        # sesión + usuario; el panel sale de la caché
+        with self.assertNumQueries(2):
+            self.client.get(url)
+
+        redimir_bono(self.bono)
+        self.assertEqual(len(self.client.get(url).context['ultimos_usos']), 2)
+
+        Socio.objects.create(cliente=self.cliente, fecha_vencimiento='2099-01-01')
+        self.assertTrue(self.client.get(url).context['es_socio'])
+
+
+class ResumenClienteTests(TestCase):
+
+    def setUp(self):
+        self.usuario = User.objects.create_user('cliente', password='x')
+        self.cliente = Cliente.objects.create(
+            usuario=self.usuario, nombre='Ane', apellidos='Etxeberria', email='ane@example.com'
+        )
+        self.bono = Bono.objects.create(cliente=self.cliente, tipo_bono=10)
+        self.client.force_login(self.usuario)
+        self.url = reverse('clientes:resumen_ajax')
+
+    def test_resumen_completo(self):
+        redimir_bono(self.bono, descripcion='Clase')
+        datos = self.client.get(self.url).json()
+        self.assertEqual(datos['nombre_completo'], self.cliente.nombre_completo)
+        self.assertEqual(datos['bonos'][0]['usos_restantes'], 9)
+        self.assertEqual(datos['ultimos_usos'][0]['descripcion'], 'Clase')
+
+    def test_304_sin_construir_el_contenido(self):
+        etag = self.client.get(self.url)['ETag']
+        # sesión + usuario + huella del cliente
+        with self.assertNumQueries(3):
+            respuesta = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 304)
+
+    def test_etag_cambia_con_los_datos(self):
+        etags = {self.client.get(self.url)['ETag']}
+        redimir_bono(self.bono)
+        etags.add(self.client.get(self.url)['ETag'])
+        Bono.objects.filter(pk=self.bono.pk).update(precio=50)
+        etags.add(self.client.get(self.url)['ETag'])
+        Socio.objects.create(cliente=self.cliente, fecha_vencimiento='2099-01-01')
+        respuesta = self.client.get(self.url, HTTP_IF_NONE_MATCH=etags.copy().pop())
+        self.assertEqual(respuesta.status_code, 200)
+        etags.add(respuesta['ETag'])
+        self.assertEqual(len(etags), 4)
+
+    def test_etag_cambia_con_las_operaciones_en_bloque_del_socio(self):
+        socio = Socio.objects.create(cliente=self.cliente, fecha_vencimiento='2099-01-01')
+        crear_plazas(Taquilla, 2)
+        operaciones = [
+            lambda: renovar([socio.pk]),
+            lambda: asignar(Taquilla, socio),
+            lambda: caducar([socio.pk]),
+        ]
+        for operacion in operaciones:
+            etag = self.client.get(self.url)['ETag']
+            operacion()
+            with self.subTest(operacion=operacion):
+                self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_etag_cambia_al_editar_un_uso(self):
+        uso = redimir_bono(self.bono)
+        etag = self.client.get(self.url)['ETag']
+        uso.descripcion = 'Corregido'
+        uso.save()
+        respuesta = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.json()['ultimos_usos'][0]['descripcion'], 'Corregido')
+
+    def test_etag_cambia_con_el_dia(self):
+        Socio.objects.create(cliente=self.cliente, fecha_vencimiento=timezone.localdate())
+        etag = self.client.get(self.url)['ETag']
+        manana = timezone.localdate() + timedelta(days=1)
+        with mock.patch('django.utils.timezone.localdate', return_value=manana):
+            respuesta = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 200)
+
+
+class AutocompletarClientesTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('staff', password='x', is_staff=True)
+        cls.ana = Cliente.objects.create(nombre='Ana', apellidos='García López', email='ana@example.com', telefono='600111222')
+        cls.andres = Cliente.objects.create(nombre='Andrés', apellidos='Martín', email='andres@example.com')
+        cls.mikel = Cliente.objects.create(nombre='Mikel', apellidos='Anabitarte', email='mikel@example.com')
+        Cliente.objects.create(nombre='Ana', apellidos='Baja', email='baja@example.com', activo=False)
+        Socio.objects.create(cliente=cls.andres, fecha_vencimiento='2099-01-01')
+        for n in range(25):
+            Cliente.objects.create(nombre=f'Zoe{n:02d}', apellidos='Pérez', email=f'zoe{n}@example.com')
+
+    def setUp(self):
+        self.client.force_login(self.staff)
+        self.url = reverse('clientes:autocompletar')
+
+    def buscar(self, **params):
+        return self.client.get(self.url, params).json()
+
+    def ids(self, **params):
+        return [r['id'] for r in self.buscar(**params)['resultados']]
+
+    def test_prefijo_en_cada_campo(self):
+        self.assertEqual(self.ids(q='an'), [self.mikel.pk, self.ana.pk, self.andres.pk])
+        self.assertEqual(self.ids(q='GARC'), [self.ana.pk])
+        self.assertEqual(self.ids(q='mikel@'), [self.mikel.pk])
+        self.assertEqual(self.ids(q='600'), [self.ana.pk])
+        # Cada palabra debe coincidir con algún campo
+        self.assertEqual(self.ids(q='an gar'), [self.ana.pk])
+        # No es una búsqueda por subcadena
+        self.assertEqual(self.ids(q='arcía'), [])
+
+    def test_sin_socio(self):
+        self.assertEqual(self.ids(q='an', sin_socio=1), [self.mikel.pk, self.ana.pk])
+
+    def test_paginas_limitadas(self):
+        primera = self.buscar(q='zoe', limite=10)
+        self.assertEqual(len(primera['resultados']), 10)
+        vistos = [r['texto'] for r in primera['resultados']]
+        cursor = primera['siguiente']
+        while cursor:
+            pagina = self.buscar(q='zoe', limite=10, cursor=cursor)
+            vistos += [r['texto'] for r in pagina['resultados']]
+            cursor = pagina['siguiente']
+        self.assertEqual(vistos, [f'Zoe{n:02d} Pérez' for n in range(25)])
+        self.assertEqual(len(self.ids(limite=500)), 28)
+
+    def test_solo_staff(self):
+        self.client.force_login(User.objects.create_user('cliente', password='x'))
+        self.assertEqual(self.client.get(self.url).status_code, 302)
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class BusquedaClientesTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('staff', password='x', is_staff=True)
+        cls.munoz = Cliente.objects.create(nombre='Íñigo', apellidos='Muñoz', email='inigo@example.com', telefono='600 11 22 33')
+        cls.otro = Cliente.objects.create(nombre='Nerea', apellidos='Etxeberria', email='nerea@example.com')
+        cls.socio = Socio.objects.create(cliente=cls.otro, numero_socio='0042', fecha_vencimiento='2099-01-01')
+
+    def setUp(self):
+        self.client.force_login(self.staff)
+
+    def encontrados(self, texto):
+        return list(buscar(Cliente.objects.order_by('pk'), texto))
+
+    def test_sin_acentos_ni_mayusculas(self):
+        for texto in ('munoz', 'MUÑOZ', 'inigo mu', 'Íñigo'):
+            with self.subTest(texto=texto):
+                self.assertEqual(self.encontrados(texto), [self.munoz])
+        self.assertEqual(self.encontrados('600112233'), [self.munoz])
+        self.assertEqual(self.encontrados('munoz nerea'), [])
+
+    def test_numero_de_socio_sin_ceros(self):
+        self.assertEqual(self.encontrados('42'), [self.otro])
+        self.assertEqual(self.encontrados('0042'), [self.otro])
+
+    def test_el_indice_sigue_a_los_cambios(self):
+        self.munoz.apellidos = 'Ibáñez'
+        self.munoz.save()
+        self.assertEqual(self.encontrados('munoz'), [])
+        self.assertEqual(self.encontrados('ibanez'), [self.munoz])
+
+        self.socio.numero_socio = '0777'
+        self.socio.save()
+        self.assertEqual(self.encontrados('42'), [])
+        self.assertEqual(self.encontrados('777'), [self.otro])
+
+        self.socio.delete()
+        self.assertEqual(self.encontrados('777'), [])
+        self.assertEqual(self.encontrados('nerea'), [self.otro])
+
+    def test_borrado_en_cascada(self):
+        self.otro.delete()
+        self.assertFalse(TerminoBusqueda.objects.filter(cliente_id=self.otro.pk).exists())
+
+    def test_reconstruir_indice(self):
+        TerminoBusqueda.objects.all().delete()
+        salida = StringIO()
+        call_command('indexar_busqueda', '--chunk-size', '1', stdout=salida)
+        self.assertIn('2 clientes indexados', salida.getvalue())
+        self.assertEqual(self.encontrados('42'), [self.otro])
+        self.assertEqual(self.encontrados('munoz'), [self.munoz])
+
+    def test_listados(self):
+        respuesta = self.client.get(reverse('clientes:lista'), {'search': 'munoz'})
+        self.assertEqual(list(respuesta.context['clientes']), [self.munoz])
+        self.assertContains(respuesta, 'value="munoz"')
+        respuesta = self.client.get(reverse('socios:lista'), {'search': '42'})
+        self.assertEqual(list(respuesta.context['socios']), [self.socio])
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class ImportacionCSVTests(TestCase):
+
+    cabecera = 'nombre,apellidos,email,telefono,tipo_bono,nivel,numero_socio,fecha_vencimiento,numero_taquilla,numero_guardatablas\n'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('staff', password='x', is_staff=True)
+        cls.existente = Cliente.objects.create(nombre='Ya', apellidos='Existe', email='existe@example.com')
+        Socio.objects.create(cliente=cls.existente, numero_socio='0007', fecha_vencimiento='2099-01-01')
+        crear_plazas(Taquilla, 5)
+        crear_plazas(Guardatablas, 5)
+        Taquilla.objects.filter(numero=1).update(socio=cls.existente.socio)
+
+    def importar(self, filas, **kwargs):
+        return importar_csv(StringIO(self.cabecera + filas), **kwargs)
+
+    def test_reproduce_la_creacion(self):
+        resultado = self.importar(
+            'Íñigo,Muñoz,inigo@example.com,600,20,PREMIUM,,2099-06-30,2,3\n'
+            'Ana,García,ana@example.com,,,,,,,\n'
+            'Leire,Ibáñez,leire@example.com,,10,,42,2099-06-30,,\n'
+        )
+        self.assertEqual(resultado.as_dict(), {'clientes': 3, 'bonos': 2, 'socios': 2, 'rechazados': 0})
+        inigo = Cliente.objects.get(email='inigo@example.com')
+        bono = inigo.bonos.get()
+        self.assertEqual((bono.usos_totales, bono.usos_restantes, bono.activo), (20, 20, True))
+        self.assertEqual(inigo.num_bonos_activos, 1)
+        # Los automáticos se reservan después de saltar el número manual
+        self.assertEqual(inigo.socio.numero_socio, '0043')
+        self.assertEqual(inigo.socio.precio_anual, 500)
+        self.assertEqual(Taquilla.objects.get(numero=2).socio, inigo.socio)
+        self.assertEqual(Guardatablas.objects.get(numero=3).socio, inigo.socio)
+        leire = Socio.objects.get(numero_socio='0042')
+        self.assertEqual((leire.nivel, leire.precio_anual), ('BASICO', 300))
+        # La secuencia ha saltado por encima del número manual
+        self.assertEqual(Socio.objects.create(cliente=Cliente.objects.get(email='ana@example.com'),
+                                              fecha_vencimiento='2099-01-01').numero_socio, '0044')
+        self.assertEqual(list(buscar(Cliente.objects.all(), 'munoz')), [inigo])
+        self.assertEqual(list(buscar(Cliente.objects.all(), '42')), [leire.cliente])
+
+    def test_numero_manual_siguiente_de_la_secuencia(self):
+        resultado = self.importar(
+            'Auto,Matico,auto@example.com,,,,,2099-01-01,,\n'
+            'Ma,Nual,manual@example.com,,,,8,2099-01-01,,\n'
+        )
+        self.assertEqual(resultado.as_dict(), {'clientes': 2, 'bonos': 0, 'socios': 2, 'rechazados': 0})
+        self.assertEqual(Socio.objects.get(cliente__email='manual@example.com').numero_socio, '0008')
+        self.assertEqual(Socio.objects.get(cliente__email='auto@example.com').numero_socio, '0009')
+
+    def test_email_existente_sin_distinguir_mayusculas(self):
+        resultado = self.importar(
+            'Ya,Existe,EXISTE@example.com,,,,,,,\n'
+            'Nueva,Clienta,Nueva@Example.com,,10,,,2099-01-01,,\n'
+        )
+        self.assertEqual(resultado.as_dict(), {'clientes': 1, 'bonos': 1, 'socios': 1, 'rechazados': 1})
+        self.assertIn('email: Ya existe un cliente con este email.', resultado.rechazos[0].errores)
+        nueva = Cliente.objects.get(email='Nueva@Example.com')
+        self.assertEqual((nueva.bonos.count(), nueva.socio.nivel), (1, 'BASICO'))
+
+    def test_rechazos(self):
+        resultado = self.importar(
+            'Sin,Email,,,,,,,,\n'
+            'Ya,Existe,existe@example.com,,,,,,,\n'
+            'Uno,Bien,uno@example.com,,,,,,,\n'
+            'Uno,Repetido,UNO@example.com,,,,,,,\n'
+            'Dos,Socio,dos@example.com,,,,7,2099-01-01,,\n'
+            'Tres,Taquilla,tres@example.com,,,,,2099-01-01,1,\n'
+            'Cuatro,Taquilla,cuatro@example.com,,,,,2099-01-01,9,\n'
+            'Cinco,Basico,cinco@example.com,,,BASICO,,2099-01-01,,2\n'
+            'Seis,Bono,seis@example.com,,15,,,,,\n'
+            'Siete,Plaza,siete@example.com,,,,,,3,\n',
+            chunk_size=3,
+        )
+        self.assertEqual(resultado.clientes, 1)
+        errores = {r.linea: r.errores for r in resultado.rechazos}
+        self.assertEqual(sorted(errores), [2, 3, 5, 6, 7, 8, 9, 10, 11])
+        self.assertIn('email: Ya existe un cliente con este email.', errores[3])
+        self.assertIn('email: Repetido en el fichero.', errores[5])
+        self.assertIn('numero_socio: Ya existe un socio con este número.', errores[6])
+        self.assertIn('numero_taquilla: Taquilla 1 ocupada.', errores[7])
+        self.assertIn('numero_taquilla: No existe la plaza de taquilla 9.', errores[8])
+        self.assertIn('numero_guardatablas', errores[9][0])
+        self.assertIn('tipo_bono', errores[10][0])
+        self.assertIn('fecha_vencimiento', errores[11][0])
+
+        informe = StringIO()
+        escribir_rechazos(resultado.rechazos[:1], informe)
+        self.assertEqual(informe.getvalue().splitlines()[1].split(',')[:4], ['2', 'email: This field is required.', 'Sin', 'Email'])
+
+    def test_consultas_por_lote(self):
+        def filas(desde, n):
+            return ''.join(
+                f'C{i},Apellido,c{i}@example.com,,10,,,2099-01-01,,\n' for i in range(desde, desde + n)
+            )
+        with CaptureQueriesContext(connection) as pocas:
+            self.importar(filas(0, 5), chunk_size=100)
+        with CaptureQueriesContext(connection) as muchas:
+            self.importar(filas(100, 60), chunk_size=100)
+        self.assertEqual(len(muchas), len(pocas))
+        self.assertEqual(Socio.objects.count(), 66)
+
+    def test_vista(self):
+        self.client.force_login(self.staff)
+        fichero = SimpleUploadedFile('clientes.csv', (self.cabecera + 'Ana,García,ana@example.com,,,,,,,\nYa,Existe,existe@example.com,,,,,,,\n').encode())
+        respuesta = self.client.post(reverse('clientes:importar'), {'fichero': fichero})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertTrue(Cliente.objects.filter(email='ana@example.com').exists())
+        self.assertContains(respuesta, 'Filas rechazadas (1)')
+
+        fichero = SimpleUploadedFile('clientes.csv', b'nombre,telefono\nAna,600\n')
+        respuesta = self.client.post(reverse('clientes:importar'), {'fichero': fichero})
+        self.assertContains(respuesta, 'Faltan columnas obligatorias: apellidos, email')
+
+    def test_comando(self):
+        with tempfile.TemporaryDirectory() as directorio:
+            ruta = os.path.join(directorio, 'clientes.csv')
+            with open(ruta, 'w', encoding='utf-8') as fichero:
+                fichero.write(self.cabecera + 'Ana,García,ana@example.com,,10,,,,,\nYa,Existe,existe@example.com,,,,,,,\n')
+            salida = StringIO()
+            call_command('importar_csv', ruta, stdout=salida)
+            self.assertIn('1 clientes, 1 bonos y 0 socios', salida.getvalue())
+            with open(ruta + '.rechazos.csv', encoding='utf-8') as informe:
+                self.assertEqual(len(list(csv.reader(informe))), 2)
+
+
+class LimpiarUsuariosTests(TestCase):
+
+    def crear(self, n, inicio=0):
+        """Por cada n: un usuario sin cliente, un cliente libre con su email y un cliente sin usuario"""
+        for i in range(inicio, inicio + n):
+            User.objects.create(username=f'u{i}', email=f'u{i}@example.com')
+            Cliente.objects.create(nombre='Libre', apellidos=str(i), email=f'u{i}@example.com')
+            Cliente.objects.create(nombre='Suelto', apellidos=str(i), email=f's{i}@example.com')
+
+    def ejecutar(self, *args):
+        salida = StringIO()
+        call_command('limpiar_usuarios', *args, stdout=salida)
+        return salida.getvalue()
+
+    def test_diagnostico_en_json(self):
+        self.crear(2)
+        vinculado = User.objects.create(username='bien', email='bien@example.com')
+        Cliente.objects.create(nombre='Bien', apellidos='Vinculado', email='bien@example.com', usuario=vinculado)
+        User.objects.create(username='staff', email='staff@example.com', is_staff=True)
+
+        lineas = [json.loads(linea) for linea in self.ejecutar('--json').splitlines()]
+
+        resumen = lineas[-1]
+        self.assertEqual(resumen, {
+            'tipo': 'resumen', 'usuarios_sin_cliente': 2, 'clientes_sin_usuario': 4,
+            'emails_duplicados': 0, 'conflictos_email': 2,
+        })
+        conflictos = [l for l in lineas if l['tipo'] == 'conflicto_email']
+        self.assertEqual(conflictos[0]['usuario'], 'u0')
+        self.assertEqual(conflictos[0]['clientes'][0]['cliente'], 'Libre 0')
+        self.assertIsNone(conflictos[0]['clientes'][0]['usuario'])
+
+    def test_consultas_constantes(self):
+        self.crear(3)
+        with CaptureQueriesContext(connection) as pocos:
+            self.ejecutar()
+        self.crear(40, inicio=100)
+        with CaptureQueriesContext(connection) as muchos:
+            salida = self.ejecutar()
+        self.assertEqual(len(muchos), len(pocos))
+        self.assertIn('👤 Usuarios sin cliente (no staff): 43', salida)
+        self.assertIn('  - Usuario u100 (u100@example.com):', salida)
+
+    def test_reparacion_en_bloque(self):
+        self.crear(30)
+        # Las cuentas exigen emails únicos al crearse; el duplicado se fuerza después
+        User.objects.filter(pk=User.objects.create(username='otro').pk).update(email='u0@example.com')
+        with CaptureQueriesContext(connection) as ctx:
+            salida = self.ejecutar('--fix-duplicates')
+        actualizaciones = [q for q in ctx.captured_queries if q['sql'].startswith('UPDATE "clientes_cliente"')]
+        self.assertEqual(len(actualizaciones), 1)
+        # u0 comparte email con otro usuario libre: no se sabe a quién vincular
+        self.assertIn('🎉 Reparaciones completadas: 29', salida)
+        self.assertEqual(Cliente.objects.get(email='u5@example.com').usuario.username, 'u5')
+        self.assertIsNone(Cliente.objects.get(email='u0@example.com').usuario)
+
+    def test_dry_run_no_repara(self):
+        self.crear(2)
+        self.ejecutar('--fix-duplicates', '--dry-run')
+        self.assertFalse(Cliente.objects.filter(usuario__isnull=False).exists())
+
+    def test_emails_sin_distinguir_mayusculas(self):
+        User.objects.create(username='mixta', email='Mixta@Example.com')
+        cliente = Cliente.objects.create(nombre='Mi', apellidos='Xta', email='mixta@example.com')
+        lineas = [json.loads(linea) for linea in self.ejecutar('--json', '--fix-duplicates').splitlines()]
+        self.assertEqual(lineas[-1]['conflictos_email'], 1)
+        self.assertEqual(lineas[-1]['reparaciones'], 1)
+        cliente.refresh_from_db()
+        self.assertEqual(cliente.usuario.username, 'mixta')
+
+    def test_no_repara_clientes_duplicados_por_mayusculas(self):
+        usuario = User.objects.create(username='ana', email='ana@x.com')
+        Cliente.objects.create(nombre='Ana', apellidos='Uno', email='Ana@x.com')
+        Cliente.objects.create(nombre='Ana', apellidos='Dos', email='ana@x.com')
+        self.crear(2)
+        salida = self.ejecutar('--fix-duplicates')
+        self.assertIn('🎉 Reparaciones completadas: 2', salida)
+        self.assertFalse(Cliente.objects.filter(usuario=usuario).exists())
+
+    def test_vincular_solo_informa_de_los_libres(self):
+        usuario = User.objects.create(username='libre', email='libre@example.com')
+        ocupado = User.objects.create(username='ocupado', email='ocupado@example.com')
+        libre = Cliente.objects.create(nombre='Libre', apellidos='Uno', email='libre@example.com')
+        vinculado = Cliente.objects.create(nombre='Ya', apellidos='Dos', email='x@example.com', usuario=ocupado)
+        self.assertEqual(vincular([(libre.pk, usuario.pk), (vinculado.pk, usuario.pk)]), [libre.pk])
+        self.assertEqual(Cliente.objects.get(pk=vinculado.pk).usuario, ocupado)
+
+
+class VincularUsuariosTests(TestCase):
+
+    def ejecutar(self, *args):
+        salida = StringIO()
+        call_command('vincular_usuarios', *args, stdout=salida)
+        return salida.getvalue()
+
+    def crear(self, n, inicio=0):
+        for i in range(inicio, inicio + n):
+            User.objects.create(username=f'u{i}', email=f'U{i}@Example.com')
+            Cliente.objects.create(nombre='Cliente', apellidos=str(i), email=f'u{i}@example.com')
+
+    def test_vincula_sin_distinguir_mayusculas(self):
+        self.crear(3)
+        salida = self.ejecutar()
+        self.assertIn('🎉 Proceso completado: 3 clientes vinculados', salida)
+        self.assertIn('⏱️', salida)
+        self.assertEqual(Cliente.objects.get(email='u1@example.com').usuario.username, 'u1')
+
+    def test_conflictos(self):
+        self.crear(1)
+        # Usuario ya vinculado a otro cliente
+        ocupado = User.objects.create(username='ocupado', email='ocupado@example.com')
+        Cliente.objects.create(nombre='Ya', apellidos='Vinculado', email='otro@example.com', usuario=ocupado)
+        Cliente.objects.create(nombre='Sin', apellidos='Vincular', email='OCUPADO@example.com')
+        # Dos usuarios con el mismo email (las cuentas lo impiden al crearlas)
+        User.objects.filter(pk=User.objects.create(username='doble').pk).update(email='u0@example.com')
+        Cliente.objects.create(nombre='Sin', apellidos='Usuario', email='nadie@example.com')
+
+        salida = self.ejecutar()
+
+        self.assertIn('⚠️  Múltiples usuarios con email: u0@example.com', salida)
+        self.assertIn('⚠️  Usuario ocupado ya está vinculado a otro cliente', salida)
+        self.assertIn('❌ No se encontró usuario con email: nadie@example.com', salida)
+        self.assertIn('🎉 Proceso completado: 0 clientes vinculados', salida)
+
+    def test_lotes(self):
+        self.crear(10)
+        with CaptureQueriesContext(connection) as ctx:
+            self.ejecutar('--batch-size', '4')
+        actualizaciones = [q for q in ctx.captured_queries if q['sql'].startswith('UPDATE "clientes_cliente"')]
+        self.assertEqual(len(actualizaciones), 3)
+        self.assertEqual(Cliente.objects.filter(usuario__isnull=False).count(), 10)
+
+    def test_solo_informa_de_los_vinculados(self):
+        self.crear(3)
+        otro = User.objects.create(username='otro', email='otro@example.com')
+
+        def vincular_tras_otra_ejecucion(pares):
+            # Otra ejecución vincula u0 entre la lectura y el UPDATE
+            Cliente.objects.filter(email='u0@example.com').update(usuario=otro)
+            return vincular(pares)
+
+        with mock.patch('clientes.management.commands.vincular_usuarios.vincular', vincular_tras_otra_ejecucion):
+            salida = self.ejecutar()
+        self.assertNotIn('✅ Vinculado: Cliente 0 ', salida)
+        self.assertIn('✅ Vinculado: Cliente 1 ↔ u1', salida)
+        self.assertIn('🎉 Proceso completado: 2 clientes vinculados', salida)
+
+    def test_dry_run(self):
+        self.crear(2)
+        salida = self.ejecutar('--dry-run')
+        self.assertIn('📈 Se vincularían 2 clientes', salida)
+        self.assertFalse(Cliente.objects.filter(usuario__isnull=False).exists())
@@ -11,10 +11,14 @@ urlpatterns = [
     path('<int:pk>/', views.ClienteDetailView.as_view(), name='detalle'),
     path('<int:pk>/editar/', views.ClienteUpdateView.as_view(), name='editar'),
     path('<int:pk>/eliminar/', views.ClienteDeleteView.as_view(), name='eliminar'),
+    path('api/autocompletar/', views.autocompletar_clientes, name='autocompletar'),
+    path('exportar/', views.exportar_clientes, name='exportar'),
+    path('importar/', views.importar_clientes, name='importar'),
     
     # URLs para panel de cliente
     path('registro/', panel_views.ClienteRegistrationView.as_view(), name='registro'),
     path('panel/', panel_views.ClientePanelView.as_view(), name='panel'),
     path('api/perfil/', panel_views.cliente_perfil_ajax, name='perfil_ajax'),
     path('api/bonos/', panel_views.cliente_bonos_ajax, name='bonos_ajax'),
+    path('api/resumen/', panel_views.cliente_resumen_ajax, name='resumen_ajax'),
 ]
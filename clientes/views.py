@@ -1,20 +1,57 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib import messages
+from django.http import JsonResponse
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
 from django.urls import reverse_lazy
+from .busqueda import buscar
 from .models import Cliente
-from .forms import ClienteForm
-from arenasurf.mixins import StaffRequiredMixin
+from .forms import ClienteForm, ImportarClientesForm
+from arenasurf.cache import cache_versionada
+from arenasurf.exportacion import exportar_csv
+from arenasurf.importacion import COLUMNAS_OBLIGATORIAS, FilaImportacionForm, ImportacionInvalida, importar_csv
+from arenasurf.mixins import StaffRequiredMixin, staff_required
+from arenasurf.paginacion import PaginacionCursorMixin, paginar_por_cursor
 
+LIMITE_AUTOCOMPLETAR = 20
 
-class ClienteListView(StaffRequiredMixin, ListView):
+
+class ClienteListView(StaffRequiredMixin, PaginacionCursorMixin, ListView):
     model = Cliente
     template_name = 'clientes/cliente_list.html'
     context_object_name = 'clientes'
     paginate_by = 20
+    # Los contadores de bonos están desnormalizados en Cliente, así que se
+    # ordena por ellos directamente sin agregar la tabla de bonos. El ``id``
+    # final hace el orden total para la paginación por cursor.
+    ordenes = {
+        'nombre': ('apellidos', 'nombre', 'id'),
+        'bonos': ('-num_bonos_activos', 'apellidos', 'nombre', 'id'),
+        'usos': ('-num_usos', 'apellidos', 'nombre', 'id'),
+    }
+    
+    def get_orden(self):
+        orden = self.request.GET.get('orden')
+        return orden if orden in self.ordenes else 'nombre'
     
     def get_queryset(self):
-        return Cliente.objects.filter(activo=True).order_by('apellidos', 'nombre')
+        clientes = Cliente.objects.filter(activo=True).order_by(*self.ordenes[self.get_orden()])
+        return buscar(clientes, self.request.GET.get('search', ''))
+    
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['orden'] = self.get_orden()
+        context['search'] = self.request.GET.get('search', '')
+        return context
+    
+    def serializar_objeto(self, cliente):
+        return {
+            'id': cliente.pk,
+            'nombre': cliente.nombre_completo,
+            'email': cliente.email,
+            'telefono': cliente.telefono,
+            'bonos_activos': cliente.num_bonos_activos,
+            'usos': cliente.num_usos,
+        }
 
 
 class ClienteDetailView(StaffRequiredMixin, DetailView):
@@ -24,7 +61,13 @@ class ClienteDetailView(StaffRequiredMixin, DetailView):
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['bonos'] = self.object.bonos.all().order_by('-fecha_compra')
+        # La lista de bonos se cachea con la versión del cliente, que cambia
+        # con cualquier alta, canje o borrado de sus bonos
+        context['bonos'] = cache_versionada(
+            'cliente_detalle:bonos',
+            [(Cliente, self.object.pk)],
+            lambda: list(self.object.bonos.with_usage().order_by('-fecha_compra')),
+        )
         return context
 
 
@@ -62,3 +105,68 @@ class ClienteDeleteView(StaffRequiredMixin, DeleteView):
         self.object.save()
         messages.success(self.request, 'Cliente desactivado exitosamente.')
         return redirect(self.success_url)
+
+
+@staff_required
+def autocompletar_clientes(request):
+    """
+    Búsqueda de clientes activos para los selectores de cliente.
+
+    Cada palabra de ``q`` debe ser el principio de alguna palabra del
+    nombre, los apellidos, el email o el teléfono, sin tener en cuenta
+    acentos ni mayúsculas (ver ``clientes.busqueda``). Los resultados van
+    en páginas de ``limite`` (máximo 50) por cursor; ``siguiente`` es el
+    cursor de la página siguiente o null. Con ``sin_socio`` se excluyen los
+    clientes que ya son socios.
+    """
+    clientes = Cliente.objects.filter(activo=True).order_by('apellidos', 'nombre', 'id')
+    if request.GET.get('sin_socio'):
+        clientes = clientes.filter(socio__isnull=True)
+    clientes = buscar(clientes, request.GET.get('q', ''))
+
+    limite = request.GET.get('limite', '')
+    limite = min(int(limite), 50) if limite.isdigit() and int(limite) > 0 else LIMITE_AUTOCOMPLETAR
+    filas, _, siguiente = paginar_por_cursor(
+        clientes.only('nombre', 'apellidos', 'email', 'telefono'), limite, request.GET.get('cursor')
+    )
+    return JsonResponse({
+        'resultados': [
+            {'id': c.pk, 'texto': str(c), 'email': c.email, 'telefono': c.telefono}
+            for c in filas
+        ],
+        'siguiente': siguiente,
+    })
+
+
+@staff_required
+def exportar_clientes(request):
+    """CSV de clientes (filtros: desde, hasta por fecha de registro, estado, gzip)"""
+    return exportar_csv(request, 'clientes')
+
+
+@staff_required
+def importar_clientes(request):
+    """Alta masiva de clientes, bonos y socios desde un CSV"""
+    resultado = None
+    form = ImportarClientesForm(request.POST or None, request.FILES or None)
+    if request.method == 'POST' and form.is_valid():
+        try:
+            resultado = importar_csv(form.cleaned_data['fichero'])
+        except ImportacionInvalida as error:
+            form.add_error('fichero', str(error))
+        except UnicodeDecodeError:
+            form.add_error('fichero', 'El fichero debe estar codificado en UTF-8.')
+        else:
+            messages.success(
+                request,
+                f'Importados {resultado.clientes} clientes, {resultado.bonos} bonos y {resultado.socios} socios.'
+            )
+            if resultado.rechazos:
+                messages.warning(request, f'{len(resultado.rechazos)} filas rechazadas.')
+
+    return render(request, 'clientes/cliente_import.html', {
+        'form': form,
+        'resultado': resultado,
+        'obligatorias': COLUMNAS_OBLIGATORIAS,
+        'columnas': list(FilaImportacionForm.base_fields),
+    })
@@ -0,0 +1,90 @@
+"""
+Vinculación de clientes con usuarios por email
+
+Las consultas trabajan sobre conjuntos: los candidatos salen de una sola
+consulta con subconsultas correlacionadas sobre el email y la vinculación
+es un único UPDATE con ``CASE`` por lote. Los emails se comparan sin
+distinguir mayúsculas (``emails_normalizados``), igual en todos los
+comandos que vinculan.
+"""
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Case, Count, IntegerField, OuterRef, Subquery, Value, When
+from django.db.models.functions import Lower
+from django.utils import timezone
+
+from arenasurf.cache import invalidar
+from .models import Cliente
+
+
+def emails_normalizados(queryset):
+    """``queryset`` con el email en minúsculas anotado como ``email_normalizado``"""
+    return queryset.annotate(email_normalizado=Lower('email'))
+
+
+def candidatos_por_email(usuarios=None):
+    """
+    Clientes sin usuario que son el único cliente libre con su email y que
+    tienen exactamente un usuario libre con ese mismo email.
+
+    ``usuarios`` acota los usuarios que se pueden vincular (por defecto,
+    todos). Devuelve un queryset de ``values_list`` con ``(cliente_id,
+    usuario_id, username, nombre, apellidos)``.
+    """
+    usuarios = User.objects.all() if usuarios is None else usuarios
+    libres = emails_normalizados(usuarios).filter(
+        cliente__isnull=True, email_normalizado=OuterRef('email_normalizado')
+    ).order_by()
+    clientes_libres = emails_normalizados(Cliente.objects.filter(usuario__isnull=True))
+    mismo_email = clientes_libres.filter(email_normalizado=OuterRef('email_normalizado')).order_by()
+    return (
+        clientes_libres
+        .annotate(
+            usuarios_libres=Subquery(
+                libres.values('email_normalizado').annotate(n=Count('pk')).values('n'),
+                output_field=IntegerField(),
+            ),
+            # Con varios clientes libres por email no se sabe cuál es el del usuario
+            clientes_email=Subquery(
+                mismo_email.values('email_normalizado').annotate(n=Count('pk')).values('n'),
+                output_field=IntegerField(),
+            ),
+            usuario_libre=Subquery(libres.values('pk')[:1]),
+            username_libre=Subquery(libres.values('username')[:1]),
+        )
+        .filter(usuarios_libres=1, clientes_email=1)
+        .order_by('pk')
+        .values_list('pk', 'usuario_libre', 'username_libre', 'nombre', 'apellidos')
+    )
+
+
+def vincular(pares):
+    """
+    Vincula cada ``(cliente_id, usuario_id)`` con un único UPDATE.
+
+    Solo se tocan los clientes que siguen sin usuario, así que una
+    ejecución concurrente no pisa vínculos hechos entretanto. Devuelve la
+    lista de ids de los clientes vinculados.
+    """
+    pares = dict(pares)
+    if not pares:
+        return []
+    with transaction.atomic():
+        # Los clientes aún libres quedan bloqueados hasta el UPDATE
+        libres = list(
+            Cliente.objects.select_for_update()
+            .filter(pk__in=list(pares), usuario__isnull=True)
+            .values_list('pk', flat=True)
+        )
+        if not libres:
+            return []
+        Cliente.objects.filter(pk__in=libres, usuario__isnull=True).update(
+            usuario_id=Case(
+                *[When(pk=cliente_id, then=Value(pares[cliente_id])) for cliente_id in libres],
+                output_field=IntegerField(),
+            ),
+            updated_at=timezone.now(),
+        )
+        # El UPDATE no dispara las señales que invalidan la caché de cada cliente
+        invalidar(Cliente, libres)
+    return libres
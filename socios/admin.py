@@ -1,5 +1,7 @@
-from django.contrib import admin
-from .models import Socio
+from django.contrib import admin, messages
+from arenasurf.paginacion import PaginadorEstimado
+from .membresias import caducar, renovar
+from .models import Guardatablas, Socio, Taquilla
 
 
 @admin.register(Socio)
@@ -15,7 +17,12 @@ class SocioAdmin(admin.ModelAdmin):
         'cliente__email', 'numero_taquilla', 'numero_guardatablas'
     ]
     list_editable = ['activo']
-    readonly_fields = ['created_at', 'updated_at']
+    list_select_related = ['cliente']
+    autocomplete_fields = ['cliente']
+    # Las plazas se gestionan con el inventario de taquillas y guardatablas
+    readonly_fields = ['numero_taquilla', 'numero_guardatablas', 'created_at', 'updated_at']
+    paginator = PaginadorEstimado
+    show_full_result_count = False
     
     fieldsets = (
         ('Información Básica', {
@@ -33,7 +40,43 @@ class SocioAdmin(admin.ModelAdmin):
         }),
     )
     
+    actions = ['renovar_membresias', 'caducar_membresias']
+
+    @admin.action(description='Renovar membresías seleccionadas (365 días)')
+    def renovar_membresias(self, request, queryset):
+        resultado = renovar(queryset.values_list('pk', flat=True))
+        self.message_user(request, f'{resultado.socios} membresías renovadas.', messages.SUCCESS)
+
+    @admin.action(description='Caducar membresías seleccionadas y liberar sus plazas')
+    def caducar_membresias(self, request, queryset):
+        resultado = caducar(queryset.values_list('pk', flat=True))
+        self.message_user(
+            request,
+            f'{resultado.socios} membresías caducadas; liberadas {resultado.taquillas_liberadas} '
+            f'taquillas y {resultado.guardatablas_liberadas} guardatablas.',
+            messages.SUCCESS,
+        )
+
     def esta_vigente(self, obj):
         return obj.esta_vigente
     esta_vigente.boolean = True
     esta_vigente.short_description = 'Vigente'
+
+
+class EspacioAdmin(admin.ModelAdmin):
+    list_display = ['numero', 'socio', 'libre']
+    list_select_related = ['socio__cliente']
+    search_fields = ['numero', 'socio__numero_socio']
+    # La asignación se hace desde el socio para mantener ambos lados al día
+    readonly_fields = ['socio']
+    paginator = PaginadorEstimado
+    show_full_result_count = False
+
+    def libre(self, obj):
+        return obj.libre
+    libre.boolean = True
+    libre.short_description = 'Libre'
+
+
+admin.site.register(Taquilla, EspacioAdmin)
+admin.site.register(Guardatablas, EspacioAdmin)
@@ -0,0 +1,125 @@
+"""
+Inventario de taquillas y guardatablas
+
+La asignación es un UPDATE condicional (``socio IS NULL``) sobre la plaza
+elegida, así que dos peticiones concurrentes nunca se quedan con la misma:
+la que pierde vuelve a buscar la siguiente libre. El número asignado se
+refleja en ``Socio.numero_taquilla`` / ``Socio.numero_guardatablas``.
+"""
+from django.db import transaction
+from django.db.models import Q
+
+from arenasurf.cache import invalidar
+from clientes.models import Cliente
+from .models import Guardatablas, Socio, Taquilla
+
+ESPACIOS = (Taquilla, Guardatablas)
+REINTENTOS = 10
+
+
+class _SinPlaza(Exception):
+    pass
+
+
+def _invalidar_socios(socio_ids):
+    cliente_ids = Socio.objects.filter(pk__in=socio_ids).values_list('cliente_id', flat=True)
+    invalidar(Socio, socio_ids)
+    invalidar(Cliente, list(cliente_ids))
+
+
+def _ocupar(modelo, socio, numero):
+    """Intenta ocupar ``numero`` (o la primera plaza libre). Devuelve el número o None"""
+    # Las plazas perdidas se excluyen: con REPEATABLE READ la lectura
+    # volvería a ver la misma plaza libre aunque otro ya la haya ocupado.
+    perdidas = []
+    for _ in range(REINTENTOS):
+        candidato = numero
+        if candidato is None:
+            candidato = (
+                modelo.objects.filter(socio__isnull=True).exclude(numero__in=perdidas)
+                .order_by('numero').values_list('numero', flat=True).first()
+            )
+            if candidato is None:
+                return None
+        if modelo.objects.filter(numero=candidato, socio__isnull=True).update(socio=socio):
+            return candidato
+        if numero is not None:
+            return None
+        perdidas.append(candidato)
+    return None
+
+
+def asignar(modelo, socio, numero=None):
+    """
+    Asigna al socio la plaza ``numero`` o, sin número, la primera libre.
+
+    Si el socio ya tenía otra plaza se libera. Devuelve el número asignado,
+    o None si la plaza pedida está ocupada o no quedan libres; en ese caso
+    el socio conserva la que tenía.
+    """
+    try:
+        with transaction.atomic():
+            actual = modelo.objects.filter(socio=socio).values_list('numero', flat=True).first()
+            if actual is not None and numero in (None, actual):
+                asignado = actual
+            else:
+                if actual is not None:
+                    modelo.objects.filter(socio=socio).update(socio=None)
+                asignado = _ocupar(modelo, socio, numero)
+                if asignado is None:
+                    raise _SinPlaza
+            Socio.objects.filter(pk=socio.pk).update(**{modelo.campo_socio: asignado})
+    except _SinPlaza:
+        return None
+    setattr(socio, modelo.campo_socio, asignado)
+    _invalidar_socios([socio.pk])
+    return asignado
+
+
+def liberar(socio_ids, modelos=ESPACIOS):
+    """
+    Libera en bloque las plazas de los socios indicados.
+
+    Son dos UPDATE por tipo de plaza, independientemente del número de
+    socios. Devuelve ``{modelo: plazas liberadas}``.
+    """
+    socio_ids = list(socio_ids)
+    liberadas = {}
+    with transaction.atomic():
+        for modelo in modelos:
+            liberadas[modelo] = modelo.objects.filter(socio_id__in=socio_ids).update(socio=None)
+            Socio.objects.filter(pk__in=socio_ids).exclude(
+                **{f'{modelo.campo_socio}__isnull': True}
+            ).update(**{modelo.campo_socio: None})
+    if any(liberadas.values()):
+        _invalidar_socios(socio_ids)
+    return liberadas
+
+
+def socios_con_plaza_vencidos(today):
+    """Socios inactivos o vencidos que siguen ocupando alguna plaza"""
+    return Socio.objects.filter(
+        Q(activo=False) | Q(fecha_vencimiento__lt=today),
+        Q(taquilla__isnull=False) | Q(guardatablas__isnull=False),
+    )
+
+
+def crear_plazas(modelo, hasta):
+    """Da de alta las plazas 1..``hasta`` que falten. Devuelve cuántas se han creado"""
+    existentes = set(modelo.objects.filter(numero__lte=hasta).values_list('numero', flat=True))
+    nuevas = [modelo(numero=n) for n in range(1, hasta + 1) if n not in existentes]
+    modelo.objects.bulk_create(nuevas, batch_size=1000, ignore_conflicts=True)
+    return len(nuevas)
+
+
+def mapa_ocupacion(modelo):
+    """Todas las plazas con su socio y cliente, leídas con una consulta"""
+    return list(modelo.objects.select_related('socio__cliente').order_by('numero'))
+
+
+def numeros_disponibles(modelo, socio=None):
+    """Números libres más el que ya tenga asignado ``socio`` (una consulta)"""
+    filtro = Q(socio__isnull=True)
+    if socio is not None and socio.pk:
+        filtro |= Q(socio=socio)
+    return list(modelo.objects.filter(filtro).order_by('numero').values_list('numero', flat=True))
@@ -2,20 +2,36 @@ from django import forms
 from django.db import models
 from django.utils import timezone
 from datetime import timedelta
-from .models import Socio
+from .espacios import asignar, liberar, numeros_disponibles
+from .models import Guardatablas, Socio, Taquilla
+from .secuencias import formatear_numero_socio
+from clientes.forms import SelectorCliente
 from clientes.models import Cliente
 
+ASIGNAR_LIBRE = 'libre'
+
 
 class SocioForm(forms.ModelForm):
+    # Las plazas se eligen de las libres y se asignan con el inventario al guardar
+    numero_taquilla = forms.ChoiceField(
+        required=False,
+        label='Número de Taquilla',
+        widget=forms.Select(attrs={'class': 'form-control'})
+    )
+    numero_guardatablas = forms.ChoiceField(
+        required=False,
+        label='Número de Guardatablas',
+        widget=forms.Select(attrs={'class': 'form-control'})
+    )
+
     class Meta:
         model = Socio
         fields = [
             'cliente', 'nivel', 'numero_socio', 'fecha_alta', 
-            'fecha_vencimiento', 'numero_taquilla', 'numero_guardatablas',
-            'precio_anual'
+            'fecha_vencimiento', 'precio_anual'
         ]
         widgets = {
-            'cliente': forms.Select(attrs={'class': 'form-control'}),
+            'cliente': SelectorCliente(sin_socio=True),
             'nivel': forms.Select(attrs={'class': 'form-control'}),
             'numero_socio': forms.TextInput(attrs={
                 'class': 'form-control',
@@ -29,16 +45,6 @@ class SocioForm(forms.ModelForm):
                 'class': 'form-control', 
                 'type': 'date'
             }),
-            'numero_taquilla': forms.NumberInput(attrs={
-                'class': 'form-control',
-                'min': '1',
-                'placeholder': 'Opcional'
-            }),
-            'numero_guardatablas': forms.NumberInput(attrs={
-                'class': 'form-control',
-                'min': '1',
-                'placeholder': 'Opcional'
-            }),
             'precio_anual': forms.NumberInput(attrs={
                 'class': 'form-control',
                 'step': '0.01',
@@ -51,14 +57,22 @@ class SocioForm(forms.ModelForm):
             'numero_socio': 'Número de Socio',
             'fecha_alta': 'Fecha de Alta',
             'fecha_vencimiento': 'Fecha de Vencimiento',
-            'numero_taquilla': 'Número de Taquilla',
-            'numero_guardatablas': 'Número de Guardatablas',
             'precio_anual': 'Precio Anual (€)',
         }
     
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         
+        self.espacios = {'numero_taquilla': Taquilla, 'numero_guardatablas': Guardatablas}
+        self.espacios_no_asignados = []
+        for campo, modelo in self.espacios.items():
+            numeros = numeros_disponibles(modelo, self.instance)
+            self.fields[campo].choices = (
+                [('', 'Sin asignar'), (ASIGNAR_LIBRE, 'Siguiente libre')]
+                + [(str(n), str(n)) for n in numeros]
+            )
+            self.fields[campo].initial = getattr(self.instance, campo)
+
         # Hacer campos opcionales para autogeneración
         self.fields['numero_socio'].required = False
         self.fields['precio_anual'].required = False
@@ -71,22 +85,20 @@ class SocioForm(forms.ModelForm):
             vencimiento = today + timedelta(days=365)
             self.fields['fecha_vencimiento'].initial = vencimiento.strftime('%Y-%m-%d')
         
-        # Solo mostrar clientes que no son socios aún (para crear) o el cliente actual (para editar)
-        if not self.instance.pk:
-            # Para crear nuevo socio, excluir clientes que ya tienen socio
-            clientes_disponibles = Cliente.objects.filter(socio__isnull=True, activo=True)
-            self.fields['cliente'].queryset = clientes_disponibles
-        else:
-            # Para editar, permitir el cliente actual y otros disponibles
-            clientes_disponibles = Cliente.objects.filter(
-                models.Q(socio__isnull=True) | models.Q(pk=self.instance.cliente.pk),
-                activo=True
-            )
-            self.fields['cliente'].queryset = clientes_disponibles
+        # Solo se aceptan clientes que no son socios aún o el cliente actual (al
+        # editar). El selector no lista el queryset: solo filtra el id enviado.
+        disponibles = models.Q(socio__isnull=True)
+        if self.instance.pk:
+            disponibles |= models.Q(pk=self.instance.cliente_id)
+        self.fields['cliente'].queryset = Cliente.objects.filter(disponibles, activo=True)
     
     def clean_numero_socio(self):
         numero_socio = self.cleaned_data.get('numero_socio')
+        # Vacío: el número se asigna de la secuencia al guardar
         if numero_socio:
+            numero_socio = numero_socio.strip()
+            if numero_socio.isdigit():
+                numero_socio = formatear_numero_socio(int(numero_socio))
             # Verificar que no exista otro socio con el mismo número
             qs = Socio.objects.filter(numero_socio=numero_socio)
             if self.instance.pk:
@@ -95,28 +107,6 @@ class SocioForm(forms.ModelForm):
                 raise forms.ValidationError('Ya existe un socio con este número.')
         return numero_socio
     
-    def clean_numero_taquilla(self):
-        numero_taquilla = self.cleaned_data.get('numero_taquilla')
-        if numero_taquilla:
-            # Verificar que no exista otro socio con la misma taquilla
-            qs = Socio.objects.filter(numero_taquilla=numero_taquilla)
-            if self.instance.pk:
-                qs = qs.exclude(pk=self.instance.pk)
-            if qs.exists():
-                raise forms.ValidationError('Esta taquilla ya está asignada a otro socio.')
-        return numero_taquilla
-    
-    def clean_numero_guardatablas(self):
-        numero_guardatablas = self.cleaned_data.get('numero_guardatablas')
-        if numero_guardatablas:
-            # Verificar que no exista otro socio con el mismo guardatablas
-            qs = Socio.objects.filter(numero_guardatablas=numero_guardatablas)
-            if self.instance.pk:
-                qs = qs.exclude(pk=self.instance.pk)
-            if qs.exists():
-                raise forms.ValidationError('Este guardatablas ya está asignado a otro socio.')
-        return numero_guardatablas
-    
     def clean(self):
         cleaned_data = super().clean()
         nivel = cleaned_data.get('nivel')
@@ -144,6 +134,26 @@ class SocioForm(forms.ModelForm):
             pass
         
         return cleaned_data
+
+    def save(self, commit=True):
+        socio = super().save(commit=commit)
+        if commit:
+            self.asignar_espacios()
+        return socio
+
+    def asignar_espacios(self):
+        """Asigna o libera las plazas elegidas; anota las que ya no estaban libres"""
+        for campo, modelo in self.espacios.items():
+            valor = self.cleaned_data.get(campo)
+            if not valor:
+                liberar([self.instance.pk], modelos=[modelo])
+                setattr(self.instance, campo, None)
+                continue
+            numero = None if valor == ASIGNAR_LIBRE else int(valor)
+            if asignar(modelo, self.instance, numero) is None:
+                self.espacios_no_asignados.append(self.fields[campo].label)
+
+
 class SocioSearchForm(forms.Form):
     """Formulario para búsqueda y filtrado de socios"""
     search = forms.CharField(
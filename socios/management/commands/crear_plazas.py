@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from socios.espacios import crear_plazas
+from socios.models import Guardatablas, Taquilla
+
+
+class Command(BaseCommand):
+    help = 'Dar de alta las taquillas y guardatablas del inventario'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--taquillas', type=int, default=0, help='Número de taquillas (1..N)')
+        parser.add_argument('--guardatablas', type=int, default=0, help='Número de guardatablas (1..N)')
+
+    def handle(self, *args, **options):
+        for modelo, cantidad in ((Taquilla, options['taquillas']), (Guardatablas, options['guardatablas'])):
+            if cantidad > 0:
+                creadas = crear_plazas(modelo, cantidad)
+                self.stdout.write(f'✅ {modelo._meta.verbose_name_plural}: {creadas} plazas nuevas')
@@ -0,0 +1,74 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from socios.membresias import (
+    DIAS_RENOVACION, caducar, en_tramos, renovar, socios_a_caducar, socios_a_renovar,
+)
+
+
+class Command(BaseCommand):
+    help = 'Renovar o caducar membresías de socios en bloque'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'accion',
+            choices=['renovar', 'caducar'],
+            help='renovar: amplía los vencimientos de la ventana; '
+                 'caducar: desactiva los vencidos y libera sus plazas',
+        )
+        parser.add_argument('--desde', help='Vencimiento mínimo (AAAA-MM-DD)')
+        parser.add_argument('--hasta', help='Vencimiento máximo (AAAA-MM-DD), solo para renovar')
+        parser.add_argument(
+            '--dias',
+            type=int,
+            default=DIAS_RENOVACION,
+            help='Días que se amplía cada membresía al renovar',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='Número de socios que se procesan por transacción',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Mostrar cuántos socios se verían afectados sin modificar nada',
+        )
+
+    def fecha(self, valor):
+        if not valor:
+            return None
+        try:
+            return date.fromisoformat(valor)
+        except ValueError:
+            raise CommandError(f'Fecha no válida: {valor}')
+
+    def handle(self, *args, **options):
+        desde = self.fecha(options['desde'])
+        hasta = self.fecha(options['hasta'])
+
+        if options['accion'] == 'renovar':
+            if not (desde or hasta):
+                raise CommandError('Indica una ventana de vencimientos con --desde y/o --hasta')
+            socios = socios_a_renovar(desde, hasta)
+            operacion, kwargs, verbo = renovar, {'dias': options['dias']}, 'renovados'
+        else:
+            socios = socios_a_caducar(timezone.now().date(), desde)
+            operacion, kwargs, verbo = caducar, {}, 'caducados'
+
+        if options['dry_run']:
+            self.stdout.write(f'🔍 Se verían afectados {socios.count()} socios')
+            return
+
+        def progreso(total):
+            self.stdout.write(f'⏳ {total.socios} socios {verbo}...')
+
+        total = en_tramos(operacion, socios, options['chunk_size'], progreso, **kwargs)
+        self.stdout.write(f'🎉 {total.socios} socios {verbo}')
+        if operacion is caducar:
+            self.stdout.write(
+                f'🔓 Plazas liberadas: {total.taquillas_liberadas} taquillas, '
+                f'{total.guardatablas_liberadas} guardatablas'
+            )
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from socios.espacios import liberar, socios_con_plaza_vencidos
+
+
+class Command(BaseCommand):
+    help = 'Liberar las taquillas y guardatablas de los socios vencidos o inactivos'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Mostrar cuántos socios se verían afectados sin liberar nada',
+        )
+
+    def handle(self, *args, **options):
+        socio_ids = list(
+            socios_con_plaza_vencidos(timezone.now().date()).values_list('pk', flat=True)
+        )
+        if options['dry_run']:
+            self.stdout.write(f'🔍 {len(socio_ids)} socios vencidos tienen plazas asignadas')
+            return
+
+        liberadas = liberar(socio_ids)
+        for modelo, cantidad in liberadas.items():
+            self.stdout.write(f'🔓 {modelo._meta.verbose_name_plural} liberadas: {cantidad}')
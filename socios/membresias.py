@@ -0,0 +1,105 @@
+"""
+Renovación y caducidad de membresías en bloque
+
+Las operaciones trabajan por tramos de ``pk`` con UPDATE sobre conjuntos,
+sin cargar los socios en memoria. Al caducar se liberan en la misma pasada
+las taquillas y guardatablas de los socios afectados.
+"""
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import DateField, ExpressionWrapper, F, Max, Min
+
+from arenasurf.cache import invalidar
+from clientes.models import Cliente
+from .espacios import liberar
+from .models import Guardatablas, Socio, Taquilla
+
+DIAS_RENOVACION = 365
+
+
+@dataclass
+class ResultadoMembresias:
+    socios: int = 0
+    taquillas_liberadas: int = 0
+    guardatablas_liberadas: int = 0
+
+
+def socios_a_renovar(desde=None, hasta=None):
+    """Socios cuyo vencimiento cae en la ventana [desde, hasta]"""
+    socios = Socio.objects.all()
+    if desde:
+        socios = socios.filter(fecha_vencimiento__gte=desde)
+    if hasta:
+        socios = socios.filter(fecha_vencimiento__lte=hasta)
+    return socios
+
+
+def socios_a_caducar(today, desde=None):
+    """Socios activos con la membresía vencida antes de ``today``"""
+    socios = Socio.objects.filter(activo=True, fecha_vencimiento__lt=today)
+    if desde:
+        socios = socios.filter(fecha_vencimiento__gte=desde)
+    return socios
+
+
+def tramos(socios, chunk_size):
+    """Divide el queryset en listas de pks por rangos de ``chunk_size``"""
+    rango = socios.aggregate(minimo=Min('pk'), maximo=Max('pk'))
+    if rango['minimo'] is None:
+        return
+    inicio = rango['minimo']
+    while inicio <= rango['maximo']:
+        fin = inicio + chunk_size
+        ids = list(socios.filter(pk__gte=inicio, pk__lt=fin).values_list('pk', flat=True))
+        if ids:
+            yield ids
+        inicio = fin
+
+
+def _invalidar(socio_ids):
+    invalidar(Socio, socio_ids)
+    invalidar(Cliente, Socio.objects.filter(pk__in=socio_ids).values_list('cliente_id', flat=True))
+
+
+def renovar(socio_ids, dias=DIAS_RENOVACION):
+    """Amplía el vencimiento ``dias`` días y reactiva a los socios (un UPDATE)"""
+    socio_ids = list(socio_ids)
+    with transaction.atomic():
+        renovados = Socio.objects.filter(pk__in=socio_ids).update(
+            fecha_vencimiento=ExpressionWrapper(
+                F('fecha_vencimiento') + timedelta(days=dias), output_field=DateField()
+            ),
+            activo=True,
+        )
+        _invalidar(socio_ids)
+    return ResultadoMembresias(socios=renovados)
+
+
+def caducar(socio_ids):
+    """Desactiva a los socios y libera sus plazas"""
+    socio_ids = list(socio_ids)
+    with transaction.atomic():
+        caducados = Socio.objects.filter(pk__in=socio_ids, activo=True).update(activo=False)
+        liberadas = liberar(socio_ids)
+        _invalidar(socio_ids)
+    return ResultadoMembresias(caducados, liberadas[Taquilla], liberadas[Guardatablas])
+
+
+def en_tramos(operacion, socios, chunk_size=1000, progreso=None, **kwargs):
+    """
+    Aplica ``operacion`` (``renovar`` o ``caducar``) tramo a tramo.
+
+    Cada tramo va en su propia transacción. ``progreso`` recibe el
+    resultado acumulado tras cada tramo.
+    """
+    total = ResultadoMembresias()
+    for ids in tramos(socios, chunk_size):
+        parcial = operacion(ids, **kwargs)
+        total.socios += parcial.socios
+        total.taquillas_liberadas += parcial.taquillas_liberadas
+        total.guardatablas_liberadas += parcial.guardatablas_liberadas
+        if progreso:
+            progreso(total)
+    return total
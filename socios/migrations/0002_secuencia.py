@@ -0,0 +1,33 @@
+# Generated by Django 4.2 on 2026-10-17 23:49
+
+from django.db import migrations, models
+
+
+def crear_secuencia_socios(apps, schema_editor):
+    Socio = apps.get_model('socios', 'Socio')
+    Secuencia = apps.get_model('socios', 'Secuencia')
+    numeros = Socio.objects.values_list('numero_socio', flat=True).iterator()
+    ultimo = max((int(n) for n in numeros if n.isdigit()), default=0)
+    Secuencia.objects.create(nombre='numero_socio', siguiente=ultimo + 1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('socios', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Secuencia',
+            fields=[
+                ('nombre', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('siguiente', models.PositiveBigIntegerField(default=1, verbose_name='Siguiente valor')),
+            ],
+            options={
+                'verbose_name': 'Secuencia',
+                'verbose_name_plural': 'Secuencias',
+            },
+        ),
+        migrations.RunPython(crear_secuencia_socios, migrations.RunPython.noop),
+    ]
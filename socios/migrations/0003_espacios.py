@@ -0,0 +1,63 @@
+# Generated by Django 4.2 on 2026-10-17 23:51
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def inventariar_asignados(apps, schema_editor):
+    """Crea las plazas que ya tienen asignadas los socios existentes"""
+    Socio = apps.get_model('socios', 'Socio')
+    for modelo, campo in (('Taquilla', 'numero_taquilla'), ('Guardatablas', 'numero_guardatablas')):
+        Espacio = apps.get_model('socios', modelo)
+        asignados = Socio.objects.filter(**{f'{campo}__isnull': False}).values_list('pk', campo)
+        Espacio.objects.bulk_create(
+            [Espacio(numero=numero, socio_id=socio_id) for socio_id, numero in asignados.iterator()],
+            batch_size=1000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('socios', '0002_secuencia'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Taquilla',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('numero', models.PositiveIntegerField(unique=True, verbose_name='Número')),
+                ('socio', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='taquilla', to='socios.socio', verbose_name='Socio')),
+            ],
+            options={
+                'verbose_name': 'Taquilla',
+                'verbose_name_plural': 'Taquillas',
+                'ordering': ['numero'],
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='Guardatablas',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('numero', models.PositiveIntegerField(unique=True, verbose_name='Número')),
+                ('socio', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='guardatablas', to='socios.socio', verbose_name='Socio')),
+            ],
+            options={
+                'verbose_name': 'Guardatablas',
+                'verbose_name_plural': 'Guardatablas',
+                'ordering': ['numero'],
+                'abstract': False,
+            },
+        ),
+        migrations.AddIndex(
+            model_name='taquilla',
+            index=models.Index(fields=['socio', 'numero'], name='socios_taquilla_libres'),
+        ),
+        migrations.AddIndex(
+            model_name='guardatablas',
+            index=models.Index(fields=['socio', 'numero'], name='socios_guardatablas_libres'),
+        ),
+        migrations.RunPython(inventariar_asignados, migrations.RunPython.noop),
+    ]
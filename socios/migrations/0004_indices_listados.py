@@ -0,0 +1,21 @@
+# Generated by Django 4.2 on 2026-10-17 23:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('socios', '0003_espacios'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='socio',
+            index=models.Index(fields=['fecha_vencimiento', 'activo'], name='socios_vencimiento_activo'),
+        ),
+        migrations.AddIndex(
+            model_name='socio',
+            index=models.Index(fields=['nivel', 'activo', 'fecha_vencimiento'], name='socios_nivel_activo'),
+        ),
+    ]
@@ -1,8 +1,64 @@
 from django.db import models
+from django.db.models import BooleanField, Case, ExpressionWrapper, F, Func, IntegerField, Q, Value, When
 from django.utils import timezone
 from clientes.models import Cliente
 
 
+class DiasEntre(Func):
+    """Número de días entre dos fechas (fin - inicio) calculado en la base de datos"""
+    function = 'DATEDIFF'
+    arity = 2
+    output_field = IntegerField()
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler, connection,
+            template='CAST(julianday(%(expressions)s) AS INTEGER)',
+            arg_joiner=') - julianday(',
+            **extra_context
+        )
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler, connection, template='(%(expressions)s)', arg_joiner=' - ', **extra_context
+        )
+
+
+class SocioQuerySet(models.QuerySet):
+
+    def update(self, **kwargs):
+        # Renovaciones, caducidades y plazas se aplican en bloque: también
+        # marcan updated_at, que forma parte del ETag de la API del cliente.
+        kwargs.setdefault('updated_at', timezone.now())
+        return super().update(**kwargs)
+
+    def with_vigencia(self, today=None):
+        """Anota la vigencia y los días hasta el vencimiento calculados en SQL"""
+        today = today or timezone.now().date()
+        vigente = Q(activo=True, fecha_vencimiento__gte=today)
+        return self.annotate(
+            vigente_db=ExpressionWrapper(vigente, output_field=BooleanField()),
+            dias_vencimiento_db=Case(
+                When(vigente, then=DiasEntre(F('fecha_vencimiento'), Value(today))),
+                default=Value(0),
+                output_field=IntegerField(),
+            ),
+        )
+
+
+class Secuencia(models.Model):
+    """Contador con nombre para asignar números correlativos sin huecos"""
+    nombre = models.CharField(max_length=50, primary_key=True)
+    siguiente = models.PositiveBigIntegerField(default=1, verbose_name='Siguiente valor')
+
+    class Meta:
+        verbose_name = 'Secuencia'
+        verbose_name_plural = 'Secuencias'
+
+    def __str__(self):
+        return f'{self.nombre} ({self.siguiente})'
+
+
 class Socio(models.Model):
     """Modelo para gestionar socios del surf center"""
     
@@ -75,10 +131,18 @@ class Socio(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = SocioQuerySet.as_manager()
+    
     class Meta:
         verbose_name = 'Socio'
         verbose_name_plural = 'Socios'
         ordering = ['numero_socio']
+        indexes = [
+            # Vigencia: próximos vencimientos, filtros del listado y caducidad
+            models.Index(fields=['fecha_vencimiento', 'activo'], name='socios_vencimiento_activo'),
+            # Filtro por nivel; cubre además el recuento del dashboard
+            models.Index(fields=['nivel', 'activo', 'fecha_vencimiento'], name='socios_nivel_activo'),
+        ]
     
     def __str__(self):
         return f"Socio {self.numero_socio} - {self.cliente.nombre_completo}"
@@ -86,11 +150,15 @@ class Socio(models.Model):
     @property
     def esta_vigente(self):
         """Verifica si la membresía está vigente"""
+        if hasattr(self, 'vigente_db'):
+            return bool(self.vigente_db)
         return self.fecha_vencimiento >= timezone.now().date() and self.activo
     
     @property
     def dias_hasta_vencimiento(self):
         """Calcula días hasta el vencimiento"""
+        if hasattr(self, 'dias_vencimiento_db'):
+            return self.dias_vencimiento_db
         if not self.esta_vigente:
             return 0
         return (self.fecha_vencimiento - timezone.now().date()).days
@@ -107,22 +175,77 @@ class Socio(models.Model):
     
     def save(self, *args, **kwargs):
         """Override save para asignar número de socio y precio según nivel"""
-        # Generar número de socio automáticamente si no existe
+        from .secuencias import avanzar_numero_socio, siguiente_numero_socio
+
+        # Generar número de socio automáticamente si no existe; un número
+        # manual hace avanzar la secuencia para que no se vuelva a asignar
         if not self.numero_socio:
-            ultimo_numero = Socio.objects.aggregate(
-                models.Max('numero_socio')
-            )['numero_socio__max']
-            if ultimo_numero:
-                try:
-                    nuevo_numero = str(int(ultimo_numero) + 1).zfill(4)
-                except ValueError:
-                    nuevo_numero = '0001'
-            else:
-                nuevo_numero = '0001'
-            self.numero_socio = nuevo_numero
+            self.numero_socio = siguiente_numero_socio()
+        elif self._state.adding:
+            avanzar_numero_socio(self.numero_socio)
         
         # Establecer precio según nivel si no está definido
         if not self.precio_anual:
             self.precio_anual = self.precio_nivel['anual']
         
         super().save(*args, **kwargs)
+
+
+class Espacio(models.Model):
+    """
+    Plaza numerada que se asigna a un socio (taquilla o guardatablas).
+
+    Una plaza está libre cuando no tiene socio; el índice (socio, numero)
+    hace que buscar la primera libre sea una lectura de índice.
+    """
+    numero = models.PositiveIntegerField(unique=True, verbose_name='Número')
+
+    # Campo de Socio que refleja el número asignado
+    campo_socio = None
+
+    class Meta:
+        abstract = True
+        ordering = ['numero']
+
+    @property
+    def libre(self):
+        return self.socio_id is None
+
+    def __str__(self):
+        return f'{self._meta.verbose_name} {self.numero}'
+
+
+class Taquilla(Espacio):
+    socio = models.OneToOneField(
+        Socio,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='taquilla',
+        verbose_name='Socio'
+    )
+
+    campo_socio = 'numero_taquilla'
+
+    class Meta(Espacio.Meta):
+        verbose_name = 'Taquilla'
+        verbose_name_plural = 'Taquillas'
+        indexes = [models.Index(fields=['socio', 'numero'], name='socios_taquilla_libres')]
+
+
+class Guardatablas(Espacio):
+    socio = models.OneToOneField(
+        Socio,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='guardatablas',
+        verbose_name='Socio'
+    )
+
+    campo_socio = 'numero_guardatablas'
+
+    class Meta(Espacio.Meta):
+        verbose_name = 'Guardatablas'
+        verbose_name_plural = 'Guardatablas'
+        indexes = [models.Index(fields=['socio', 'numero'], name='socios_guardatablas_libres')]
@@ -0,0 +1,36 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from clientes.busqueda import CAMPOS_INDEXADOS, indexar_clientes, terminos
+from clientes.models import Cliente, TerminoBusqueda
+from .models import Socio
+
+
+@receiver(pre_save, sender=Socio)
+def guardar_cliente_previo(sender, instance, raw=False, **kwargs):
+    instance._cliente_previo = None
+    if raw or instance.pk is None:
+        return
+    instance._cliente_previo = (
+        Socio.objects.filter(pk=instance.pk).values_list('cliente_id', flat=True).first()
+    )
+
+
+@receiver(post_save, sender=Socio)
+def indexar_numero_socio(sender, instance, raw=False, update_fields=None, **kwargs):
+    """El número de socio se busca como un término más de su cliente"""
+    if raw:
+        return
+    if update_fields is not None and not {'numero_socio', 'cliente'} & set(update_fields):
+        return
+    clientes = {instance.cliente_id, getattr(instance, '_cliente_previo', None)} - {None}
+    indexar_clientes(clientes)
+
+
+@receiver(post_delete, sender=Socio)
+def desindexar_numero_socio(sender, instance, **kwargs):
+    # Solo se borra: si el socio cae en cascada con su cliente, crear
+    # términos nuevos aquí dejaría filas apuntando a un cliente borrado
+    campos = Cliente.objects.filter(pk=instance.cliente_id).values_list(*CAMPOS_INDEXADOS).first()
+    sobrantes = set(terminos(numero_socio=instance.numero_socio)) - set(terminos(*campos or ()))
+    TerminoBusqueda.objects.filter(cliente_id=instance.cliente_id, termino__in=sobrantes).delete()
@@ -0,0 +1,146 @@
+"""
+Asignación de números correlativos (número de socio)
+
+Cada secuencia es una fila de ``Secuencia``. Reservar valores es un
+``UPDATE siguiente = siguiente + n`` seguido de la lectura del nuevo valor
+en la misma transacción: el UPDATE bloquea la fila, así que dos procesos
+nunca obtienen el mismo número. Si el llamador envuelve la reserva y el
+alta en su propia transacción (``transaction.atomic`` alrededor de
+``Socio.save``) y esta se deshace, los números vuelven a la secuencia y no
+quedan huecos; sin ella la reserva se confirma sola y un alta fallida deja
+un hueco.
+
+Con ``ARENASURF_SECUENCIAS['bloque'] > 1`` cada proceso reserva bloques y
+los reparte desde memoria. Los sobrantes de un bloque solo se publican al
+confirmarse la transacción que lo reservó, de modo que un rollback puede
+dejar huecos pero nunca números repetidos.
+"""
+import threading
+from collections import deque
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .models import Secuencia, Socio
+
+NUMERO_SOCIO = 'numero_socio'
+DIGITOS_SOCIO = 4
+
+
+def reservar(nombre, cantidad=1, inicial=1):
+    """
+    Reserva ``cantidad`` valores consecutivos de la secuencia ``nombre``.
+
+    Devuelve un ``range`` con los valores reservados. Si la secuencia no
+    existe se crea empezando en ``inicial`` (que puede ser un callable).
+    """
+    if cantidad < 1:
+        return range(0)
+    with transaction.atomic():
+        actualizadas = Secuencia.objects.filter(nombre=nombre).update(
+            siguiente=F('siguiente') + cantidad
+        )
+        if not actualizadas:
+            _crear(nombre, inicial() if callable(inicial) else inicial)
+            Secuencia.objects.filter(nombre=nombre).update(siguiente=F('siguiente') + cantidad)
+        fin = Secuencia.objects.values_list('siguiente', flat=True).get(nombre=nombre)
+    return range(fin - cantidad, fin)
+
+
+def _crear(nombre, inicial):
+    try:
+        with transaction.atomic():
+            Secuencia.objects.create(nombre=nombre, siguiente=inicial)
+    except IntegrityError:
+        # Otro proceso la ha creado a la vez
+        pass
+
+
+def avanzar(nombre, valor):
+    """Garantiza que la secuencia no vuelva a asignar ``valor`` ni anteriores"""
+    Secuencia.objects.filter(nombre=nombre, siguiente__lte=valor).update(siguiente=valor + 1)
+
+
+class AsignadorSecuencia:
+    """Reparte valores de una secuencia, reservándolos por bloques si se configura"""
+
+    def __init__(self, nombre, bloque=None, inicial=1):
+        self.nombre = nombre
+        self._bloque = bloque
+        self.inicial = inicial
+        self._libres = deque()
+        self._lock = threading.Lock()
+        # Mayor valor asignado a mano: los reservados por debajo no se reparten
+        self._minimo = 0
+
+    @property
+    def bloque(self):
+        if self._bloque is not None:
+            return self._bloque
+        return getattr(settings, 'ARENASURF_SECUENCIAS', {}).get('bloque', 1)
+
+    def siguiente(self):
+        with self._lock:
+            if self._libres:
+                return self._libres.popleft()
+        valores = reservar(self.nombre, max(self.bloque, 1), self.inicial)
+        if len(valores) > 1:
+            sobrantes = list(valores[1:])
+            transaction.on_commit(lambda: self._publicar(sobrantes))
+        return valores[0]
+
+    def varios(self, cantidad):
+        """Reserva ``cantidad`` valores de golpe (importaciones masivas)"""
+        return list(reservar(self.nombre, cantidad, self.inicial))
+
+    def _publicar(self, valores):
+        with self._lock:
+            self._libres.extend(v for v in valores if v > self._minimo)
+
+    def avanzar(self, valor):
+        """
+        La secuencia no volverá a asignar ``valor`` ni anteriores.
+
+        También se descartan los valores de bloques ya reservados en memoria
+        (o pendientes de publicar) que no superen ``valor``; los bloques de
+        otros procesos no se ven desde aquí.
+        """
+        with self._lock:
+            self._minimo = max(self._minimo, valor)
+            self._libres = deque(v for v in self._libres if v > valor)
+        avanzar(self.nombre, valor)
+
+    def descartar(self):
+        """Olvida los valores reservados en memoria (quedarán como huecos)"""
+        with self._lock:
+            self._libres.clear()
+
+
+def _numero_socio_inicial():
+    """Siguiente número tras el mayor número de socio numérico existente"""
+    numeros = Socio.objects.values_list('numero_socio', flat=True).iterator()
+    return max((int(n) for n in numeros if n.isdigit()), default=0) + 1
+
+
+def formatear_numero_socio(valor):
+    return str(valor).zfill(DIGITOS_SOCIO)
+
+
+asignador_socios = AsignadorSecuencia(NUMERO_SOCIO, inicial=_numero_socio_inicial)
+
+
+def siguiente_numero_socio():
+    return formatear_numero_socio(asignador_socios.siguiente())
+
+
+def numeros_socio(cantidad):
+    """Números de socio para ``cantidad`` altas en bloque"""
+    return [formatear_numero_socio(n) for n in asignador_socios.varios(cantidad)]
+
+
+def avanzar_numero_socio(numero_socio):
+    """Un número manual numérico hace avanzar la secuencia por encima de él"""
+    numero_socio = str(numero_socio)
+    if numero_socio.isdigit():
+        asignador_socios.avanzar(int(numero_socio))
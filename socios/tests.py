@@ -1,3 +1,324 @@
-from django.test import TestCase
+import threading
+import time
+from io import StringIO
+from datetime import date, timedelta
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.contrib.sites.models import Site
+from django.core.cache import cache
+from django.db import OperationalError, connection, transaction
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from arenasurf.estadisticas import estadisticas_socios
+
+from clientes.models import Cliente
+from .espacios import asignar, crear_plazas, liberar, mapa_ocupacion
+from .forms import SocioForm
+from .membresias import caducar, en_tramos, socios_a_caducar
+from .models import Guardatablas, Secuencia, Socio, Taquilla
+from .secuencias import AsignadorSecuencia, numeros_socio, reservar
+
+
+def crear_socio(n=1, **kwargs):
+    cliente = Cliente.objects.create(
+        nombre=f'Socio{n}', apellidos=f'Apellido{n}', email=f'socio{n}@example.com'
+    )
+    datos = {'cliente': cliente, 'fecha_vencimiento': date.today() + timedelta(days=30)}
+    datos.update(kwargs)
+    return Socio.objects.create(**datos)
+
+
+class VigenciaTests(TestCase):
+
+    def test_anotaciones_coinciden_con_las_propiedades(self):
+        hoy = date.today()
+        crear_socio(1, fecha_vencimiento=hoy + timedelta(days=10))
+        crear_socio(2, fecha_vencimiento=hoy - timedelta(days=3))
+        crear_socio(3, fecha_vencimiento=hoy + timedelta(days=40), activo=False)
+        crear_socio(4, fecha_vencimiento=hoy)
+
+        for socio in Socio.objects.with_vigencia(hoy):
+            sin_anotar = Socio.objects.get(pk=socio.pk)
+            self.assertEqual(socio.esta_vigente, sin_anotar.esta_vigente)
+            self.assertEqual(socio.dias_hasta_vencimiento, sin_anotar.dias_hasta_vencimiento)
+
+    def test_ordenar_y_filtrar_por_dias_en_sql(self):
+        hoy = date.today()
+        lejano = crear_socio(1, fecha_vencimiento=hoy + timedelta(days=90))
+        cercano = crear_socio(2, fecha_vencimiento=hoy + timedelta(days=5))
+
+        qs = Socio.objects.with_vigencia(hoy)
+        self.assertEqual(list(qs.order_by('dias_vencimiento_db')), [cercano, lejano])
+        self.assertEqual(list(qs.filter(dias_vencimiento_db__lte=30)), [cercano])
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class DashboardSociosTests(TestCase):
+
+    def setUp(self):
+        hoy = date.today()
+        crear_socio(1, nivel='BASICO', fecha_vencimiento=hoy + timedelta(days=10))
+        crear_socio(2, nivel='PREMIUM', fecha_vencimiento=hoy + timedelta(days=100))
+        crear_socio(3, nivel='VIP', fecha_vencimiento=hoy - timedelta(days=1))
+        crear_socio(4, nivel='VIP', activo=False)
+        self.client.force_login(User.objects.create_user('staff', password='x', is_staff=True))
+        Site.objects.clear_cache()
+        cache.clear()
+
+    def test_estadisticas_con_dos_consultas(self):
+        with self.assertNumQueries(2):
+            stats = estadisticas_socios()
+        self.assertEqual(
+            (stats.total_socios, stats.socios_vigentes, stats.socios_vencidos),
+            (3, 2, 1),
+        )
+        self.assertEqual((stats.socios_basico, stats.socios_premium, stats.socios_vip), (1, 1, 1))
+        self.assertEqual(len(stats.proximos_vencimientos), 1)
+
+    def test_numero_de_consultas_del_dashboard(self):
+        # sesión + usuario + site + estadísticas (2)
+        with self.assertNumQueries(5):
+            respuesta = self.client.get(reverse('socios:dashboard'))
+        self.assertEqual(respuesta.status_code, 200)
+        # La segunda visita se sirve desde la caché
+        with self.assertNumQueries(2):
+            self.client.get(reverse('socios:dashboard'))
+
+    def test_endpoint_json(self):
+        datos = self.client.get(reverse('socios:dashboard_api')).json()
+        self.assertEqual(datos['por_nivel'], {'BASICO': 1, 'PREMIUM': 1, 'VIP': 1})
+        self.assertEqual(datos['proximos_vencimientos'][0]['dias_restantes'], 10)
+
+
+class SecuenciaSociosTests(TestCase):
+
+    def test_numeros_correlativos(self):
+        self.assertEqual([crear_socio(n).numero_socio for n in range(3)], ['0001', '0002', '0003'])
+
+    def test_orden_numerico_mas_alla_de_cuatro_cifras(self):
+        Secuencia.objects.filter(nombre='numero_socio').update(siguiente=9999)
+        self.assertEqual(crear_socio(1).numero_socio, '9999')
+        self.assertEqual(crear_socio(2).numero_socio, '10000')
+        self.assertEqual(crear_socio(3).numero_socio, '10001')
+
+    def test_numero_manual_avanza_la_secuencia(self):
+        crear_socio(1, numero_socio='0050')
+        self.assertEqual(crear_socio(2).numero_socio, '0051')
+
+    def test_rollback_no_deja_huecos(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            crear_socio(1)
+            raise RuntimeError
+        self.assertEqual(crear_socio(2).numero_socio, '0001')
+
+    def test_reserva_en_bloque(self):
+        self.assertEqual(numeros_socio(3), ['0001', '0002', '0003'])
+        self.assertEqual(crear_socio(1).numero_socio, '0004')
+
+    def test_sin_fila_arranca_tras_el_mayor_existente(self):
+        crear_socio(1, numero_socio='0120')
+        Secuencia.objects.all().delete()
+        self.assertEqual(crear_socio(2).numero_socio, '0121')
+
+    def test_bloques_por_proceso(self):
+        asignador = AsignadorSecuencia('pruebas', bloque=10)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(asignador.siguiente(), 1)
+        self.assertEqual([asignador.siguiente() for _ in range(2)], [2, 3])
+        # Se ha reservado un bloque entero: otro proceso empieza después
+        self.assertEqual(list(reservar('pruebas')), [11])
+
+    def test_avanzar_descarta_el_bloque_en_memoria(self):
+        asignador = AsignadorSecuencia('pruebas', bloque=10)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(asignador.siguiente(), 1)
+        asignador.avanzar(5)
+        self.assertEqual(asignador.siguiente(), 6)
+        # También los valores de un bloque que aún no se ha publicado
+        otro = AsignadorSecuencia('otras', bloque=10)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(otro.siguiente(), 1)
+            otro.avanzar(3)
+        self.assertEqual(otro.siguiente(), 4)
+
+
+class SecuenciaConcurrenteTests(TransactionTestCase):
+
+    hilos = 8
+    socios_por_hilo = 250
+    reintentos = 20
+
+    def test_altas_concurrentes_sin_colisiones(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest('SQLite en memoria no admite escrituras desde varios hilos')
+        total = self.hilos * self.socios_por_hilo
+        clientes = Cliente.objects.bulk_create([
+            Cliente(nombre=f'Socio{n}', apellidos='Apellido', email=f'socio{n}@example.com')
+            for n in range(total)
+        ])
+        ids = [c.pk for c in Cliente.objects.order_by('pk')]
+        errores = []
+        barrera = threading.Barrier(self.hilos)
+
+        def alta(cliente_id):
+            # Las transacciones diferidas de SQLite pueden chocar al pasar de
+            # lectura a escritura; el timeout no cubre ese caso y se reintenta
+            for intento in range(self.reintentos):
+                try:
+                    with transaction.atomic():
+                        Socio.objects.create(cliente_id=cliente_id, fecha_vencimiento=date.today())
+                    return
+                except OperationalError as error:
+                    if 'locked' not in str(error) or intento == self.reintentos - 1:
+                        raise
+                    time.sleep(0.01 * (intento + 1))
+
+        def dar_altas(inicio):
+            try:
+                barrera.wait()
+                for cliente_id in ids[inicio:inicio + self.socios_por_hilo]:
+                    alta(cliente_id)
+            except Exception as error:
+                errores.append(error)
+            finally:
+                connection.close()
+
+        hilos = [
+            threading.Thread(target=dar_altas, args=(i * self.socios_por_hilo,))
+            for i in range(self.hilos)
+        ]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        self.assertEqual(errores, [])
+        numeros = sorted(int(n) for n in Socio.objects.values_list('numero_socio', flat=True))
+        self.assertEqual(numeros, list(range(1, total + 1)))
+
+
+class EspaciosTests(TestCase):
+
+    def setUp(self):
+        crear_plazas(Taquilla, 3)
+        crear_plazas(Guardatablas, 2)
+        self.socio = crear_socio(1, nivel='PREMIUM')
+
+    def test_asigna_la_primera_libre(self):
+        otro = crear_socio(2)
+        self.assertEqual(asignar(Taquilla, self.socio), 1)
+        self.assertEqual(asignar(Taquilla, otro), 2)
+        # Volver a pedir plaza no cambia la asignada
+        self.assertEqual(asignar(Taquilla, self.socio), 1)
+        otro.refresh_from_db()
+        self.assertEqual(otro.numero_taquilla, 2)
+
+    def test_plaza_ocupada_conserva_la_anterior(self):
+        otro = crear_socio(2)
+        asignar(Taquilla, self.socio, 3)
+        asignar(Taquilla, otro, 1)
+        self.assertIsNone(asignar(Taquilla, otro, 3))
+        otro.refresh_from_db()
+        self.assertEqual(otro.numero_taquilla, 1)
+        self.assertEqual(Taquilla.objects.get(numero=1).socio, otro)
+
+    def test_sin_plazas_libres(self):
+        asignar(Guardatablas, self.socio)
+        asignar(Guardatablas, crear_socio(2))
+        self.assertIsNone(asignar(Guardatablas, crear_socio(3)))
+
+    def test_liberacion_en_bloque(self):
+        vencido = crear_socio(2, fecha_vencimiento=date.today() - timedelta(days=1))
+        asignar(Taquilla, self.socio)
+        asignar(Taquilla, vencido)
+        asignar(Guardatablas, vencido)
+        call_command('liberar_plazas', stdout=StringIO())
+        vencido.refresh_from_db()
+        self.assertEqual((vencido.numero_taquilla, vencido.numero_guardatablas), (None, None))
+        self.assertEqual(Taquilla.objects.filter(socio__isnull=True).count(), 2)
+        self.assertEqual(liberar([self.socio.pk])[Taquilla], 1)
+
+    def test_mapa_con_una_consulta(self):
+        asignar(Taquilla, self.socio)
+        with self.assertNumQueries(1):
+            mapa = mapa_ocupacion(Taquilla)
+            ocupantes = [e.socio.cliente.nombre_completo for e in mapa if e.socio]
+        self.assertEqual(len(mapa), 3)
+        self.assertEqual(ocupantes, [self.socio.cliente.nombre_completo])
+
+    def test_formulario_asigna_desde_el_inventario(self):
+        datos = {
+            'cliente': self.socio.cliente_id, 'nivel': 'PREMIUM',
+            'numero_socio': self.socio.numero_socio,
+            'fecha_alta': date.today(), 'fecha_vencimiento': date.today(),
+            'precio_anual': '500', 'numero_taquilla': 'libre', 'numero_guardatablas': '2',
+        }
+        form = SocioForm(datos, instance=self.socio)
+        self.assertTrue(form.is_valid(), form.errors)
+        form.save()
+        self.socio.refresh_from_db()
+        self.assertEqual((self.socio.numero_taquilla, self.socio.numero_guardatablas), (1, 2))
+
+        # Una plaza ocupada no aparece entre las opciones
+        form = SocioForm(dict(datos, numero_guardatablas='2'), instance=crear_socio(2, nivel='VIP'))
+        self.assertIn('numero_guardatablas', form.errors)
+
+    def test_formulario_solo_acepta_clientes_sin_socio(self):
+        libre = Cliente.objects.create(nombre='Libre', apellidos='Sin Socio', email='libre@example.com')
+        datos = {
+            'nivel': 'BASICO', 'numero_socio': '', 'fecha_alta': date.today(),
+            'fecha_vencimiento': date.today(), 'precio_anual': '',
+            'numero_taquilla': '', 'numero_guardatablas': '',
+        }
+        self.assertIn('cliente', SocioForm(dict(datos, cliente=self.socio.cliente_id)).errors)
+        self.assertTrue(SocioForm(dict(datos, cliente=libre.pk)).is_valid())
+        # Al editar se acepta el cliente actual y solo se pinta esa opción
+        form = SocioForm(dict(datos, cliente=self.socio.cliente_id), instance=self.socio)
+        self.assertNotIn('cliente', form.errors)
+        self.assertEqual(str(form['cliente']).count('<option'), 2)
+
+
+class MembresiasTests(TestCase):
+
+    def setUp(self):
+        hoy = date.today()
+        crear_plazas(Taquilla, 5)
+        self.vencidos = [crear_socio(n, fecha_vencimiento=hoy - timedelta(days=n)) for n in range(1, 6)]
+        self.vigente = crear_socio(10, fecha_vencimiento=hoy + timedelta(days=10))
+        for socio in self.vencidos[:2]:
+            asignar(Taquilla, socio)
+
+    def test_caducar_por_tramos(self):
+        informes = []
+        total = en_tramos(caducar, socios_a_caducar(date.today()), chunk_size=2, progreso=informes.append)
+        self.assertEqual((total.socios, total.taquillas_liberadas), (5, 2))
+        self.assertEqual(len(informes), 3)
+        self.assertFalse(Socio.objects.filter(pk__in=[s.pk for s in self.vencidos], activo=True).exists())
+        self.assertTrue(Socio.objects.get(pk=self.vigente.pk).activo)
+        self.assertFalse(Taquilla.objects.filter(socio__isnull=False).exists())
+
+    def test_comando_renovar_ventana(self):
+        hoy = date.today()
+        salida = StringIO()
+        call_command(
+            'gestionar_membresias', 'renovar',
+            '--desde', str(hoy - timedelta(days=2)), '--hasta', str(hoy), stdout=salida,
+        )
+        self.assertIn('2 socios renovados', salida.getvalue())
+        renovado = Socio.objects.get(pk=self.vencidos[0].pk)
+        self.assertEqual(renovado.fecha_vencimiento, hoy - timedelta(days=1) + timedelta(days=365))
+
+    def test_dry_run_no_modifica(self):
+        salida = StringIO()
+        call_command('gestionar_membresias', 'caducar', '--dry-run', stdout=salida)
+        self.assertIn('5 socios', salida.getvalue())
+        self.assertEqual(Socio.objects.filter(activo=True).count(), 6)
+
+    def test_vista_renovar(self):
+        self.client.force_login(User.objects.create_user('staff', password='x', is_staff=True))
+        socio = self.vencidos[0]
+        self.client.post(reverse('socios:renovar', args=[socio.pk]))
+        socio.refresh_from_db()
+        self.assertEqual(socio.fecha_vencimiento, date.today() - timedelta(days=1) + timedelta(days=365))
@@ -6,6 +6,7 @@ app_name = 'socios'
 urlpatterns = [
     # Dashboard
     path('', views.dashboard_socios, name='dashboard'),
+    path('api/estadisticas/', views.dashboard_socios_api, name='dashboard_api'),
     
     # Socios CRUD
     path('socios/', views.SocioListView.as_view(), name='lista'),
@@ -14,4 +15,9 @@ urlpatterns = [
     path('socios/<int:pk>/editar/', views.SocioUpdateView.as_view(), name='editar'),
     path('socios/<int:pk>/eliminar/', views.SocioDeleteView.as_view(), name='eliminar'),
     path('socios/<int:pk>/renovar/', views.renovar_socio, name='renovar'),
+    path('socios/exportar/', views.exportar_socios, name='exportar'),
+
+    # Taquillas y guardatablas
+    path('espacios/', views.ocupacion_espacios, name='ocupacion'),
+    path('api/espacios/', views.ocupacion_espacios_api, name='ocupacion_api'),
 ]
@@ -1,33 +1,43 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib import messages
+from django.http import JsonResponse
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
 from django.urls import reverse_lazy
-from django.db.models import Q
 from django.utils import timezone
-from datetime import timedelta
-from .models import Socio
+from .espacios import mapa_ocupacion
+from .membresias import renovar
+from .models import Guardatablas, Socio, Taquilla
 from .forms import SocioForm
+from arenasurf.cache import cache_swr
+from arenasurf.estadisticas import estadisticas_socios
+from arenasurf.exportacion import exportar_csv
 from arenasurf.mixins import StaffRequiredMixin, staff_required
+from arenasurf.paginacion import PaginacionCursorMixin
+from clientes.busqueda import buscar
 
 
-class SocioListView(StaffRequiredMixin, ListView):
+class SocioListView(StaffRequiredMixin, PaginacionCursorMixin, ListView):
     model = Socio
     template_name = 'socios/socio_list.html'
     context_object_name = 'socios'
     paginate_by = 20
+    ordenes = {
+        'numero': ('numero_socio',),
+        'vencimiento': ('-vigente_db', 'dias_vencimiento_db', 'numero_socio'),
+    }
+    
+    def get_orden(self):
+        orden = self.request.GET.get('orden')
+        return orden if orden in self.ordenes else 'numero'
     
     def get_queryset(self):
-        queryset = Socio.objects.select_related('cliente').order_by('numero_socio')
+        today = timezone.now().date()
+        queryset = (Socio.objects.with_vigencia(today)
+                    .select_related('cliente')
+                    .order_by(*self.ordenes[self.get_orden()]))
         
-        # Filtro por búsqueda
-        search = self.request.GET.get('search')
-        if search:
-            queryset = queryset.filter(
-                Q(numero_socio__icontains=search) |
-                Q(cliente__nombre__icontains=search) |
-                Q(cliente__apellidos__icontains=search) |
-                Q(cliente__email__icontains=search)
-            )
+        # Filtro por búsqueda: número de socio y datos del cliente, por prefijo
+        queryset = buscar(queryset, self.request.GET.get('search', ''), campo_cliente='cliente_id')
         
         # Filtro por nivel
         nivel = self.request.GET.get('nivel')
@@ -37,14 +47,17 @@ class SocioListView(StaffRequiredMixin, ListView):
         # Filtro por estado
         estado = self.request.GET.get('estado')
         if estado == 'vigente':
-            today = timezone.now().date()
-            queryset = queryset.filter(fecha_vencimiento__gte=today, activo=True)
+            queryset = queryset.filter(vigente_db=True)
         elif estado == 'vencido':
-            today = timezone.now().date()
             queryset = queryset.filter(fecha_vencimiento__lt=today)
         elif estado == 'inactivo':
             queryset = queryset.filter(activo=False)
         
+        # Filtro por días hasta el vencimiento
+        vence_en = self.request.GET.get('vence_en')
+        if vence_en and vence_en.isdigit():
+            queryset = queryset.filter(vigente_db=True, dias_vencimiento_db__lte=int(vence_en))
+        
         return queryset
     
     def get_context_data(self, **kwargs):
@@ -52,8 +65,21 @@ class SocioListView(StaffRequiredMixin, ListView):
         context['search'] = self.request.GET.get('search', '')
         context['nivel'] = self.request.GET.get('nivel', '')
         context['estado'] = self.request.GET.get('estado', '')
+        context['vence_en'] = self.request.GET.get('vence_en', '')
+        context['orden'] = self.get_orden()
         context['nivel_choices'] = Socio.NIVEL_CHOICES
         return context
+    
+    def serializar_objeto(self, socio):
+        return {
+            'id': socio.pk,
+            'numero_socio': socio.numero_socio,
+            'cliente': socio.cliente.nombre_completo,
+            'nivel': socio.nivel,
+            'fecha_vencimiento': socio.fecha_vencimiento.isoformat(),
+            'vigente': socio.vigente_db,
+            'activo': socio.activo,
+        }
 
 
 class SocioDetailView(StaffRequiredMixin, DetailView):
@@ -67,6 +93,11 @@ class SocioDetailView(StaffRequiredMixin, DetailView):
         return context
 
 
+def _avisar_espacios_no_asignados(request, form):
+    for espacio in form.espacios_no_asignados:
+        messages.warning(request, f'{espacio}: la plaza elegida ya no está libre, no se ha asignado.')
+
+
 class SocioCreateView(StaffRequiredMixin, CreateView):
     model = Socio
     form_class = SocioForm
@@ -75,8 +106,10 @@ class SocioCreateView(StaffRequiredMixin, CreateView):
     
     def form_valid(self, form):
         # El número de socio y precio se generan automáticamente en el método save del modelo
+        response = super().form_valid(form)
         messages.success(self.request, 'Socio creado exitosamente.')
-        return super().form_valid(form)
+        _avisar_espacios_no_asignados(self.request, form)
+        return response
 
 
 class SocioUpdateView(StaffRequiredMixin, UpdateView):
@@ -86,8 +119,10 @@ class SocioUpdateView(StaffRequiredMixin, UpdateView):
     success_url = reverse_lazy('socios:lista')
     
     def form_valid(self, form):
+        response = super().form_valid(form)
         messages.success(self.request, 'Socio actualizado exitosamente.')
-        return super().form_valid(form)
+        _avisar_espacios_no_asignados(self.request, form)
+        return response
 
 
 class SocioDeleteView(StaffRequiredMixin, DeleteView):
@@ -104,46 +139,51 @@ class SocioDeleteView(StaffRequiredMixin, DeleteView):
         return redirect(self.success_url)
 
 
+def _estadisticas_dashboard():
+    today = timezone.now().date()
+    return cache_swr(f'dashboard:socios:{today.isoformat()}', lambda: estadisticas_socios(today))
+
+
 @staff_required
 def dashboard_socios(request):
     """Vista del dashboard de socios"""
-    today = timezone.now().date()
-    
-    # Estadísticas
-    total_socios = Socio.objects.filter(activo=True).count()
-    socios_vigentes = Socio.objects.filter(
-        activo=True,
-        fecha_vencimiento__gte=today
-    ).count()
-    socios_vencidos = Socio.objects.filter(
-        fecha_vencimiento__lt=today,
-        activo=True
-    ).count()
-    
-    # Próximos vencimientos (30 días)
-    fecha_limite = today + timedelta(days=30)
-    proximos_vencimientos = Socio.objects.filter(
-        activo=True,
-        fecha_vencimiento__gte=today,
-        fecha_vencimiento__lte=fecha_limite
-    ).select_related('cliente').order_by('fecha_vencimiento')[:10]
-    
-    # Socios por nivel
-    socios_basico = Socio.objects.filter(activo=True, nivel='BASICO').count()
-    socios_premium = Socio.objects.filter(activo=True, nivel='PREMIUM').count()
-    socios_vip = Socio.objects.filter(activo=True, nivel='VIP').count()
-    
-    context = {
-        'total_socios': total_socios,
-        'socios_vigentes': socios_vigentes,
-        'socios_vencidos': socios_vencidos,
-        'proximos_vencimientos': proximos_vencimientos,
-        'socios_basico': socios_basico,
-        'socios_premium': socios_premium,
-        'socios_vip': socios_vip,
-    }
-    
-    return render(request, 'socios/dashboard.html', context)
+    return render(request, 'socios/dashboard.html', {
+        'estadisticas': _estadisticas_dashboard(),
+    })
+
+
+@staff_required
+def dashboard_socios_api(request):
+    """Estadísticas del dashboard de socios en JSON"""
+    return JsonResponse(_estadisticas_dashboard().as_dict())
+
+
+@staff_required
+def ocupacion_espacios(request):
+    """Mapa de ocupación de taquillas y guardatablas"""
+    return render(request, 'socios/ocupacion.html', {
+        'taquillas': mapa_ocupacion(Taquilla),
+        'guardatablas': mapa_ocupacion(Guardatablas),
+    })
+
+
+@staff_required
+def ocupacion_espacios_api(request):
+    """Mapa de ocupación en JSON"""
+    def plazas(espacios):
+        return [
+            {
+                'numero': espacio.numero,
+                'libre': espacio.libre,
+                'socio': espacio.socio.numero_socio if espacio.socio else None,
+                'cliente': espacio.socio.cliente.nombre_completo if espacio.socio else None,
+            } for espacio in espacios
+        ]
+
+    return JsonResponse({
+        'taquillas': plazas(mapa_ocupacion(Taquilla)),
+        'guardatablas': plazas(mapa_ocupacion(Guardatablas)),
+    })
 
 
 @staff_required
@@ -152,10 +192,9 @@ def renovar_socio(request, pk):
     socio = get_object_or_404(Socio, pk=pk)
     
     if request.method == 'POST':
-        # Renovar por un año más
-        socio.fecha_vencimiento = socio.fecha_vencimiento + timedelta(days=365)
-        socio.activo = True
-        socio.save()
+        # Renovar por un año más con un UPDATE atómico
+        renovar([socio.pk])
+        socio.refresh_from_db(fields=['fecha_vencimiento', 'activo'])
         
         messages.success(
             request, 
@@ -164,3 +203,9 @@ def renovar_socio(request, pk):
         return redirect('socios:detalle', pk=socio.pk)
     
     return render(request, 'socios/renovar_socio.html', {'socio': socio})
+
+
+@staff_required
+def exportar_socios(request):
+    """CSV de socios con su cliente (filtros: desde, hasta por fecha de alta, estado, gzip)"""
+    return exportar_csv(request, 'socios')